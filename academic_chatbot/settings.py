@@ -54,6 +54,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its totals include every other middleware
+    'core.middleware.StageTimingMiddleware',
+    'core.middleware.TracingMiddleware',
+    'core.middleware.RequestProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -86,19 +90,40 @@ WSGI_APPLICATION = 'academic_chatbot.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-tmpPostgres = urlparse(os.getenv("DATABASE_URL"))
-
-DATABASES = {
-    'default': {
+def database_from_url(url):
+    """Build a Django DATABASES entry from a postgres:// URL"""
+    parsed = urlparse(url)
+    return {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': tmpPostgres.path.replace('/', ''),
-        'USER': tmpPostgres.username,
-        'PASSWORD': tmpPostgres.password,
-        'HOST': tmpPostgres.hostname,
-        'PORT': 5432,
+        'NAME': parsed.path.replace('/', ''),
+        'USER': parsed.username,
+        'PASSWORD': parsed.password,
+        'HOST': parsed.hostname,
+        'PORT': parsed.port or 5432,
+        # Keep connections open between requests and check them before reuse
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
     }
+
+DATABASES = {
+    'default': database_from_url(os.getenv("DATABASE_URL")),
 }
 
+# Optional read replica for knowledge base reads (see core/db_router.py)
+if os.getenv("DATABASE_REPLICA_URL"):
+    DATABASES['replica'] = database_from_url(os.getenv("DATABASE_REPLICA_URL"))
+    # Tests run against the primary only
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+
+# Models whose reads go to the replica, as "app_label.ModelName"
+REPLICA_READ_MODELS = ['crawler.KnowledgeBase']
+# Fall back to the primary when the replica is this many seconds behind
+REPLICA_MAX_LAG_SECONDS = int(os.getenv('REPLICA_MAX_LAG_SECONDS', 30))
+# How often each process re-checks replica health and lag
+REPLICA_CHECK_INTERVAL_SECONDS = 10
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -150,9 +175,12 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # DRF/SimpleJWT classes that also record the "auth" timing stage.
+        # JWT first: API clients are answered from the user cache
+        'core.authentication.JWTAuthentication',
+        'core.authentication.SessionAuthentication',
+        # Only on BASIC_AUTH_PATHS (PBKDF2 on every request)
+        'core.authentication.BasicAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
@@ -166,7 +194,132 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
 }
 
+# Authentication (see core/authentication.py)
+# JWT users and their StudentProfile are cached until the token expires, at
+# most this many seconds; saving or deleting either drops the entry
+AUTH_USER_CACHE_SECONDS = int(os.getenv('AUTH_USER_CACHE_SECONDS', 86400))
+# Path prefixes that accept HTTP Basic credentials (comma-separated), e.g. "/api/crawler/"
+BASIC_AUTH_PATHS = [path for path in os.getenv('BASIC_AUTH_PATHS', '').split(',') if path]
+# Session-authenticated requests read StudentProfiles from a cache for this
+# long (see users/profiles.py); profile writes invalidate it
+PROFILE_CACHE_SECONDS = int(os.getenv('PROFILE_CACHE_SECONDS', 60))
+
+# Crawler settings
+# Number of background threads executing crawl jobs queued from the admin API
+CRAWLER_WORKERS = int(os.getenv('CRAWLER_WORKERS', 2))
+
+# Crawl jobs whose worker stopped (e.g. a restart) are requeued after this
+# long without progress, and failed after CRAWL_JOB_MAX_ATTEMPTS tries
+CRAWL_JOB_STALE_SECONDS = int(os.getenv('CRAWL_JOB_STALE_SECONDS', 900))
+CRAWL_JOB_MAX_ATTEMPTS = int(os.getenv('CRAWL_JOB_MAX_ATTEMPTS', 3))
+# Largest per-request delay (seconds) a crawl job may ask for; keep it well
+# below CRAWL_JOB_STALE_SECONDS
+CRAWL_JOB_MAX_DELAY = int(os.getenv('CRAWL_JOB_MAX_DELAY', 60))
+
+# Optional .warc.gz file every crawl appends raw responses to (disabled if unset)
+CRAWLER_ARCHIVE_PATH = os.getenv('CRAWLER_ARCHIVE_PATH')
+
+# Program-aware retrieval (see crawler/programs.py): entries kept per
+# program and the relevance an entry needs to join a program's set
+PROGRAM_CONTEXT_SIZE = int(os.getenv('PROGRAM_CONTEXT_SIZE', 200))
+PROGRAM_CONTEXT_MIN_SCORE = float(os.getenv('PROGRAM_CONTEXT_MIN_SCORE', 4))
+
+# Adaptive recrawl scheduler (python manage.py run_recrawl_scheduler)
+RECRAWL_BUDGET_PER_HOUR = int(os.getenv('RECRAWL_BUDGET_PER_HOUR', 120))
+RECRAWL_MIN_INTERVAL_HOURS = 1
+RECRAWL_MAX_INTERVAL_HOURS = 24 * 30
+
+# Chat log retention (python manage.py archive_chatlog)
+# Months of chat logs kept in the database; older monthly partitions are
+# archived to compressed files in CHATLOG_ARCHIVE_DIR and dropped
+CHATLOG_RETENTION_MONTHS = int(os.getenv('CHATLOG_RETENTION_MONTHS', 12))
+CHATLOG_ARCHIVE_DIR = os.getenv('CHATLOG_ARCHIVE_DIR', os.path.join(BASE_DIR, 'archives', 'chatlog'))
+
+# Dashboard rollups (python manage.py update_rollups)
+# Seconds the /api/stats/ response is cached
+USAGE_STATS_CACHE_SECONDS = int(os.getenv('USAGE_STATS_CACHE_SECONDS', 300))
+
+# Request timing (core.middleware.StageTimingMiddleware)
+# Per-stage durations are sent in a Server-Timing response header to staff
+# users; True sends it to every client (it exposes internal timings)
+SERVER_TIMING_HEADERS = os.getenv('SERVER_TIMING_HEADERS', 'False') == 'True'
+
+# Prometheus metrics (GET /metrics, see core/metrics.py)
+# Scrapers send this bearer token; staff sessions are let in without it
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+# True serves metrics to anyone (they expose view latencies and DB aliases)
+METRICS_PUBLIC = os.getenv('METRICS_PUBLIC', 'False') == 'True'
+
+# Request profiling (core.middleware.RequestProfilingMiddleware)
+REQUEST_PROFILING = os.getenv('REQUEST_PROFILING', 'True') == 'True'
+# Fraction of all requests profiled at random (0 = only signed-header requests)
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+# Profiler for random samples: "sample" (stack sampling) or "cprofile"
+PROFILE_MODE = os.getenv('PROFILE_MODE', 'sample')
+PROFILE_SAMPLE_INTERVAL_MS = 5
+# Seconds a token from /api/profiling/token/ stays valid
+PROFILE_TOKEN_MAX_AGE = 3600
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+# Oldest profiles (and their files) are deleted beyond this many
+PROFILE_MAX_COUNT = int(os.getenv('PROFILE_MAX_COUNT', 500))
+
+# Tracing (core.middleware.TracingMiddleware, see core/tracing.py)
+# "file" appends OTLP/JSON lines to TRACING_FILE, "otlp" posts them to an
+# OpenTelemetry collector; empty disables tracing
+TRACING_EXPORTER = os.getenv('TRACING_EXPORTER', '')
+TRACING_FILE = os.getenv('TRACING_FILE', os.path.join(BASE_DIR, 'traces', 'traces.jsonl'))
+TRACING_OTLP_ENDPOINT = os.getenv('TRACING_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces')
+TRACING_SAMPLE_RATE = float(os.getenv('TRACING_SAMPLE_RATE', 1.0))
+TRACING_SERVICE_NAME = os.getenv('TRACING_SERVICE_NAME', 'academic-chatbot')
+
+# FAQ fast path (see chat/faq.py): approved FAQ answers are served when a
+# message overlaps one of their phrasings by at least FAQ_MATCH_THRESHOLD
+FAQ_ENABLED = os.getenv('FAQ_ENABLED', 'True') == 'True'
+FAQ_MATCH_THRESHOLD = float(os.getenv('FAQ_MATCH_THRESHOLD', 0.75))
+FAQ_INDEX_CACHE_SECONDS = int(os.getenv('FAQ_INDEX_CACHE_SECONDS', 300))
+
+# Precomputed answers (see chat/precompute.py): answers generated off-peak by
+# precompute_answers are served for PRECOMPUTED_ANSWER_SECONDS, as long as the
+# knowledge base is unchanged (its version is re-read every KB_VERSION_CACHE_SECONDS)
+PRECOMPUTED_ANSWERS_ENABLED = os.getenv('PRECOMPUTED_ANSWERS_ENABLED', 'True') == 'True'
+PRECOMPUTED_ANSWER_SECONDS = int(os.getenv('PRECOMPUTED_ANSWER_SECONDS', 36 * 3600))
+KB_VERSION_CACHE_SECONDS = int(os.getenv('KB_VERSION_CACHE_SECONDS', 60))
+
+# Caching (see core/cache.py)
+# The default cache is a per-process LRU in front of the "shared" cache.
+# Set REDIS_URL to share entries between workers and servers; without it
+# "shared" is local memory, which is enough for development and tests
+REDIS_URL = os.getenv('REDIS_URL')
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.TieredCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'LOCAL_MAX_ENTRIES': int(os.getenv('CACHE_LOCAL_MAX_ENTRIES', 1000)),
+            # Longest another worker's write can go unseen
+            'LOCAL_TIMEOUT': int(os.getenv('CACHE_LOCAL_TIMEOUT', 5)),
+        },
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'KEY_PREFIX': 'jabu',
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
 # Logging Configuration
+# Loggers write to an in-memory queue; a background thread (core.log) feeds
+# the console and the size-rotated JSON debug.log, so requests never block
+# on log I/O. Worker processes share debug.log and take turns rotating it
+LOG_FILE_MAX_BYTES = int(os.getenv('LOG_FILE_MAX_BYTES', 10 * 1024 * 1024))
+LOG_FILE_BACKUP_COUNT = int(os.getenv('LOG_FILE_BACKUP_COUNT', 5))
+# Fraction of INFO records kept from the per-request loggers below
+LOG_INFO_SAMPLE_RATE = float(os.getenv('LOG_INFO_SAMPLE_RATE', 1.0))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -179,6 +332,16 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'core.log.JsonFormatter',
+        },
+    },
+    'filters': {
+        'sample_info': {
+            '()': 'core.log.SamplingFilter',
+            'rate': LOG_INFO_SAMPLE_RATE,
+            'loggers': ['core.timing', 'chat.services'],
+        },
     },
     'handlers': {
         'console': {
@@ -188,24 +351,37 @@ LOGGING = {
         },
         'file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
+            'class': 'core.log.MultiProcessRotatingFileHandler',
             'filename': os.path.join(BASE_DIR, 'debug.log'),
-            'formatter': 'verbose',
+            'maxBytes': LOG_FILE_MAX_BYTES,
+            'backupCount': LOG_FILE_BACKUP_COUNT,
+            'formatter': 'json',
+        },
+        'queue': {
+            'level': 'INFO',
+            '()': 'core.log.QueueListenerHandler',
+            'handlers': ['cfg://handlers.console', 'cfg://handlers.file'],
+            'filters': ['sample_info'],
         },
     },
     'loggers': {
         'django': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': True,
         },
         'chat': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': False,
         },
         'crawler': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'core': {
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': False,
         },
@@ -18,12 +18,16 @@ from django.contrib import admin
 from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from core import views as core_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('crawler.urls')),
     path('api/', include('chat.urls')),
     path('api/', include('users.urls')),
+    path('api/timings/', core_views.request_timings, name='request-timings'),
+    path('api/profiling/token/', core_views.profiling_token, name='profiling-token'),
+    path('metrics', core_views.metrics, name='metrics'),
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
     path("api/docs/", SpectacularSwaggerView.as_view(url_name="schema"), name="swagger-ui"),
     
@@ -1,13 +1,71 @@
 from django.contrib import admin
-from .models import ChatLog, Feedback
+from django.contrib.postgres.search import SearchQuery, SearchVector
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from core.paginator import EstimatedCountPaginator
+from users.models import StudentProfile
+from .faq import invalidate_faq_index
+from .models import (
+    ChatLog, Conversation, Feedback, FAQEntry, UsageRollup, QuestionRollup, RollupWatermark,
+    CHATLOG_SEARCH_VECTOR,
+)
+
+# Most ids from a related table inlined into a search query as a literal list
+MAX_LITERAL_IDS = 1000
+
+
+class FullTextSearchMixin:
+    """
+    Admin search through Postgres full-text indexes instead of icontains
+    
+    search_vector_fields lists the columns of the model's GIN search index,
+    in index order, so the vector built here matches the indexed expression.
+    Subclasses may add other ways of matching a row through
+    extra_search_condition(). The search box accepts web search syntax
+    ("exact phrase", or, -exclude).
+    """
+    search_vector_fields = ()
+    search_config = 'english'
+    
+    def extra_search_condition(self, search_query, search_term):
+        return None
+    
+    def full_text_filter(self, queryset, search_query, search_term):
+        condition = Q(search_document=search_query)
+        extra_condition = self.extra_search_condition(search_query, search_term)
+        if extra_condition is not None:
+            condition |= extra_condition
+        search_vector = SearchVector(*self.search_vector_fields, config=self.search_config)
+        return queryset.alias(search_document=search_vector).filter(condition)
+    
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        search_query = SearchQuery(search_term, config='english', search_type='websearch')
+        return self.full_text_filter(queryset, search_query, search_term), False
+
 
 # Register your models here.
 @admin.register(ChatLog)
-class ChatLogAdmin(admin.ModelAdmin):
+class ChatLogAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('student', 'short_message', 'timestamp')
     list_filter = ('timestamp',)
     search_fields = ('user_message', 'ai_response', 'student__name')
-    date_hierarchy = 'timestamp'
+    search_help_text = 'Full-text search of messages and responses, or a student name'
+    search_vector_fields = ('user_message', 'ai_response')
+    # No date_hierarchy: its year/month links need a DISTINCT over every row
+    ordering = ('-timestamp',)
+    list_select_related = ('student',)
+    raw_id_fields = ('student',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    
+    def extra_search_condition(self, search_query, search_term):
+        # Resolve student names up front: a literal id list lets Postgres
+        # combine both conditions with a bitmap OR, a subquery does not
+        student_ids = list(StudentProfile.objects.filter(name__icontains=search_term).values_list('id', flat=True)[:MAX_LITERAL_IDS])
+        return Q(student_id__in=student_ids) if student_ids else None
     
     def short_message(self, obj):
         return obj.user_message[:50] + '...' if len(obj.user_message) > 50 else obj.user_message
@@ -16,7 +74,91 @@ class ChatLogAdmin(admin.ModelAdmin):
 
 
 @admin.register(Feedback)
-class FeedbackAdmin(admin.ModelAdmin):
+class FeedbackAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('chat_log', 'rating', 'submitted_at')
     list_filter = ('rating', 'submitted_at')
     search_fields = ('comment', 'chat_log__user_message')
+    search_help_text = 'Full-text search of comments and the rated chat'
+    search_vector_fields = ('comment',)
+    list_select_related = ('chat_log__student',)
+    raw_id_fields = ('chat_log',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    
+    def extra_search_condition(self, search_query, search_term):
+        chat_logs = ChatLog.objects.alias(search_document=CHATLOG_SEARCH_VECTOR).filter(
+            search_document=search_query
+        )
+        # A rare term is inlined as literal ids so both GIN indexes combine in
+        # a bitmap OR. A common term is checked per row with EXISTS, letting
+        # Postgres walk the newest feedback and stop once the page is full.
+        chat_log_ids = list(chat_logs.values_list('id', flat=True)[:MAX_LITERAL_IDS + 1])
+        if len(chat_log_ids) <= MAX_LITERAL_IDS:
+            return Q(chat_log_id__in=chat_log_ids)
+        return Exists(chat_logs.filter(id=OuterRef('chat_log_id')))
+
+
+@admin.register(Conversation)
+class ConversationAdmin(admin.ModelAdmin):
+    list_display = ('conversation_id', 'student', 'turn_count', 'last_activity_at')
+    search_fields = ('conversation_id', 'student__name')
+    list_select_related = ('student',)
+    raw_id_fields = ('student',)
+
+
+@admin.register(FAQEntry)
+class FAQEntryAdmin(admin.ModelAdmin):
+    list_display = ('question', 'status', 'answer_source', 'ask_count', 'hit_count', 'last_hit_at')
+    list_filter = ('status', 'answer_source')
+    search_fields = ('question', 'answer')
+    ordering = ('-ask_count',)
+    readonly_fields = ('cluster_hash', 'ask_count', 'hit_count', 'last_hit_at', 'approved_by', 'approved_at', 'created_at', 'updated_at')
+    actions = ['approve_entries', 'disable_entries']
+    
+    def save_model(self, request, obj, form, change):
+        if 'answer' in form.changed_data:
+            obj.answer_source = FAQEntry.SOURCE_STAFF
+        if 'status' in form.changed_data and obj.status == FAQEntry.STATUS_APPROVED:
+            obj.approved_by = request.user
+            obj.approved_at = timezone.now()
+        super().save_model(request, obj, form, change)
+        invalidate_faq_index()
+    
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        invalidate_faq_index()
+    
+    @admin.action(description='Approve selected entries (serve their answers)')
+    def approve_entries(self, request, queryset):
+        approved = queryset.exclude(answer='').update(
+            status=FAQEntry.STATUS_APPROVED, approved_by=request.user, approved_at=timezone.now()
+        )
+        invalidate_faq_index()
+        self.message_user(request, f'Approved {approved} entries; entries without an answer were skipped')
+    
+    @admin.action(description='Disable selected entries')
+    def disable_entries(self, request, queryset):
+        disabled = queryset.update(status=FAQEntry.STATUS_DISABLED)
+        invalidate_faq_index()
+        self.message_user(request, f'Disabled {disabled} entries')
+
+
+@admin.register(UsageRollup)
+class UsageRollupAdmin(admin.ModelAdmin):
+    list_display = ('period_start', 'granularity', 'program', 'source_url', 'message_count', 'feedback_count', 'average_rating')
+    list_filter = ('granularity', 'program')
+    date_hierarchy = 'period_start'
+    ordering = ('-period_start',)
+
+
+@admin.register(QuestionRollup)
+class QuestionRollupAdmin(admin.ModelAdmin):
+    list_display = ('question', 'day', 'count')
+    search_fields = ('question',)
+    date_hierarchy = 'day'
+    ordering = ('-day', '-count')
+
+
+@admin.register(RollupWatermark)
+class RollupWatermarkAdmin(admin.ModelAdmin):
+    list_display = ('name', 'last_id', 'updated_at')
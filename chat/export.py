@@ -0,0 +1,136 @@
+"""
+Streaming export of chat logs with their feedback and student details
+
+Rows are read through a server-side cursor and rendered one at a time, so
+memory use stays flat no matter how many chat logs are exported.
+"""
+import csv
+import json
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from chat.models import ChatLog
+
+# Output columns, in order: (column name, ChatLog.values() lookup)
+EXPORT_COLUMNS = [
+    ('chat_log_id', 'id'),
+    ('timestamp', 'timestamp'),
+    ('conversation_id', 'conversation_id'),
+    ('student_id', 'student__student_id'),
+    ('student_name', 'student__name'),
+    ('program', 'student__program'),
+    ('year_of_study', 'student__year_of_study'),
+    ('user_message', 'user_message'),
+    ('ai_response', 'ai_response'),
+    ('source_url', 'source_url'),
+    ('feedback_id', 'feedbacks__id'),
+    ('rating', 'feedbacks__rating'),
+    ('comment', 'feedbacks__comment'),
+    ('feedback_submitted_at', 'feedbacks__submitted_at'),
+]
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+
+# Rows fetched from the server-side cursor per round trip
+CHUNK_SIZE = 2000
+
+
+def parse_bound(value, end=False):
+    """
+    Parse a date or datetime filter value
+
+    A plain date as an end bound covers that whole day.
+
+    Args:
+        value (str): ISO date (2025-01-31) or datetime
+        end (bool): Whether the value is an exclusive upper bound
+
+    Returns:
+        datetime: Timezone-aware bound, or None if value is empty
+
+    Raises:
+        ValueError: If the value isn't a valid date or datetime
+    """
+    if not value:
+        return None
+
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date: {value}")
+        parsed = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+def export_rows(start=None, end=None, program=None, chunk_size=CHUNK_SIZE):
+    """
+    Iterate over chat logs joined with feedback and student details
+
+    A chat log with several feedback entries appears once per entry; one
+    without feedback appears once with empty feedback columns.
+
+    Args:
+        start (datetime): Include chat logs from this time (optional)
+        end (datetime): Include chat logs before this time (optional)
+        program (str): Only include students of this program (optional)
+        chunk_size (int): Rows fetched per round trip
+
+    Yields:
+        dict: One row keyed by the EXPORT_COLUMNS names
+    """
+    queryset = ChatLog.objects.all()
+    if start:
+        queryset = queryset.filter(timestamp__gte=start)
+    if end:
+        queryset = queryset.filter(timestamp__lt=end)
+    if program:
+        queryset = queryset.filter(student__program__iexact=program)
+
+    lookups = [lookup for _, lookup in EXPORT_COLUMNS]
+    rows = queryset.order_by('timestamp', 'id', 'feedbacks__id').values_list(*lookups)
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield {name: value for (name, _), value in zip(EXPORT_COLUMNS, row)}
+
+def _format_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def iter_ndjson(rows):
+    """Render rows as newline-delimited JSON"""
+    for row in rows:
+        yield json.dumps({name: _format_value(value) for name, value in row.items()}) + '\n'
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to the caller"""
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    """Render rows as CSV with a header line"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    for row in rows:
+        yield writer.writerow([
+            '' if value is None else _format_value(value) for value in row.values()
+        ])
+
+def render_export(rows, export_format):
+    """
+    Render exported rows in the requested format
+
+    Args:
+        rows: Iterable of rows from export_rows
+        export_format (str): "ndjson" or "csv"
+
+    Returns:
+        iterator: Lines of text
+    """
+    if export_format == 'csv':
+        return iter_csv(rows)
+    return iter_ndjson(rows)
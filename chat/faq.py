@@ -0,0 +1,296 @@
+"""
+FAQ fast path
+
+A large share of chat traffic is a few dozen canonical questions. They are
+answered from FAQEntry rows instead of the language model:
+
+1. build_faq clusters the normalized questions of QuestionRollup (daily
+   counts of ChatLog questions) by word overlap and stores the most asked
+   clusters as pending FAQ entries.
+2. Staff write or review answers in the admin; generate_answers can also
+   produce them once with the normal chat pipeline.
+3. ChatService asks match_faq before searching the knowledge base. An
+   approved entry whose phrasings overlap the message by at least
+   FAQ_MATCH_THRESHOLD is returned in milliseconds; anything else falls
+   through to the normal path. Answers are generic, so students whose
+   program has a context set (see crawler.programs) skip the FAQ and get
+   program-aware answers instead.
+
+Hits and misses are counted in faq_lookups_total; faq_seconds_saved_total
+estimates the model time avoided, from the recent average of answers that
+did go through the model.
+"""
+import hashlib
+import logging
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import F, Sum
+from django.utils import timezone
+from core.cache import ANSWER_CACHE
+from core.metrics import FAQ_LOOKUPS, FAQ_MATCH_LATENCY, FAQ_SECONDS_SAVED
+from core.tracing import set_span_attributes
+from chat.models import FAQEntry, QuestionRollup
+from chat.rollups import normalize_question
+
+logger = logging.getLogger(__name__)
+
+# Words that don't distinguish one question from another (every question is about JABU)
+QUESTION_STOP_WORDS = {
+    'a', 'about', 'an', 'and', 'are', 'at', 'be', 'can', 'could', 'do', 'does', 'for', 'from', 'hello', 'hi',
+    'how', 'i', 'in', 'is', 'it', 'jabu', 'me', 'my', 'of', 'on', 'or', 'please', 'should', 'tell', 'the', 'there',
+    'to', 'what', 'whats', 'when', 'where', 'which', 'who', 'why', 'will', 'with', 'would', 'you',
+}
+
+# Most rolled-up questions considered when clustering, and phrasings kept per entry
+MAX_CLUSTER_QUESTIONS = 5000
+MAX_VARIANTS = 50
+
+_INDEX_KEY = 'faq:index'
+
+# Recent average time of answers that went through the model, per process
+_ANSWER_SECONDS_WEIGHT = 0.05
+_answer_seconds = None
+
+
+def question_tokens(text):
+    """
+    Content words of a question, lightly stemmed ("requirements" -> "requirement")
+
+    Returns:
+        frozenset: Words used to compare questions
+    """
+    tokens = set()
+    for word in normalize_question(text).split():
+        if word in QUESTION_STOP_WORDS:
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        tokens.add(word)
+    return frozenset(tokens)
+
+def similarity(a, b):
+    """Jaccard overlap of two token sets"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class TokenIndex:
+    """
+    Token sets with an inverted index, to find the most similar one quickly
+
+    Items are (tokens, value) pairs; values are returned by best_match.
+    """
+    def __init__(self):
+        self.items = []
+        self.postings = {}
+
+    def add(self, tokens, value):
+        position = len(self.items)
+        self.items.append((tokens, value))
+        for token in tokens:
+            self.postings.setdefault(token, []).append(position)
+
+    def best_match(self, tokens):
+        """
+        Returns:
+            tuple: (value, similarity) of the most similar item, or (None, 0.0)
+        """
+        candidates = {position for token in tokens for position in self.postings.get(token, ())}
+        best, best_score = None, 0.0
+        for position in candidates:
+            item_tokens, value = self.items[position]
+            score = similarity(tokens, item_tokens)
+            if score > best_score:
+                best, best_score = value, score
+        return best, best_score
+
+
+def cluster_questions(questions, threshold):
+    """
+    Group similar questions, most asked first
+
+    Each question joins the cluster whose first (most asked) question it
+    overlaps most, if the overlap reaches ``threshold``.
+
+    Args:
+        questions (list): (normalized question, count) pairs
+        threshold (float): Minimum Jaccard similarity to join a cluster
+
+    Returns:
+        list: Cluster dicts with question, tokens, variants and count, largest first
+    """
+    clusters = []
+    index = TokenIndex()
+    for question, count in sorted(questions, key=lambda item: -item[1]):
+        tokens = question_tokens(question)
+        if not tokens:
+            continue
+        cluster, score = index.best_match(tokens)
+        if cluster is None or score < threshold:
+            cluster = {'question': question, 'tokens': tokens, 'variants': [], 'count': 0}
+            clusters.append(cluster)
+            index.add(tokens, cluster)
+        cluster['variants'].append(question)
+        cluster['count'] += count
+    return sorted(clusters, key=lambda cluster: -cluster['count'])
+
+def build_faq(days=90, top=50, min_count=5, threshold=0.6):
+    """
+    Create or refresh FAQ entries from the most asked question clusters
+
+    Clusters that match an existing entry update its ask count and
+    phrasings and keep its answer and status. New clusters become pending
+    entries for staff to answer.
+
+    Args:
+        days (int): Question history window
+        top (int): Number of clusters to keep
+        min_count (int): Minimum times a cluster was asked
+        threshold (float): Similarity for joining a cluster or an entry
+
+    Returns:
+        dict: Counts of clusters, created and updated entries
+    """
+    since = timezone.now().date() - timedelta(days=days)
+    questions = list(
+        QuestionRollup.objects.filter(day__gte=since)
+        .values('question')
+        .annotate(total=Sum('count'))
+        .order_by('-total')
+        .values_list('question', 'total')[:MAX_CLUSTER_QUESTIONS]
+    )
+    clusters = [cluster for cluster in cluster_questions(questions, threshold) if cluster['count'] >= min_count][:top]
+
+    existing = TokenIndex()
+    for entry in FAQEntry.objects.all():
+        for variant in entry.variants or [entry.question]:
+            existing.add(question_tokens(variant), entry)
+
+    created = updated = 0
+    for cluster in clusters:
+        entry, score = existing.best_match(cluster['tokens'])
+        if entry is not None and score >= threshold:
+            known = list(entry.variants or [])
+            entry.variants = (known + [variant for variant in cluster['variants'] if variant not in known])[:MAX_VARIANTS]
+            entry.ask_count = cluster['count']
+            entry.save(update_fields=['variants', 'ask_count', 'updated_at'])
+            updated += 1
+        else:
+            entry = FAQEntry.objects.create(
+                question=cluster['question'],
+                cluster_hash=hashlib.sha1(cluster['question'].encode('utf-8')).hexdigest(),
+                variants=cluster['variants'][:MAX_VARIANTS],
+                ask_count=cluster['count'],
+            )
+            existing.add(cluster['tokens'], entry)
+            created += 1
+
+    invalidate_faq_index()
+    return {'clusters': len(clusters), 'created': created, 'updated': updated}
+
+def generate_answers(entries, approve=False):
+    """
+    Answer FAQ entries once with the normal knowledge base and model pipeline
+
+    Entries the model could not answer (error or demo mode responses) are
+    left pending.
+
+    Args:
+        entries (iterable): FAQEntry rows without an answer
+        approve (bool): Serve the generated answers right away instead of
+                        leaving them for staff review
+
+    Returns:
+        int: Number of entries answered
+    """
+    from chat.services import ChatService
+
+    service = ChatService()
+    answered = 0
+    for entry in entries:
+        answer, sources = service.answer_question(entry.question)
+        if ChatService.is_fallback_response(answer):
+            logger.warning(f"No answer generated for FAQ entry {entry.id}: {answer[:80]}")
+            continue
+        entry.answer = answer
+        entry.answer_source = FAQEntry.SOURCE_GENERATED
+        entry.source_url = sources[0]['url'] if sources else None
+        fields = ['answer', 'answer_source', 'source_url', 'updated_at']
+        if approve:
+            entry.status = FAQEntry.STATUS_APPROVED
+            entry.approved_at = timezone.now()
+            fields += ['status', 'approved_at']
+        entry.save(update_fields=fields)
+        answered += 1
+    invalidate_faq_index()
+    return answered
+
+
+def _load_index():
+    index = {'exact': {}, 'tokens': TokenIndex()}
+    entries = FAQEntry.objects.filter(status=FAQEntry.STATUS_APPROVED).exclude(answer='')
+    for entry in entries:
+        served = {'id': entry.id, 'question': entry.question, 'answer': entry.answer, 'source_url': entry.source_url}
+        for variant in set(entry.variants or []) | {normalize_question(entry.question)}:
+            index['exact'][variant] = served
+            index['tokens'].add(question_tokens(variant), served)
+    return index
+
+def get_faq_index():
+    """Approved entries by normalized phrasing and by tokens, cached in ANSWER_CACHE"""
+    return ANSWER_CACHE.get_or_compute(_INDEX_KEY, _load_index, timeout=settings.FAQ_INDEX_CACHE_SECONDS)
+
+def invalidate_faq_index():
+    """Serve FAQ changes (other processes see them within CACHE_LOCAL_TIMEOUT)"""
+    ANSWER_CACHE.delete(_INDEX_KEY)
+
+def find_faq(message):
+    """
+    The approved FAQ entry that answers a message, without recording a lookup
+
+    Returns:
+        tuple: (entry dict or None, similarity)
+    """
+    index = get_faq_index()
+    entry = index['exact'].get(normalize_question(message))
+    if entry is not None:
+        return entry, 1.0
+    tokens = question_tokens(message)
+    # One shared word is not enough to be sure
+    if len(tokens) < 2:
+        return None, 0.0
+    entry, score = index['tokens'].best_match(tokens)
+    if score < settings.FAQ_MATCH_THRESHOLD:
+        return None, score
+    return entry, score
+
+def match_faq(message):
+    """
+    Find an approved FAQ answer for a student message
+
+    Returns:
+        dict: id, question, answer and source_url of the entry, or None
+    """
+    start = time.perf_counter()
+    entry, score = find_faq(message)
+    FAQ_MATCH_LATENCY.observe(time.perf_counter() - start)
+    FAQ_LOOKUPS.labels('miss' if entry is None else 'hit').inc()
+    if entry is not None:
+        set_span_attributes({'faq.entry_id': entry['id'], 'faq.score': round(score, 3)})
+    return entry
+
+def record_faq_hit(entry_id):
+    """Count a served FAQ answer and the model time it saved"""
+    if _answer_seconds is not None:
+        FAQ_SECONDS_SAVED.inc(_answer_seconds)
+    FAQEntry.objects.filter(id=entry_id).update(hit_count=F('hit_count') + 1, last_hit_at=timezone.now())
+
+def record_model_answer(seconds):
+    """Fold the duration of an answer that went through the model into the running average"""
+    global _answer_seconds
+    if _answer_seconds is None:
+        _answer_seconds = seconds
+    else:
+        _answer_seconds += _ANSWER_SECONDS_WEIGHT * (seconds - _answer_seconds)
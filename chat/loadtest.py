@@ -0,0 +1,296 @@
+"""
+Load testing for the chat API
+
+Two parts:
+
+- A stub of the Groq chat completions API (LLMStubServer) that answers after
+  a configurable latency, so load tests exercise the whole request path
+  without calling the real model. Start the app with
+  GROQ_BASE_URL=http://127.0.0.1:9100 and any GROQ_API_KEY to use it.
+- An asyncio load generator (run_load) that replays student questions
+  against POST /api/chat/ with JWT auth at increasing concurrency, and
+  reports throughput, latency percentiles and error rates per step.
+
+Both are run through the ``llm_stub`` and ``loadtest_chat`` management
+commands.
+"""
+import asyncio
+import csv
+import json
+import random
+import statistics
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+
+QUESTION_FIELDS = ('user_message', 'message', 'question', 'title', 'body')
+
+
+class LatencyDistribution:
+    """
+    Random response latency, parsed from "kind:arg[:arg]" in milliseconds
+
+    - fixed:800          always 800ms
+    - uniform:300:1500   between 300ms and 1500ms
+    - normal:800:200     mean 800ms, standard deviation 200ms
+    - lognormal:800:0.5  median 800ms, sigma 0.5 (long right tail, like real LLMs)
+    """
+    KINDS = {'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2}
+
+    def __init__(self, spec):
+        kind, *args = spec.split(':')
+        if kind not in self.KINDS or len(args) != self.KINDS[kind]:
+            raise ValueError(f'Invalid latency "{spec}", expected one of: fixed:MS, uniform:MIN:MAX, normal:MEAN:SD, lognormal:MEDIAN:SIGMA')
+        self.spec = spec
+        self.kind = kind
+        self.args = [float(arg) for arg in args]
+        self._random = random.Random()
+
+    def sample(self):
+        """Returns: float: Latency in seconds"""
+        if self.kind == 'fixed':
+            ms = self.args[0]
+        elif self.kind == 'uniform':
+            ms = self._random.uniform(*self.args)
+        elif self.kind == 'normal':
+            ms = self._random.gauss(*self.args)
+        else:
+            median, sigma = self.args
+            ms = median * self._random.lognormvariate(0, sigma)
+        return max(ms, 0) / 1000
+
+
+# The path the Groq SDK and ChatService post completions to
+COMPLETIONS_PATH = '/openai/v1/chat/completions'
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        stub = self.server.stub
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path.split('?', 1)[0] != COMPLETIONS_PATH:
+            return self._reply(404, {'error': {'message': 'Not found'}})
+
+        time.sleep(stub.latency.sample())
+        if stub.error_rate and random.random() < stub.error_rate:
+            return self._reply(500, {'error': {'message': 'Injected stub error'}})
+
+        try:
+            request = json.loads(body or b'{}')
+            question = request['messages'][-1]['content']
+        except (ValueError, KeyError, IndexError, TypeError):
+            return self._reply(400, {'error': {'message': 'Invalid chat completion request'}})
+
+        prompt_tokens = sum(len(str(message.get('content', '')).split()) for message in request['messages'])
+        self._reply(200, {
+            'id': f'chatcmpl-{uuid.uuid4().hex}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'stub'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': f'[STUB] Answer to: {question}'},
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': stub.completion_tokens,
+                'total_tokens': prompt_tokens + stub.completion_tokens,
+            },
+        })
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LLMStubServer:
+    """
+    Threaded HTTP server speaking the Groq (OpenAI-compatible) chat completions API
+
+    Args:
+        host (str): Interface to bind
+        port (int): Port to bind
+        latency (LatencyDistribution): Delay before each answer
+        error_rate (float): Fraction of requests answered with HTTP 500
+        completion_tokens (int): Completion tokens reported in "usage"
+    """
+    def __init__(self, host, port, latency, error_rate=0.0, completion_tokens=200):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.completion_tokens = completion_tokens
+        self.httpd = ThreadingHTTPServer((host, port), _StubHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.stub = self
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def start(self):
+        """Serve from a background thread"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def load_questions(paths):
+    """
+    Read student questions from files
+
+    Accepts JSON lines (e.g. ``export_chatlogs`` NDJSON or request backlogs,
+    using the first of QUESTION_FIELDS present), CSV with one of those
+    columns, or plain text with one question per line.
+
+    Returns:
+        list: Question strings
+    """
+    questions = []
+    for path in paths:
+        with open(path, encoding='utf-8', newline='') as f:
+            if path.endswith('.csv'):
+                for row in csv.DictReader(f):
+                    question = next((row[field] for field in QUESTION_FIELDS if row.get(field)), None)
+                    if question:
+                        questions.append(question)
+                continue
+
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = line
+                if isinstance(record, dict):
+                    record = next((record[field] for field in QUESTION_FIELDS if record.get(field)), None)
+                if isinstance(record, str) and record.strip():
+                    questions.append(record.strip())
+    return questions
+
+def obtain_token(base_url, username, password):
+    """
+    Get a JWT access token from /api/token/
+
+    Raises:
+        ValueError: If the credentials are rejected
+    """
+    response = httpx.post(f'{base_url}/api/token/', json={'username': username, 'password': password}, timeout=30)
+    if response.status_code != 200:
+        raise ValueError(f'Authentication failed ({response.status_code}): {response.text[:200]}')
+    return response.json()['access']
+
+def _percentile(samples, q):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))
+    return round(ordered[index], 1)
+
+async def _run_step(client, url, headers, questions, concurrency, duration, seed):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration
+    samples = []
+
+    async def worker(number):
+        rng = random.Random(seed * 1000 + number)
+        while loop.time() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await client.post(url, json={'message': rng.choice(questions)}, headers=headers)
+                if response.status_code == 200 and response.json().get('status') == 'success':
+                    outcome = 'ok'
+                else:
+                    outcome = f'http_{response.status_code}'
+            except httpx.TimeoutException:
+                outcome = 'timeout'
+            except (httpx.HTTPError, ValueError):
+                outcome = 'connection_error'
+            samples.append(((time.perf_counter() - start) * 1000, outcome))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(number) for number in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [ms for ms, outcome in samples if outcome == 'ok']
+    errors = {}
+    for ms, outcome in samples:
+        if outcome != 'ok':
+            errors[outcome] = errors.get(outcome, 0) + 1
+    return {
+        'concurrency': concurrency,
+        'requests': len(samples),
+        'succeeded': len(latencies),
+        'duration_seconds': round(elapsed, 2),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0,
+        'error_rate': round(1 - len(latencies) / len(samples), 4) if samples else 0,
+        'errors': errors,
+        'mean_ms': round(statistics.mean(latencies), 1) if latencies else None,
+        'p50_ms': _percentile(latencies, 0.50),
+        'p95_ms': _percentile(latencies, 0.95),
+        'p99_ms': _percentile(latencies, 0.99),
+        'max_ms': round(max(latencies), 1) if latencies else None,
+    }
+
+async def run_load(base_url, token, questions, concurrency_levels, duration=30, timeout=60, seed=1, on_step=None):
+    """
+    Replay questions against POST /api/chat/ at each concurrency level
+
+    Every level runs ``duration`` seconds of closed-loop traffic: each of
+    ``concurrency`` virtual students sends a question, waits for the answer
+    and immediately sends the next one.
+
+    Args:
+        on_step (callable): Called with each step's result as it finishes
+
+    Returns:
+        list: One result dict per concurrency level
+    """
+    url = f'{base_url}/api/chat/'
+    headers = {'Authorization': f'Bearer {token}'}
+    results = []
+    for concurrency in concurrency_levels:
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+            result = await _run_step(client, url, headers, questions, concurrency, duration, seed)
+        results.append(result)
+        if on_step:
+            on_step(result)
+    return results
+
+def compare_runs(current, baseline):
+    """
+    Pair steps of two runs (e.g. WSGI and ASGI) by concurrency
+
+    Returns:
+        list: (concurrency, metric, baseline value, current value)
+    """
+    previous = {step['concurrency']: step for step in baseline['steps']}
+    changes = []
+    for step in current['steps']:
+        before = previous.get(step['concurrency'])
+        if not before:
+            continue
+        for metric in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'error_rate'):
+            changes.append((step['concurrency'], metric, before.get(metric), step.get(metric)))
+    return changes
@@ -0,0 +1,44 @@
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from chat.partitions import is_partitioned, list_partitions, archive_partition, month_start
+
+class Command(BaseCommand):
+    help = 'Archives ChatLog partitions older than the retention period to compressed files and drops them'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-months', type=int, default=None,
+                            help='Months of chat logs to keep in the database (default: settings.CHATLOG_RETENTION_MONTHS)')
+        parser.add_argument('--archive-dir', type=str, default=None,
+                            help='Directory for archive files (default: settings.CHATLOG_ARCHIVE_DIR)')
+        parser.add_argument('--keep-detached', action='store_true', help='Detach archived partitions instead of dropping them')
+        parser.add_argument('--dry-run', action='store_true', help='List the partitions that would be archived')
+    
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql' or not is_partitioned():
+            raise CommandError('chat_chatlog is not partitioned yet. Run "python manage.py partition_chatlog" first.')
+        
+        retention_months = options['retention_months'] or settings.CHATLOG_RETENTION_MONTHS
+        archive_dir = options['archive_dir'] or settings.CHATLOG_ARCHIVE_DIR
+        
+        # Keep the current month plus the previous retention_months - 1 months
+        now = datetime.now(dt_timezone.utc)
+        cutoff = month_start(now.year, now.month - retention_months + 1)
+        expired = [partition for partition in list_partitions() if partition[2] <= cutoff]
+        
+        if not expired:
+            self.stdout.write(f'No partitions older than {cutoff.date()}')
+            return
+        
+        for name, start, end in expired:
+            if options['dry_run']:
+                self.stdout.write(f'Would archive {name} ({start.date()} - {end.date()})')
+                continue
+            
+            path, chat_logs, feedback = archive_partition(
+                name, start, end, archive_dir, drop=not options['keep_detached']
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'Archived {name}: {chat_logs} chat logs, {feedback} feedback entries -> {path}'
+            ))
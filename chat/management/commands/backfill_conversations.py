@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Max, Min
+from chat.models import ChatLog, Conversation
+
+class Command(BaseCommand):
+    help = 'Creates Conversation rows for chat logs recorded before conversations were tracked'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Conversations per insert (default: 1000)')
+    
+    def handle(self, *args, **options):
+        missing = (
+            ChatLog.objects.exclude(conversation_id__isnull=True).exclude(conversation_id='')
+            .exclude(conversation_id__in=Conversation.objects.values('conversation_id'))
+            .order_by()
+            .values('conversation_id')
+            .annotate(
+                first_student_id=Min('student_id'),
+                turn_count=Count('id'),
+                created_at=Min('timestamp'),
+                last_activity_at=Max('timestamp')
+            )
+        )
+        
+        conversations = [
+            Conversation(
+                conversation_id=row['conversation_id'],
+                student_id=row['first_student_id'],
+                turn_count=row['turn_count'],
+                created_at=row['created_at'],
+                last_activity_at=row['last_activity_at']
+            )
+            for row in missing.iterator()
+        ]
+        Conversation.objects.bulk_create(conversations, batch_size=options['batch_size'], ignore_conflicts=True)
+        
+        self.stdout.write(self.style.SUCCESS(f'Created {len(conversations)} conversations'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from chat.faq import build_faq, generate_answers
+from chat.models import FAQEntry
+from chat.rollups import update_rollups
+
+class Command(BaseCommand):
+    help = 'Clusters recent student questions into FAQ entries served without the language model'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help='Question history window in days (default: 90)')
+        parser.add_argument('--top', type=int, default=50, help='Number of question clusters to keep (default: 50)')
+        parser.add_argument('--min-count', type=int, default=5, help='Minimum times a cluster was asked (default: 5)')
+        parser.add_argument('--threshold', type=float, default=0.6,
+                            help='Word overlap (Jaccard) for grouping questions (default: 0.6)')
+        parser.add_argument('--generate', action='store_true',
+                            help='Answer entries without an answer once through the knowledge base and the model')
+        parser.add_argument('--approve-generated', action='store_true',
+                            help='With --generate, serve generated answers without staff review')
+        parser.add_argument('--skip-rollups', action='store_true', help="Don't fold new chat logs into the rollups first")
+    
+    def handle(self, *args, **options):
+        if not options['skip_rollups']:
+            update_rollups()
+        
+        stats = build_faq(options['days'], options['top'], options['min_count'], options['threshold'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{stats["clusters"]} question clusters: {stats["created"]} new entries, {stats["updated"]} updated'
+        ))
+        
+        if options['generate']:
+            pending = FAQEntry.objects.filter(answer='').exclude(status=FAQEntry.STATUS_DISABLED).order_by('-ask_count')
+            answered = generate_answers(pending, approve=options['approve_generated'])
+            self.stdout.write(self.style.SUCCESS(f'Generated {answered} answers'))
+        
+        for entry in FAQEntry.objects.order_by('-ask_count')[:options['top']]:
+            self.stdout.write(f'  {entry.ask_count:>6}  {entry.status:<9} {entry.question[:80]}')
@@ -0,0 +1,39 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from chat.export import EXPORT_FORMATS, export_rows, parse_bound, render_export
+
+class Command(BaseCommand):
+    help = 'Streams chat logs joined with feedback and student details to NDJSON or CSV'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='ndjson', help='Output format (default: ndjson)')
+        parser.add_argument('--start', type=str, help='Earliest date or datetime to include')
+        parser.add_argument('--end', type=str, help='Last date to include, or exclusive datetime bound')
+        parser.add_argument('--program', type=str, help='Only export students in this program')
+        parser.add_argument('--output', '-o', type=str, help='Output file (default: stdout)')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per database round trip (default: 2000)')
+    
+    def handle(self, *args, **options):
+        try:
+            start = parse_bound(options['start'])
+            end = parse_bound(options['end'], end=True)
+        except ValueError as e:
+            raise CommandError(str(e))
+        
+        rows = export_rows(start, end, options['program'], chunk_size=options['chunk_size'])
+        output = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else sys.stdout
+        
+        count = 0
+        try:
+            for line in render_export(rows, options['format']):
+                output.write(line)
+                count += 1
+        finally:
+            if options['output']:
+                output.close()
+        
+        if options['output']:
+            # The CSV header is a line too
+            if options['format'] == 'csv':
+                count -= 1
+            self.stderr.write(self.style.SUCCESS(f'Exported {count} rows to {options["output"]}'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from chat.loadtest import LatencyDistribution, LLMStubServer
+
+class Command(BaseCommand):
+    help = 'Serves a stand-in for the Groq chat completions API with configurable latency, for load tests'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--host', type=str, default='127.0.0.1', help='Interface to bind (default: 127.0.0.1)')
+        parser.add_argument('--port', type=int, default=9100, help='Port to bind (default: 9100)')
+        parser.add_argument('--latency', type=str, default='lognormal:800:0.5',
+                            help='Response latency in ms: fixed:MS, uniform:MIN:MAX, normal:MEAN:SD or '
+                                 'lognormal:MEDIAN:SIGMA (default: lognormal:800:0.5)')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests failing with HTTP 500 (default: 0)')
+        parser.add_argument('--completion-tokens', type=int, default=200, help='Completion tokens reported per answer (default: 200)')
+    
+    def handle(self, *args, **options):
+        try:
+            latency = LatencyDistribution(options['latency'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        
+        server = LLMStubServer(options['host'], options['port'], latency, options['error_rate'], options['completion_tokens'])
+        self.stdout.write(self.style.SUCCESS(
+            f'LLM stub listening on {server.url} ({latency.spec}, {options["error_rate"]:.0%} errors). '
+            f'Start the app with GROQ_BASE_URL={server.url}'
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.shutdown()
@@ -0,0 +1,78 @@
+import asyncio
+import json
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from chat.loadtest import compare_runs, load_questions, obtain_token, run_load
+
+class Command(BaseCommand):
+    help = 'Replays student questions against /api/chat/ at increasing concurrency and reports throughput and latency'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('questions', nargs='+', type=str,
+                            help='Question files: export_chatlogs NDJSON/CSV, JSON lines or plain text')
+        parser.add_argument('--url', type=str, default='http://127.0.0.1:8000', help='Server base URL (default: http://127.0.0.1:8000)')
+        parser.add_argument('--username', type=str, help='User to obtain a JWT for (must have a student profile)')
+        parser.add_argument('--password', type=str, help='Password for --username')
+        parser.add_argument('--token', type=str, help='Existing JWT access token instead of --username/--password')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 5, 10, 25, 50],
+                            help='Concurrent students per step (default: 1 5 10 25 50)')
+        parser.add_argument('--duration', type=int, default=30, help='Seconds per step (default: 30)')
+        parser.add_argument('--timeout', type=float, default=60, help='Request timeout in seconds (default: 60)')
+        parser.add_argument('--label', type=str, default='', help='Name for this run, e.g. "wsgi" or "asgi"')
+        parser.add_argument('--output', '-o', type=str, default='chat_loadtest.json',
+                            help='Where to write the JSON results (default: chat_loadtest.json)')
+        parser.add_argument('--baseline', type=str, help='Earlier results file to compare against')
+    
+    def handle(self, *args, **options):
+        questions = load_questions(options['questions'])
+        if not questions:
+            raise CommandError('No questions found in the given files')
+        
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline'], encoding='utf-8') as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Cannot read baseline {options["baseline"]}: {str(e)}')
+        
+        base_url = options['url'].rstrip('/')
+        token = options['token']
+        if not token:
+            if not (options['username'] and options['password']):
+                raise CommandError('Pass --token or both --username and --password')
+            try:
+                token = obtain_token(base_url, options['username'], options['password'])
+            except Exception as e:
+                raise CommandError(str(e))
+        
+        self.stdout.write(f'{len(questions)} questions, {options["duration"]}s per step against {base_url}')
+        
+        def report_step(step):
+            errors = ', '.join(f'{name} {count}' for name, count in step['errors'].items()) or 'none'
+            self.stdout.write(
+                f'  c={step["concurrency"]:<4} {step["throughput_rps"]:>7.2f} req/s  p50 {step["p50_ms"]}ms  '
+                f'p95 {step["p95_ms"]}ms  p99 {step["p99_ms"]}ms  errors {step["error_rate"]:.1%} ({errors})'
+            )
+        
+        steps = asyncio.run(run_load(
+            base_url, token, questions, options['concurrency'],
+            duration=options['duration'], timeout=options['timeout'], on_step=report_step,
+        ))
+        
+        report = {
+            'label': options['label'],
+            'url': base_url,
+            'generated_at': timezone.now().isoformat(),
+            'questions': len(questions),
+            'duration_seconds': options['duration'],
+            'steps': steps,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
+        
+        if baseline:
+            self.stdout.write(f'{baseline.get("label") or options["baseline"]} -> {options["label"] or "this run"}:')
+            for concurrency, metric, before, after in compare_runs(report, baseline):
+                self.stdout.write(f'  c={concurrency:<4} {metric:<15} {before} -> {after}')
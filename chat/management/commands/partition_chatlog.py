@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from chat.partitions import is_partitioned, convert_to_partitioned, ensure_partitions, list_partitions
+
+class Command(BaseCommand):
+    help = 'Converts ChatLog to monthly Postgres partitions and creates upcoming partitions (safe to run repeatedly)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=3, help='Future months to create partitions for (default: 3)')
+    
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('ChatLog partitioning requires PostgreSQL')
+        
+        months_ahead = options['months_ahead']
+        
+        if not is_partitioned():
+            self.stdout.write('Converting chat_chatlog to a partitioned table...')
+            moved = convert_to_partitioned(months_ahead=months_ahead)
+            self.stdout.write(self.style.SUCCESS(f'Converted chat_chatlog, moved {moved} rows'))
+        else:
+            ensure_partitions(months_ahead=months_ahead)
+        
+        partitions = list_partitions()
+        self.stdout.write(self.style.SUCCESS(f'{len(partitions)} monthly partitions attached'))
+        for name, start, end in partitions:
+            self.stdout.write(f'  {name}: {start.date()} - {end.date()}')
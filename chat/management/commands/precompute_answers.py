@@ -0,0 +1,38 @@
+import time
+from django.core.management.base import BaseCommand
+from chat.precompute import mine_questions, precompute_answers
+
+class Command(BaseCommand):
+    help = 'Answers recent trending and unanswered questions off-peak and stores the answers for daytime requests'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='Question history window in days (default: 7)')
+        parser.add_argument('--top', type=int, default=200, help='Most asked questions to answer (default: 200)')
+        parser.add_argument('--min-count', type=int, default=3, help='Minimum times a question was asked (default: 3)')
+        parser.add_argument('--concurrency', type=int, default=4, help='Questions answered at the same time (default: 4)')
+        parser.add_argument('--timeout', type=int, default=None,
+                            help='Seconds answers are served (default: settings.PRECOMPUTED_ANSWER_SECONDS)')
+        parser.add_argument('--skip-unanswered', action='store_true', help="Don't answer questions that got an error response")
+        parser.add_argument('--force', action='store_true', help='Regenerate answers already stored for the current knowledge base')
+        parser.add_argument('--dry-run', action='store_true', help='List the questions without answering them')
+    
+    def handle(self, *args, **options):
+        questions = mine_questions(
+            options['days'], options['top'], options['min_count'], include_unanswered=not options['skip_unanswered']
+        )
+        unanswered = sum(1 for item in questions if item['unanswered'])
+        self.stdout.write(f'{len(questions)} questions from the last {options["days"]} days ({unanswered} unanswered)')
+        
+        if options['dry_run']:
+            for item in questions:
+                flag = 'unanswered' if item['unanswered'] else ''
+                program = f'{item["program"]} (year {item["year"]})' if item['year'] else item['program']
+                self.stdout.write(f'  {item["count"]:>6}  {program[:35]:<35} {flag:<10} {item["question"][:80]}')
+            return
+        
+        start = time.perf_counter()
+        stats = precompute_answers(questions, options['concurrency'], options['timeout'], options['force'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {stats["stored"]} answers for knowledge base version {stats["version"]} '
+            f'({stats["skipped"]} skipped, {stats["failed"]} failed) in {time.perf_counter() - start:.1f}s'
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from chat.partitions import maintain_partitions
+from chat.rollups import update_rollups, SETTLE_SECONDS
+import time
+
+class Command(BaseCommand):
+    help = 'Folds new chat logs and feedback into the dashboard rollup tables'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows processed per transaction (default: 5000)')
+        parser.add_argument('--settle-seconds', type=int, default=SETTLE_SECONDS,
+                            help=f'Leave rows younger than this for the next run (default: {SETTLE_SECONDS})')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Keep running, updating every N seconds (default: run once)')
+    
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            # Keep upcoming ChatLog partitions ahead of the calendar
+            maintain_partitions()
+            stats = update_rollups(options['batch_size'], options['settle_seconds'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Rolled up {stats["chat_logs"]} chat logs and {stats["feedback"]} feedback entries'
+            ))
+            
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
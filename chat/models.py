@@ -1,16 +1,56 @@
+from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
 from django.db import models
+from django.utils import timezone
 from users.models import StudentProfile
 
 # Create your models here.
+class Conversation(models.Model):
+    conversation_id = models.CharField(max_length=50, unique=True)
+    student = models.ForeignKey(StudentProfile, on_delete=models.CASCADE, related_name="conversations")
+    turn_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    last_activity_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', '-last_activity_at']),
+        ]
+    
+    def __str__(self):
+        return f"Conversation {self.conversation_id} ({self.turn_count} turns)"
+
+
+# Full-text search documents for admin search. Queries must use these exact
+# expressions for Postgres to use the GIN indexes built on them.
+CHATLOG_SEARCH_VECTOR = SearchVector('user_message', 'ai_response', config='english')
+FEEDBACK_SEARCH_VECTOR = SearchVector('comment', config='english')
+
+
 class ChatLog(models.Model):
+    # Once partitioned (see chat/partitions.py) the table's primary key is
+    # (id, timestamp); Django keeps using id, which the sequence keeps unique
     student = models.ForeignKey(StudentProfile, on_delete=models.CASCADE, related_name="chats")
     user_message = models.TextField()
     ai_response = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
     conversation_id = models.CharField(max_length=50, blank=True, null=True)
+    # Top knowledge base source the answer was based on (for rating rollups)
+    source_url = models.URLField(max_length=500, blank=True, null=True)
     
     class Meta:
-        ordering = ['-timestamp']
+        # No default ordering: ChatLog is partitioned by month on timestamp
+        # (see chat/partitions.py) and an implicit ORDER BY on every query
+        # forces a sort across all partitions
+        indexes = [
+            models.Index(fields=['conversation_id', 'timestamp']),
+            models.Index(fields=['student', 'timestamp']),
+            # Newest-first admin changelist
+            models.Index(fields=['timestamp', 'id']),
+            GinIndex(CHATLOG_SEARCH_VECTOR, name='chatlog_search_idx'),
+        ]
     
     def __str__(self):
         return f"Chat with {self.student.name} at {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
@@ -25,10 +65,135 @@ class Feedback(models.Model):
         (5, '5 - Extremely helpful'),
     ]
     
-    chat_log = models.ForeignKey(ChatLog, on_delete=models.CASCADE, related_name="feedbacks")
+    # Postgres can't reference a partitioned table by id alone, so the
+    # relation is enforced by Django rather than a database constraint
+    chat_log = models.ForeignKey(ChatLog, on_delete=models.CASCADE, related_name="feedbacks", db_constraint=False)
     rating = models.IntegerField(choices=RATING_CHOICES)
     comment = models.TextField(blank=True, null=True)
     submitted_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            GinIndex(FEEDBACK_SEARCH_VECTOR, name='feedback_comment_search_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Feedback for chat #{self.chat_log_id} - Rating: {self.rating}"
+
+
+class UsageRollup(models.Model):
+    """
+    Chat and feedback counts per hour or day, program and knowledge source
+    
+    Maintained incrementally by chat.rollups.update_rollups so dashboards
+    never aggregate ChatLog or Feedback directly.
+    """
+    HOUR = 'hour'
+    DAY = 'day'
+    GRANULARITY_CHOICES = [
+        (HOUR, 'Hourly'),
+        (DAY, 'Daily'),
+    ]
+    
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    period_start = models.DateTimeField()
+    program = models.CharField(max_length=100, blank=True, default='')
+    source_url = models.CharField(max_length=500, blank=True, default='')
+    message_count = models.PositiveIntegerField(default=0)
+    feedback_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['granularity', 'period_start', 'program', 'source_url'],
+                name='unique_usage_rollup'
+            ),
+        ]
+    
+    @property
+    def average_rating(self):
+        return self.rating_sum / self.feedback_count if self.feedback_count else None
+    
+    def __str__(self):
+        return f"{self.get_granularity_display()} usage from {self.period_start:%Y-%m-%d %H:%M}"
+
+
+class QuestionRollup(models.Model):
+    """
+    Daily count of each normalized student question
+    """
+    day = models.DateField()
+    question_hash = models.CharField(max_length=40)
+    question = models.CharField(max_length=255)
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'question_hash'], name='unique_question_rollup'),
+        ]
+    
+    def __str__(self):
+        return f"{self.question} ({self.count} on {self.day})"
+
+
+class RollupWatermark(models.Model):
+    """
+    Highest ChatLog/Feedback id already folded into the rollups
+    """
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} watermark at {self.last_id}"
+
+
+class FAQEntry(models.Model):
+    """
+    A frequently asked question answered without calling the language model
+    
+    Built offline by chat.faq.build_faq from clusters of similar questions
+    in QuestionRollup. Only approved entries with an answer are served.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_APPROVED = 'approved'
+    STATUS_DISABLED = 'disabled'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending review'),
+        (STATUS_APPROVED, 'Approved'),
+        (STATUS_DISABLED, 'Disabled'),
+    ]
+    SOURCE_STAFF = 'staff'
+    SOURCE_GENERATED = 'generated'
+    SOURCE_CHOICES = [
+        (SOURCE_STAFF, 'Written by staff'),
+        (SOURCE_GENERATED, 'Generated'),
+    ]
+    
+    question = models.CharField(max_length=255)
+    # sha1 of the normalized question the cluster was first built around
+    cluster_hash = models.CharField(max_length=40, unique=True)
+    variants = ArrayField(models.CharField(max_length=255), default=list, blank=True,
+                          help_text="Normalized phrasings matched to this entry")
+    ask_count = models.PositiveIntegerField(default=0, help_text="Times the cluster was asked in the build window")
+    answer = models.TextField(blank=True)
+    answer_source = models.CharField(max_length=20, choices=SOURCE_CHOICES, blank=True)
+    source_url = models.URLField(max_length=500, blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    approved_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="approved_faqs")
+    approved_at = models.DateTimeField(blank=True, null=True)
+    hit_count = models.PositiveIntegerField(default=0)
+    last_hit_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "FAQ entry"
+        verbose_name_plural = "FAQ entries"
+        indexes = [
+            models.Index(fields=['status', '-ask_count']),
+        ]
+    
     def __str__(self):
-        return f"Feedback for chat #{self.chat_log.id} - Rating: {self.rating}"
+        return f"{self.question} ({self.get_status_display()})"
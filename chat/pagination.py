@@ -0,0 +1,70 @@
+"""
+Keyset (cursor) pagination for chat history
+"""
+import base64
+from datetime import datetime
+from django.db.models import Q
+
+def encode_cursor(chat_log):
+    """
+    Build an opaque cursor pointing at a chat log
+
+    Args:
+        chat_log (ChatLog): Oldest turn of the current page
+
+    Returns:
+        str: URL-safe cursor
+    """
+    raw = f"{chat_log.timestamp.isoformat()}|{chat_log.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """
+    Parse a cursor created by encode_cursor
+
+    Args:
+        cursor (str): Cursor from a previous page
+
+    Returns:
+        tuple: (timestamp, id)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        timestamp, chat_log_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(chat_log_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def paginate_before(queryset, cursor=None, limit=20):
+    """
+    Fetch the newest ``limit`` turns older than the cursor
+
+    Seeks on (timestamp, id) so every page costs the same regardless of how
+    deep into the conversation it is, using the (conversation_id, timestamp)
+    index.
+
+    Args:
+        queryset: ChatLog queryset already filtered to one conversation
+        cursor (str): Cursor from a previous page (optional, newest page if omitted)
+        limit (int): Page size
+
+    Returns:
+        tuple: (turns in chronological order, cursor for the next older page or None)
+    """
+    if cursor:
+        timestamp, chat_log_id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=chat_log_id)
+        )
+
+    # Fetch one extra row to know whether an older page exists
+    page = list(queryset.order_by('-timestamp', '-id')[:limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    next_cursor = encode_cursor(page[-1]) if has_more else None
+    page.reverse()
+    return page, next_cursor
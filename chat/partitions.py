@@ -0,0 +1,311 @@
+"""
+Monthly Postgres partitioning for the ChatLog table
+
+chat_chatlog is turned into a table partitioned by RANGE ("timestamp") with
+one partition per calendar month (chat_chatlog_pYYYY_MM) plus a DEFAULT
+partition that catches rows outside the prepared range. Queries filtering
+on timestamp only touch the matching months, and old months can be
+archived and dropped as a whole instead of deleting rows one by one.
+
+Upcoming months are created by partition_chatlog and by every
+update_rollups run (maintain_partitions). Rows that still reached the
+DEFAULT partition are moved into their month when it is created.
+
+The table's primary key is ("id", "timestamp"), as Postgres requires the
+partition key in every unique constraint, while the ChatLog model still
+declares ``id`` as its primary key. ``id`` stays unique through its
+sequence and is what Django uses for lookups, but the database no longer
+enforces it, and no foreign key can reference chat_chatlog (Feedback.chat_log
+uses db_constraint=False).
+"""
+import gzip
+import json
+import logging
+import os
+import re
+from datetime import datetime, timezone as dt_timezone
+from django.db import connection, transaction
+from chat.models import ChatLog, Feedback
+
+logger = logging.getLogger(__name__)
+
+TABLE = ChatLog._meta.db_table
+LEGACY_TABLE = f"{TABLE}_legacy"
+DEFAULT_PARTITION = f"{TABLE}_default"
+PARTITION_RE = re.compile(rf"^{TABLE}_p(\d{{4}})_(\d{{2}})$")
+
+
+def month_start(year, month):
+    """First instant of a month in UTC, normalising month overflow"""
+    year, month = year + (month - 1) // 12, (month - 1) % 12 + 1
+    return datetime(year, month, 1, tzinfo=dt_timezone.utc)
+
+def partition_name(year, month):
+    return f"{TABLE}_p{year:04d}_{month:02d}"
+
+def is_partitioned():
+    """
+    Check whether chat_chatlog is already a partitioned table
+
+    Returns:
+        bool: True once convert_to_partitioned has run
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+            [TABLE]
+        )
+        return cursor.fetchone() is not None
+
+def list_partitions():
+    """
+    List the monthly partitions attached to chat_chatlog
+
+    Returns:
+        list: (name, start, end) tuples ordered by month
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s",
+            [TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    for name in names:
+        match = PARTITION_RE.match(name)
+        if match:
+            year, month = int(match.group(1)), int(match.group(2))
+            partitions.append((name, month_start(year, month), month_start(year, month + 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+def _create_partition_sql(year, month):
+    start, end = month_start(year, month), month_start(year, month + 1)
+    return (
+        f'CREATE TABLE IF NOT EXISTS "{partition_name(start.year, start.month)}" '
+        f'PARTITION OF "{TABLE}" FOR VALUES FROM (\'{start.isoformat()}\') TO (\'{end.isoformat()}\')'
+    )
+
+def _table_exists(cursor, name):
+    cursor.execute("SELECT to_regclass(%s)", [f'"{name}"'])
+    return cursor.fetchone()[0] is not None
+
+def create_partition(year, month):
+    """
+    Create one month's partition, moving rows that already landed in DEFAULT
+
+    Postgres refuses to create a partition while the DEFAULT partition holds
+    rows of its range, so those rows are moved into a new table that is then
+    attached as the month's partition. The DEFAULT partition is locked
+    against inserts meanwhile.
+
+    Args:
+        year (int): Year of the month
+        month (int): Month (1-12)
+
+    Returns:
+        int: Rows moved out of the DEFAULT partition, or None if the partition already existed
+    """
+    start, end = month_start(year, month), month_start(year, month + 1)
+    name = partition_name(start.year, start.month)
+    with transaction.atomic(), connection.cursor() as cursor:
+        if _table_exists(cursor, name):
+            return None
+
+        stranded = False
+        if _table_exists(cursor, DEFAULT_PARTITION):
+            cursor.execute(f'LOCK TABLE "{DEFAULT_PARTITION}" IN SHARE ROW EXCLUSIVE MODE')
+            cursor.execute(
+                f'SELECT EXISTS (SELECT 1 FROM "{DEFAULT_PARTITION}" WHERE "timestamp" >= %s AND "timestamp" < %s)',
+                [start, end]
+            )
+            stranded = cursor.fetchone()[0]
+
+        if not stranded:
+            cursor.execute(_create_partition_sql(start.year, start.month))
+            return 0
+
+        cursor.execute(f'CREATE TABLE "{name}" (LIKE "{TABLE}" INCLUDING DEFAULTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *) '
+            f'INSERT INTO "{name}" SELECT * FROM moved',
+            [start, end]
+        )
+        moved = cursor.rowcount
+        # Attaching creates the parent's indexes and foreign keys on the new table
+        cursor.execute(
+            f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{name}" '
+            f'FOR VALUES FROM (\'{start.isoformat()}\') TO (\'{end.isoformat()}\')'
+        )
+    logger.warning(f"Created {name} and moved {moved} chat logs into it from {DEFAULT_PARTITION}")
+    return moved
+
+def ensure_partitions(months_ahead=3, now=None):
+    """
+    Create partitions for the current month and the next ``months_ahead``
+
+    Args:
+        months_ahead (int): Future months to prepare
+        now (datetime): Reference time (defaults to now)
+
+    Returns:
+        list: Names of the partitions that now exist for that window
+    """
+    now = now or datetime.now(dt_timezone.utc)
+    names = []
+    for offset in range(months_ahead + 1):
+        start = month_start(now.year, now.month + offset)
+        create_partition(start.year, start.month)
+        names.append(partition_name(start.year, start.month))
+    return names
+
+def maintain_partitions(months_ahead=3):
+    """
+    ensure_partitions for periodic jobs: does nothing unless chat_chatlog
+    has been converted to a partitioned table
+
+    Returns:
+        list: Names of the partitions for the window (empty if not partitioned)
+    """
+    if connection.vendor != 'postgresql' or not is_partitioned():
+        return []
+    return ensure_partitions(months_ahead)
+
+def convert_to_partitioned(months_ahead=3):
+    """
+    Rebuild chat_chatlog as a monthly partitioned table, keeping all rows
+
+    Runs in a single transaction: the existing table is renamed, a
+    partitioned table with the same columns, indexes and foreign keys takes
+    its place, rows are copied across and the old table is dropped. The
+    primary key becomes (id, timestamp) because Postgres requires the
+    partition key in every unique constraint; ids stay unique through the
+    identity sequence.
+
+    Args:
+        months_ahead (int): Future months to prepare
+
+    Returns:
+        int: Number of rows moved
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{LEGACY_TABLE}"')
+
+        # Capture secondary indexes and outgoing foreign keys, then free their names
+        cursor.execute(
+            "SELECT i.relname, pg_get_indexdef(i.oid) FROM pg_index x "
+            "JOIN pg_class i ON i.oid = x.indexrelid "
+            "WHERE x.indrelid = %s::regclass AND NOT x.indisprimary",
+            [LEGACY_TABLE]
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [LEGACY_TABLE]
+        )
+        foreign_keys = cursor.fetchall()
+        # Incoming foreign keys (Feedback.chat_log) can't target a partitioned table
+        cursor.execute(
+            "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+            "WHERE confrelid = %s::regclass AND contype = 'f'",
+            [LEGACY_TABLE]
+        )
+        incoming = cursor.fetchall()
+
+        for table, name in incoming:
+            cursor.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"')
+        for name, _ in foreign_keys:
+            cursor.execute(f'ALTER TABLE "{LEGACY_TABLE}" DROP CONSTRAINT "{name}"')
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX "{name}"')
+
+        cursor.execute(
+            f'CREATE TABLE "{TABLE}" (LIKE "{LEGACY_TABLE}" INCLUDING DEFAULTS INCLUDING IDENTITY) '
+            f'PARTITION BY RANGE ("timestamp")'
+        )
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD PRIMARY KEY ("id", "timestamp")')
+
+        # Tables created before identity columns use a serial sequence owned
+        # by the old table; hand it over so it survives the drop
+        cursor.execute(f"SELECT pg_get_serial_sequence('\"{LEGACY_TABLE}\"', 'id')")
+        legacy_sequence = cursor.fetchone()[0]
+        cursor.execute(f"SELECT pg_get_serial_sequence('\"{TABLE}\"', 'id')")
+        if cursor.fetchone()[0] is None and legacy_sequence:
+            cursor.execute(f'ALTER SEQUENCE {legacy_sequence} OWNED BY "{TABLE}"."id"')
+
+        # One partition for every month that has data, plus the months ahead
+        cursor.execute(f'SELECT MIN("timestamp"), MAX("timestamp") FROM "{LEGACY_TABLE}"')
+        oldest, newest = cursor.fetchone()
+        now = datetime.now(dt_timezone.utc)
+        oldest = oldest or now
+        newest = max(newest or now, now)
+        months = (newest.year - oldest.year) * 12 + newest.month - oldest.month
+        for offset in range(months + months_ahead + 1):
+            start = month_start(oldest.year, oldest.month + offset)
+            cursor.execute(_create_partition_sql(start.year, start.month))
+        cursor.execute(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{TABLE}" DEFAULT')
+
+        # Indexes on the parent cascade to every partition
+        for name, definition in indexes:
+            cursor.execute(re.sub(rf'ON (\w+\.)?"?{LEGACY_TABLE}"? ', f'ON "{TABLE}" ', definition, count=1))
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{name}" {definition}')
+
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{LEGACY_TABLE}"')
+        moved = cursor.rowcount
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence('\"{TABLE}\"', 'id'), "
+            f'COALESCE((SELECT MAX("id") FROM "{TABLE}"), 0) + 1, false)'
+        )
+        cursor.execute(f'DROP TABLE "{LEGACY_TABLE}"')
+
+    return moved
+
+def archive_partition(name, start, end, archive_dir, drop=True):
+    """
+    Write a month of chat logs and their feedback to a compressed file
+
+    Rows are streamed with a server-side cursor into
+    ``<archive_dir>/<partition>.ndjson.gz`` (one JSON object per line with a
+    "type" of "chat_log" or "feedback"). The partition is then detached and,
+    unless ``drop`` is False, dropped along with the archived feedback.
+
+    Args:
+        name (str): Partition table name
+        start (datetime): Inclusive lower bound of the partition
+        end (datetime): Exclusive upper bound of the partition
+        archive_dir (str): Directory for archive files
+        drop (bool): Drop the partition after detaching it
+
+    Returns:
+        tuple: (archive path, chat logs archived, feedback archived)
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.ndjson.gz")
+
+    month_logs = ChatLog.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    month_feedback = Feedback.objects.filter(chat_log_id__in=month_logs.values('id'))
+    chat_logs = feedback_count = 0
+
+    # Write to a temporary file so a crash never leaves a truncated archive
+    with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as archive_file:
+        for row in month_logs.order_by().values().iterator(chunk_size=2000):
+            archive_file.write(json.dumps({'type': 'chat_log', **row}, default=str) + '\n')
+            chat_logs += 1
+        for row in month_feedback.order_by().values().iterator(chunk_size=2000):
+            archive_file.write(json.dumps({'type': 'feedback', **row}, default=str) + '\n')
+            feedback_count += 1
+    os.replace(path + '.tmp', path)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        month_feedback.delete()
+        cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"')
+        if drop:
+            cursor.execute(f'DROP TABLE "{name}"')
+
+    return path, chat_logs, feedback_count
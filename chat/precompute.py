@@ -0,0 +1,206 @@
+"""
+Off-peak answer precomputation
+
+The model is slowest and most rate limited at peak daytime load, while most
+of that traffic repeats questions asked the days before. precompute_answers
+(run nightly by ``manage.py precompute_answers``) mines recent ChatLog
+questions, both the most asked ones and the ones the model failed to answer,
+generates answers for them with bounded concurrency and stores them in
+ANSWER_CACHE. ChatService serves a stored answer instead of calling the model
+when the same question comes in.
+
+Stored answers are keyed by the knowledge base version, so they are only
+served while the KnowledgeBase they were generated from is unchanged, and by
+program and year of study for programs with a context set (see
+crawler.programs, which ranks entries mentioning the student's level
+higher), so students get the same program-aware answer they would have got
+from the model.
+"""
+import hashlib
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, Max
+from django.utils import timezone
+from core.cache import ANSWER_CACHE, KB_CACHE
+from core.metrics import PRECOMPUTED_ANSWER_LOOKUPS, PRECOMPUTED_ANSWERS
+from core.tracing import set_span_attributes
+from chat.faq import find_faq
+from chat.models import ChatLog
+from chat.rollups import normalize_question
+from crawler.models import KnowledgeBase
+from crawler.programs import get_program_candidates, program_key
+from users.models import StudentProfile
+
+logger = logging.getLogger(__name__)
+
+_KB_VERSION_KEY = 'version'
+
+
+def knowledge_base_version():
+    """
+    A version string that changes whenever a KnowledgeBase entry is added,
+    changed or deleted, cached for KB_VERSION_CACHE_SECONDS
+
+    Returns:
+        str: "<entry count>-<latest last_updated timestamp>"
+    """
+    def compute():
+        stats = KnowledgeBase.objects.aggregate(count=Count('id'), updated=Max('last_updated'))
+        updated = stats['updated'].timestamp() if stats['updated'] else 0
+        return f"{stats['count']}-{updated:.6f}"
+
+    return KB_CACHE.get_or_compute(_KB_VERSION_KEY, compute, timeout=settings.KB_VERSION_CACHE_SECONDS)
+
+def answer_program(program):
+    """
+    The program key answers are stored under: the normalized program when it
+    has a context set, otherwise "" (retrieval is the same for every such student)
+    """
+    key = program_key(program)
+    return key if key and get_program_candidates(key) else ''
+
+def _answer_key(version, question, program, year=None):
+    digest = hashlib.sha1(f'{program}|{year or ""}|{question}'.encode('utf-8')).hexdigest()
+    return f'precomputed:{version}:{digest}'
+
+def get_precomputed_answer(message, student=None):
+    """
+    The stored answer for a message, if one was precomputed for the current
+    knowledge base
+
+    Args:
+        message (str): The student's question
+        student (StudentProfile): Selects the answer for the student's program
+            and year (optional)
+
+    Returns:
+        tuple: (answer text, list of source dicts), or None
+    """
+    question = normalize_question(message)
+    program = answer_program(student.program) if student is not None else ''
+    year = student.year_of_study if program else None
+    stored = ANSWER_CACHE.get(_answer_key(knowledge_base_version(), question, program, year))
+    PRECOMPUTED_ANSWER_LOOKUPS.labels('miss' if stored is None else 'hit').inc()
+    if stored is not None:
+        set_span_attributes({'precomputed.program': program, 'precomputed.year': year or 0})
+    return stored
+
+
+def mine_questions(days=7, top=200, min_count=3, include_unanswered=True):
+    """
+    Questions worth answering ahead of time
+
+    Questions are grouped by normalized text, answer program and (for
+    programs with a context set) year of study. The most
+    asked groups are kept, plus every group the model failed to answer
+    (the fallback error responses), however rarely it was asked.
+
+    Args:
+        days (int): ChatLog history window
+        top (int): Most asked questions to keep
+        min_count (int): Minimum times a question was asked
+        include_unanswered (bool): Also keep questions that got an error response
+
+    Returns:
+        list: Dicts with question (a phrasing students used), program, year
+              (None unless the program has a context set), count and unanswered
+    """
+    from chat.services import ChatService
+
+    failures = {ChatService.UNAVAILABLE_RESPONSE, ChatService.API_ERROR_RESPONSE}
+    since = timezone.now() - timedelta(days=days)
+    counts = Counter()
+    unanswered = set()
+    phrasings = {}
+    programs = {}
+
+    rows = ChatLog.objects.filter(timestamp__gte=since).values_list(
+        'user_message', 'ai_response', 'student__program', 'student__year_of_study'
+    )
+    for message, response, program, year in rows.iterator(chunk_size=2000):
+        if program not in programs:
+            programs[program] = answer_program(program)
+        question = normalize_question(message)
+        if not question:
+            continue
+        key = (question, programs[program], year if programs[program] else None)
+        counts[key] += 1
+        phrasings.setdefault(key, message.strip())
+        if response in failures:
+            unanswered.add(key)
+
+    keys = [key for key, count in counts.most_common() if count >= min_count][:top]
+    if include_unanswered:
+        trending = set(keys)
+        keys += sorted((key for key in unanswered if key not in trending), key=lambda key: -counts[key])
+    return [
+        {'question': phrasings[key], 'program': key[1], 'year': key[2], 'count': counts[key], 'unanswered': key in unanswered}
+        for key in keys
+    ]
+
+def precompute_answers(questions, concurrency=4, timeout=None, force=False):
+    """
+    Generate answers for mined questions and store them in ANSWER_CACHE
+
+    Questions an approved FAQ entry already answers (for students it is
+    served to, see ChatService), and (unless force) questions already stored
+    for the current knowledge base, are skipped.
+    Error and demo mode responses are not stored.
+
+    Args:
+        questions (list): Output of mine_questions
+        concurrency (int): Questions answered at the same time
+        timeout (int): Seconds an answer is served (default: PRECOMPUTED_ANSWER_SECONDS)
+        force (bool): Regenerate answers that are already stored
+
+    Returns:
+        dict: Counts of stored, skipped and failed questions, and the knowledge base version
+    """
+    from chat.services import ChatService
+
+    timeout = settings.PRECOMPUTED_ANSWER_SECONDS if timeout is None else timeout
+    version = knowledge_base_version()
+    stats = {'stored': 0, 'skipped': 0, 'failed': 0, 'version': version}
+
+    pending = []
+    for item in questions:
+        key = _answer_key(version, normalize_question(item['question']), item['program'], item.get('year'))
+        answered_by_faq = settings.FAQ_ENABLED and not item['program'] and find_faq(item['question'])[0] is not None
+        if answered_by_faq or (not force and ANSWER_CACHE.get(key) is not None):
+            stats['skipped'] += 1
+            PRECOMPUTED_ANSWERS.labels('skipped').inc()
+            continue
+        pending.append((key, item))
+
+    def answer(item):
+        try:
+            # Program-aware retrieval depends on the program and the year
+            # (entries mentioning the student's level rank higher)
+            student = StudentProfile(program=item['program'], year_of_study=item.get('year')) if item['program'] else None
+            return ChatService().answer_question(item['question'], student)
+        finally:
+            # Worker threads hold their own database connections
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='precompute') as executor:
+        futures = {executor.submit(answer, item): (key, item) for key, item in pending}
+        for future in as_completed(futures):
+            key, item = futures[future]
+            try:
+                ai_response, sources = future.result()
+            except Exception as e:
+                logger.error(f"Failed to precompute an answer for '{item['question'][:80]}': {str(e)}")
+                ai_response, sources = None, []
+            if ai_response is None or ChatService.is_fallback_response(ai_response):
+                stats['failed'] += 1
+                PRECOMPUTED_ANSWERS.labels('failed').inc()
+                continue
+            ANSWER_CACHE.set(key, (ai_response, sources), timeout)
+            stats['stored'] += 1
+            PRECOMPUTED_ANSWERS.labels('stored').inc()
+
+    return stats
@@ -0,0 +1,246 @@
+"""
+Incremental usage and feedback rollups for the dashboard
+
+ChatLog and Feedback rows are folded into UsageRollup (hourly and daily
+counts per program and knowledge source) and QuestionRollup (daily counts
+per normalized question) in id order. A RollupWatermark per table records
+the last id processed, so each run only reads rows added since the previous
+one and reports read a few rows per day instead of every message.
+"""
+import hashlib
+import re
+from datetime import timedelta
+from django.db import connection, transaction
+from django.db.models import Max, Sum
+from django.db.models.functions import Substr
+from django.utils import timezone
+from chat.models import ChatLog, Feedback, UsageRollup, QuestionRollup, RollupWatermark
+
+CHAT_LOG_WATERMARK = 'chat_log'
+FEEDBACK_WATERMARK = 'feedback'
+
+# Rows younger than this are left for the next run: ids are assigned at
+# insert time, so a transaction still in flight can commit a lower id than
+# rows that are already visible
+SETTLE_SECONDS = 60
+
+# Rows per INSERT ... ON CONFLICT statement
+UPSERT_CHUNK_SIZE = 1000
+
+
+def normalize_question(text):
+    """
+    Reduce a question to a canonical form for counting
+
+    Args:
+        text (str): Student message
+
+    Returns:
+        str: Lowercased words without punctuation, at most 255 characters
+    """
+    text = re.sub(r'[^\w\s]', ' ', text.lower())
+    return ' '.join(text.split())[:255]
+
+def _hour(timestamp):
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+def _day(timestamp):
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def _increment(model, key_fields, counter_fields, rows, extra_fields=()):
+    """
+    Add counters to rollup rows, creating missing rows
+
+    Args:
+        model: Rollup model with a unique constraint on key_fields
+        key_fields (list): Columns identifying a rollup row
+        counter_fields (list): Columns to add to
+        rows (dict): key tuple -> dict of counter values (and extra_fields)
+        extra_fields (tuple): Columns only written when the row is created
+    """
+    if not rows:
+        return
+
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = list(key_fields) + list(extra_fields) + list(counter_fields)
+    updates = ', '.join(f'{field} = {table}.{field} + EXCLUDED.{field}' for field in counter_fields)
+    placeholder = '(' + ', '.join(['%s'] * len(columns)) + ')'
+
+    items = list(rows.items())
+    with connection.cursor() as cursor:
+        for i in range(0, len(items), UPSERT_CHUNK_SIZE):
+            chunk = items[i:i + UPSERT_CHUNK_SIZE]
+            params = []
+            for key, values in chunk:
+                params.extend(key)
+                params.extend(values[field] for field in extra_fields)
+                params.extend(values[field] for field in counter_fields)
+            cursor.execute(
+                f'INSERT INTO {table} ({", ".join(columns)}) '
+                f'VALUES {", ".join([placeholder] * len(chunk))} '
+                f'ON CONFLICT ({", ".join(key_fields)}) DO UPDATE SET {updates}',
+                params
+            )
+
+def _claim_watermark(name):
+    """Lock a watermark row so concurrent runs can't fold the same rows twice"""
+    RollupWatermark.objects.get_or_create(name=name)
+    return RollupWatermark.objects.select_for_update().get(name=name)
+
+def _settled(rows, cutoff):
+    """Keep the leading rows created before the cutoff"""
+    for index, row in enumerate(rows):
+        if row[1] >= cutoff:
+            return rows[:index]
+    return rows
+
+def _add_usage(usage, timestamp, program, source_url, **counters):
+    for granularity, period_start in ((UsageRollup.HOUR, _hour(timestamp)), (UsageRollup.DAY, _day(timestamp))):
+        key = (granularity, period_start, program or '', source_url or '')
+        totals = usage.setdefault(key, {'message_count': 0, 'feedback_count': 0, 'rating_sum': 0})
+        for field, value in counters.items():
+            totals[field] += value
+
+def _fold_chat_logs(batch_size, cutoff):
+    """Fold the next batch of chat logs into the rollups"""
+    with transaction.atomic():
+        watermark = _claim_watermark(CHAT_LOG_WATERMARK)
+        rows = list(
+            ChatLog.objects.filter(id__gt=watermark.last_id)
+            .order_by('id')
+            .annotate(question_text=Substr('user_message', 1, 1000))
+            .values_list('id', 'timestamp', 'student__program', 'source_url', 'question_text')[:batch_size]
+        )
+        rows = _settled(rows, cutoff)
+        if not rows:
+            return 0
+
+        usage = {}
+        questions = {}
+        for _, timestamp, program, source_url, question_text in rows:
+            _add_usage(usage, timestamp, program, source_url, message_count=1)
+
+            question = normalize_question(question_text)
+            if question:
+                question_hash = hashlib.sha1(question.encode('utf-8')).hexdigest()
+                entry = questions.setdefault((_day(timestamp).date(), question_hash), {'question': question, 'count': 0})
+                entry['count'] += 1
+
+        _increment(UsageRollup, ['granularity', 'period_start', 'program', 'source_url'],
+                   ['message_count', 'feedback_count', 'rating_sum'], usage)
+        _increment(QuestionRollup, ['day', 'question_hash'], ['count'], questions, extra_fields=('question',))
+
+        watermark.last_id = rows[-1][0]
+        watermark.save(update_fields=['last_id', 'updated_at'])
+        return len(rows)
+
+def _fold_feedback(batch_size, cutoff):
+    """Fold the next batch of feedback into the rollups"""
+    with transaction.atomic():
+        watermark = _claim_watermark(FEEDBACK_WATERMARK)
+        rows = list(
+            Feedback.objects.filter(id__gt=watermark.last_id)
+            .order_by('id')
+            .values_list('id', 'submitted_at', 'rating', 'chat_log__student__program', 'chat_log__source_url')[:batch_size]
+        )
+        rows = _settled(rows, cutoff)
+        if not rows:
+            return 0
+
+        usage = {}
+        for _, submitted_at, rating, program, source_url in rows:
+            _add_usage(usage, submitted_at, program, source_url, feedback_count=1, rating_sum=rating)
+
+        _increment(UsageRollup, ['granularity', 'period_start', 'program', 'source_url'],
+                   ['message_count', 'feedback_count', 'rating_sum'], usage)
+
+        watermark.last_id = rows[-1][0]
+        watermark.save(update_fields=['last_id', 'updated_at'])
+        return len(rows)
+
+def update_rollups(batch_size=5000, settle_seconds=SETTLE_SECONDS):
+    """
+    Fold every chat log and feedback entry added since the last run
+
+    Each batch commits together with its watermark, so an interrupted run
+    resumes where it stopped without double counting.
+
+    Args:
+        batch_size (int): Rows read per transaction
+        settle_seconds (int): Skip rows newer than this for now
+
+    Returns:
+        dict: Number of chat logs and feedback entries processed
+    """
+    cutoff = timezone.now() - timedelta(seconds=settle_seconds)
+    stats = {'chat_logs': 0, 'feedback': 0}
+
+    for key, fold in (('chat_logs', _fold_chat_logs), ('feedback', _fold_feedback)):
+        while True:
+            processed = fold(batch_size, cutoff)
+            stats[key] += processed
+            if processed < batch_size:
+                break
+
+    return stats
+
+def _rating_summary(queryset, group_field):
+    summary = []
+    for row in queryset.values(group_field).annotate(
+        messages=Sum('message_count'), feedback=Sum('feedback_count'), ratings=Sum('rating_sum')
+    ).order_by(group_field):
+        summary.append({
+            group_field: row[group_field],
+            'messages': row['messages'],
+            'feedback': row['feedback'],
+            'average_rating': round(row['ratings'] / row['feedback'], 2) if row['feedback'] else None,
+        })
+    return summary
+
+def usage_stats(days=30, top=10):
+    """
+    Summarise usage for the dashboard from the rollup tables
+
+    Args:
+        days (int): Number of days to cover, including today
+        top (int): Number of top questions to return
+
+    Returns:
+        dict: Daily and last-24-hour series, ratings by program and source,
+              top questions and the time the rollups were last updated
+    """
+    now = timezone.now()
+    since = _day(now) - timedelta(days=days - 1)
+    daily = UsageRollup.objects.filter(granularity=UsageRollup.DAY, period_start__gte=since)
+    hourly = UsageRollup.objects.filter(granularity=UsageRollup.HOUR, period_start__gte=_hour(now) - timedelta(hours=23))
+
+    def series(queryset):
+        return [
+            {
+                'period_start': row['period_start'].isoformat(),
+                'messages': row['messages'],
+                'feedback': row['feedback'],
+                'average_rating': round(row['ratings'] / row['feedback'], 2) if row['feedback'] else None,
+            }
+            for row in queryset.values('period_start').annotate(
+                messages=Sum('message_count'), feedback=Sum('feedback_count'), ratings=Sum('rating_sum')
+            ).order_by('period_start')
+        ]
+
+    top_questions = (
+        QuestionRollup.objects.filter(day__gte=since.date())
+        .values('question_hash')
+        .annotate(text=Max('question'), total=Sum('count'))
+        .order_by('-total')[:top]
+    )
+    updated_at = RollupWatermark.objects.aggregate(latest=Max('updated_at'))['latest']
+
+    return {
+        'days': days,
+        'daily': series(daily),
+        'hourly': series(hourly),
+        'by_program': _rating_summary(daily, 'program'),
+        'by_source': _rating_summary(daily, 'source_url'),
+        'top_questions': [{'question': row['text'], 'count': row['total']} for row in top_questions],
+        'updated_at': updated_at.isoformat() if updated_at else None,
+    }
@@ -2,13 +2,26 @@
 Super simple chat service for JABU chatbot
 """
 import os
+import time
 import httpx
 import uuid
 import logging
-from chat.models import ChatLog
+from chat.models import ChatLog, Conversation
 from users.models import StudentProfile
 from crawler.models import KnowledgeBase
-from django.db.models import Q
+from crawler.programs import program_key, search_program_context
+from chat.faq import match_faq, record_faq_hit, record_model_answer
+from chat.precompute import answer_program, get_precomputed_answer
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, F
+from django.utils import timezone
+from core.timing import stage
+from core.tracing import span, set_span_attributes, set_trace_attributes, SPAN_KIND_CLIENT
+from core.metrics import (
+    CHAT_RESPONSES, CHAT_RESPONSE_LATENCY, KB_SEARCH_LATENCY, KB_SEARCH_RESULTS,
+    LLM_REQUESTS, LLM_LATENCY, LLM_TOKENS, LLM_FALLBACKS,
+)
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -28,51 +41,89 @@ class ChatService:
     {knowledge_sources}
     """
     
+    # Sent when the model can't be reached; never cached or precomputed
+    UNAVAILABLE_RESPONSE = "I'm sorry, I'm having trouble accessing information right now. Please try again later."
+    API_ERROR_RESPONSE = "I'm sorry, I couldn't process your request at this time."
+    # Prefix of the canned answer given when no GROQ_API_KEY is set
+    DEMO_PREFIX = "[DEMO MODE]"
+    
+    @classmethod
+    def is_fallback_response(cls, response):
+        """True for the canned responses given instead of a model answer"""
+        return response in (cls.UNAVAILABLE_RESPONSE, cls.API_ERROR_RESPONSE) or response.startswith(cls.DEMO_PREFIX)
+    
     def __init__(self):
         """Initialize with API key"""
         self.api_key = os.getenv("GROQ_API_KEY")
         self.model = os.getenv("GROQ_MODEL", "llama3-70b-8192")
+        # Point at another Groq-compatible server, e.g. the llm_stub command in load tests
+        self.base_url = os.getenv("GROQ_BASE_URL", "https://api.groq.com").rstrip('/')
     
-    def generate_response(self, message, student_id=None, conversation_id=None):
+    def generate_response(self, message, student_id=None, conversation_id=None, student=None):
         """
         Generate a response to the student message
+        
+        Args:
+            message (str): The student's question
+            student_id (str): Looked up when no student is given
+            conversation_id (str): Conversation to continue (a new one if empty)
+            student (StudentProfile): Profile already resolved by the caller
         """
+        with CHAT_RESPONSE_LATENCY.time():
+            response = self._generate_response(message, student_id, conversation_id, student)
+        CHAT_RESPONSES.inc()
+        return response
+    
+    def _generate_response(self, message, student_id, conversation_id, student):
+        """Build the prompt, call the AI model and save the turn"""
         # Create conversation ID if needed
         if not conversation_id:
             conversation_id = str(uuid.uuid4())
+        set_trace_attributes({
+            'chat.conversation_id': conversation_id,
+            'chat.student_id': student.student_id if student else student_id,
+        })
         
-        # Find relevant information
-        sources = []
-        knowledge = self._search_knowledge_base(message)
-        
-        # Format knowledge for AI
-        if knowledge:
-            knowledge_text = "\n\n".join([f"SOURCE: {k.title}\nCONTENT: {k.content[:1000]}" for k in knowledge])
-            sources = [{"title": k.title, "url": k.source_url} for k in knowledge]
-        else:
-            knowledge_text = "No specific information available on this topic."
-            
-        # Get student info
-        student = None
-        if student_id:
+        # Get student info unless the caller already resolved it (retrieval uses the program)
+        if student is None and student_id:
             try:
-                student = StudentProfile.objects.get(student_id=student_id)
+                with stage('profile'):
+                    student = StudentProfile.objects.get(student_id=student_id)
             except StudentProfile.DoesNotExist:
                 pass
         
-        # Generate AI response
-        prompt = self.SYSTEM_PROMPT.format(knowledge_sources=knowledge_text)
-        ai_response = self._get_ai_response(prompt, message)
+        # Answer top questions from the FAQ store without calling the model. FAQ
+        # answers are the same for everyone, so students whose program has a
+        # context set skip them for program-aware answers
+        faq_entry = None
+        if settings.FAQ_ENABLED and not (student is not None and answer_program(student.program)):
+            with stage('faq'):
+                faq_entry = match_faq(message)
+        
+        # Then answers generated off-peak by precompute_answers for the current knowledge base
+        precomputed = None
+        if not faq_entry and settings.PRECOMPUTED_ANSWERS_ENABLED:
+            with stage('answer_cache'):
+                precomputed = get_precomputed_answer(message, student)
+        
+        if faq_entry:
+            ai_response = faq_entry['answer']
+            sources = [{"title": faq_entry['question'], "url": faq_entry['source_url']}] if faq_entry['source_url'] else []
+            record_faq_hit(faq_entry['id'])
+        elif precomputed:
+            ai_response, sources = precomputed
+        else:
+            started = time.perf_counter()
+            ai_response, sources = self.answer_question(message, student)
+            if settings.FAQ_ENABLED:
+                record_model_answer(time.perf_counter() - started)
         
         # Save to database if student exists
         if student:
             try:
-                chat_log = ChatLog.objects.create(
-                    student=student,
-                    user_message=message,
-                    ai_response=ai_response,
-                    conversation_id=conversation_id
-                )
+                source_url = sources[0]["url"] if sources else None
+                with stage('save'):
+                    conversation_id = self._save_chat_log(student, message, ai_response, conversation_id, source_url)
                 logger.info(f"Successfully saved chat log for student {student.student_id}, conversation {conversation_id}")
             except Exception as e:
                 logger.error(f"Failed to save chat log: {str(e)}")
@@ -86,21 +137,102 @@ class ChatService:
             "sources": sources
         }
     
-    def _search_knowledge_base(self, query):
-        """Find relevant information in knowledge base"""
+    def answer_question(self, message, student=None):
+        """
+        Answer a question from the knowledge base and the AI model, without saving it
+        
+        Args:
+            message (str): The question
+            student (StudentProfile): Used to prefer the student's program (optional)
+        
+        Returns:
+            tuple: (answer text, list of source dicts with title and url)
+        """
+        # Find relevant information
+        sources = []
+        with stage('kb_search'), KB_SEARCH_LATENCY.labels('chat_service').time():
+            knowledge = self._search_knowledge_base(message, student)
+            set_span_attributes({'retrieval.results': len(knowledge)})
+        KB_SEARCH_RESULTS.labels('chat_service').observe(len(knowledge))
+        
+        # Format knowledge for AI
+        with span('build_context'):
+            if knowledge:
+                knowledge_text = "\n\n".join([f"SOURCE: {k.title}\nCONTENT: {k.content[:1000]}" for k in knowledge])
+                sources = [{"title": k.title, "url": k.source_url} for k in knowledge]
+            else:
+                knowledge_text = "No specific information available on this topic."
+            
+        # Generate AI response
+        with span('build_prompt') as prompt_span:
+            prompt = self.SYSTEM_PROMPT.format(knowledge_sources=knowledge_text)
+            if prompt_span:
+                prompt_span.set_attributes({'prompt.chars': len(prompt), 'prompt.sources': len(sources)})
+        with stage('llm'):
+            ai_response = self._get_ai_response(prompt, message)
+        
+        return ai_response, sources
+    
+    def _save_chat_log(self, student, message, ai_response, conversation_id, source_url=None):
+        """
+        Store a chat turn and update its conversation's turn count
+        
+        A conversation ID that belongs to another student is never reused;
+        the turn is filed under a fresh conversation instead.
+        
+        Returns:
+            str: The conversation ID the turn was saved under
+        """
+        with transaction.atomic():
+            conversation, created = Conversation.objects.select_for_update().get_or_create(
+                conversation_id=conversation_id,
+                defaults={'student': student}
+            )
+            
+            if conversation.student_id != student.id:
+                logger.warning(f"Conversation {conversation_id} does not belong to student {student.student_id}, starting a new one")
+                conversation = Conversation.objects.create(conversation_id=str(uuid.uuid4()), student=student)
+            
+            ChatLog.objects.create(
+                student=student,
+                user_message=message,
+                ai_response=ai_response,
+                conversation_id=conversation.conversation_id,
+                source_url=source_url
+            )
+            Conversation.objects.filter(id=conversation.id).update(
+                turn_count=F('turn_count') + 1,
+                last_activity_at=timezone.now()
+            )
+        
+        return conversation.conversation_id
+    
+    def _search_knowledge_base(self, query, student=None):
+        """
+        Find relevant information in knowledge base
+        
+        The student's program context set is searched first; the whole
+        knowledge base only fills the remaining slots.
+        """
         try:
             # Simple keyword search - just get the most relevant matches
-            keywords = query.lower().split()
+            keywords = [word for word in query.lower().split() if len(word) > 2]  # Skip very short words
             q_objects = Q()
             
             # Add each keyword to the query
             for word in keywords:
-                if len(word) > 2:  # Skip very short words
-                    q_objects |= Q(content__icontains=word) | Q(title__icontains=word)
+                q_objects |= Q(content__icontains=word) | Q(title__icontains=word)
+            
+            results = []
+            if student is not None and student.program:
+                with span('kb_search.program', {'retrieval.program': program_key(student.program)}):
+                    results = search_program_context(q_objects, keywords, student.program, student.year_of_study, limit=3)
+                    set_span_attributes({'retrieval.program_results': len(results)})
             
             # Get top 3 most relevant entries
-            results = KnowledgeBase.objects.filter(q_objects)[:3]
-            return list(results)
+            if len(results) < 3:
+                results += KnowledgeBase.objects.filter(q_objects).exclude(id__in=[entry.id for entry in results])[:3 - len(results)]
+            return results
         except Exception as e:
             logger.error(f"Search error: {str(e)}")
             return []
@@ -110,8 +242,9 @@ class ChatService:
         try:
             # Try using Groq SDK first
             try:
-                from groq import Groq
-                client = Groq(api_key=self.api_key)
+                with span('llm.client', {'gen_ai.system': 'groq'}):
+                    from groq import Groq
+                    client = Groq(api_key=self.api_key, base_url=self.base_url)
                 
                 # Create messages for the AI
                 messages = [
@@ -120,49 +253,82 @@ class ChatService:
                 ]
                 
                 # Call the API
-                completion = client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    temperature=0.7,
-                    max_tokens=800
-                )
+                start = time.perf_counter()
+                with span('llm.groq_sdk', self._span_attributes(), kind=SPAN_KIND_CLIENT):
+                    completion = client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        temperature=0.7,
+                        max_tokens=800
+                    )
+                    LLM_LATENCY.labels('groq_sdk').observe(time.perf_counter() - start)
+                    LLM_REQUESTS.labels('groq_sdk', 'success').inc()
+                    self._record_token_usage(completion.usage)
                 
                 return completion.choices[0].message.content
             except Exception as e:
                 # Fall back to using httpx
+                LLM_REQUESTS.labels('groq_sdk', 'error').inc()
+                LLM_FALLBACKS.inc()
                 return self._call_api_with_httpx(system_prompt, user_message)
         
         except Exception as e:
             logger.error(f"AI response error: {e}")
-            return "I'm sorry, I'm having trouble accessing information right now. Please try again later."
+            return self.UNAVAILABLE_RESPONSE
     
     def _call_api_with_httpx(self, system_prompt, user_message):
         """Make API call using httpx as fallback"""
         if not self.api_key:
-            return f"[DEMO MODE] This is a sample response about: {user_message}"
+            LLM_REQUESTS.labels('demo', 'success').inc()
+            return f"{self.DEMO_PREFIX} This is a sample response about: {user_message}"
             
-        try:
-            url = "https://api.groq.com/v1/chat/completions"
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            data = {
-                "model": self.model,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_message}
-                ],
-                "temperature": 0.7,
-                "max_tokens": 800
-            }
-            
-            with httpx.Client(timeout=15.0) as client:
-                response = client.post(url, headers=headers, json=data)
-                response.raise_for_status()
-                result = response.json()
-                return result["choices"][0]["message"]["content"]
-        except Exception as e:
-            logger.error(f"API call error: {e}")
-            return "I'm sorry, I couldn't process your request at this time."
+        start = time.perf_counter()
+        with span('llm.httpx', self._span_attributes(), kind=SPAN_KIND_CLIENT) as attempt:
+            try:
+                url = f"{self.base_url}/openai/v1/chat/completions"
+                headers = {
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                }
+                
+                data = {
+                    "model": self.model,
+                    "messages": [
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_message}
+                    ],
+                    "temperature": 0.7,
+                    "max_tokens": 800
+                }
+                
+                with httpx.Client(timeout=15.0) as client:
+                    response = client.post(url, headers=headers, json=data)
+                    response.raise_for_status()
+                    result = response.json()
+                    content = result["choices"][0]["message"]["content"]
+                LLM_LATENCY.labels('httpx').observe(time.perf_counter() - start)
+                LLM_REQUESTS.labels('httpx', 'success').inc()
+                self._record_token_usage(result.get("usage"))
+                return content
+            except Exception as e:
+                LLM_REQUESTS.labels('httpx', 'error').inc()
+                logger.error(f"API call error: {e}")
+                if attempt:
+                    attempt.record_exception(e)
+                return self.API_ERROR_RESPONSE
+    
+    def _span_attributes(self):
+        """Attributes common to every LLM call span"""
+        return {'gen_ai.system': 'groq', 'gen_ai.request.model': self.model, 'server.address': self.base_url}
+    
+    def _record_token_usage(self, usage):
+        """Count prompt and completion tokens from an API usage object or dict"""
+        if not usage:
+            return
+        counts = {}
+        for kind in ('prompt', 'completion'):
+            tokens = usage.get(f"{kind}_tokens") if isinstance(usage, dict) else getattr(usage, f"{kind}_tokens", None)
+            counts[kind] = tokens
+            if tokens:
+                LLM_TOKENS.labels(kind).inc(tokens)
+        set_span_attributes({'gen_ai.usage.input_tokens': counts['prompt'], 'gen_ai.usage.output_tokens': counts['completion']})
@@ -1,3 +1,219 @@
-from django.test import TestCase
+import base64
+from datetime import datetime, timezone
+from unittest import mock
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from core.cache import ANSWER_CACHE
+from chat.faq import (
+    TokenIndex, cluster_questions, find_faq, generate_answers, invalidate_faq_index, question_tokens, similarity,
+)
+from chat.models import ChatLog, FAQEntry, Feedback
+from chat.pagination import decode_cursor, encode_cursor
+from chat.precompute import _answer_key, get_precomputed_answer, precompute_answers
+from chat.services import ChatService
+from users.models import StudentProfile
 
-# Create your tests here.
+
+class QuestionTokenTests(SimpleTestCase):
+    def test_drops_stop_words_and_plurals(self):
+        self.assertEqual(question_tokens('What are the admission requirements?'), {'admission', 'requirement'})
+
+    def test_keeps_double_s(self):
+        self.assertIn('class', question_tokens('Where is my class'))
+
+    def test_similarity(self):
+        self.assertEqual(similarity(frozenset({'a', 'b'}), frozenset({'b', 'c'})), 1 / 3)
+        self.assertEqual(similarity(frozenset(), frozenset({'a'})), 0.0)
+
+
+class ClusterQuestionTests(SimpleTestCase):
+    def test_groups_similar_phrasings(self):
+        clusters = cluster_questions([
+            ('what are the school fees for computer science', 10),
+            ('school fees for computer science', 4),
+            ('how do i apply for hostel accommodation', 6),
+            ('hostel accommodation apply', 3),
+        ], threshold=0.6)
+        self.assertEqual([cluster['count'] for cluster in clusters], [14, 9])
+        self.assertEqual(clusters[0]['question'], 'what are the school fees for computer science')
+        self.assertEqual(clusters[0]['variants'], [
+            'what are the school fees for computer science',
+            'school fees for computer science',
+        ])
+
+    def test_threshold_keeps_different_questions_apart(self):
+        clusters = cluster_questions([
+            ('school fees for computer science', 5),
+            ('school fees for nursing science', 5),
+        ], threshold=0.9)
+        self.assertEqual(len(clusters), 2)
+
+    def test_skips_questions_without_content_words(self):
+        self.assertEqual(cluster_questions([('hello', 50), ('how are you', 20)], threshold=0.6), [])
+
+    def test_token_index_best_match(self):
+        index = TokenIndex()
+        index.add(frozenset({'school', 'fee'}), 'fees')
+        index.add(frozenset({'hostel', 'accommodation'}), 'hostel')
+        self.assertEqual(index.best_match(frozenset({'school', 'fee', 'law'})), ('fees', 2 / 3))
+        self.assertEqual(index.best_match(frozenset({'library'})), (None, 0.0))
+
+
+@override_settings(FAQ_MATCH_THRESHOLD=0.6)
+class FindFAQTests(SimpleTestCase):
+    def setUp(self):
+        entry = FAQEntry(
+            id=1,
+            question='What are the school fees for Computer Science?',
+            variants=['school fees for computer science', 'computer science school fees'],
+            answer='The fees are on the bursary page.',
+            status=FAQEntry.STATUS_APPROVED,
+        )
+        patcher = mock.patch.object(FAQEntry.objects, 'filter')
+        patcher.start().return_value.exclude.return_value = [entry]
+        self.addCleanup(patcher.stop)
+        invalidate_faq_index()
+        self.addCleanup(invalidate_faq_index)
+
+    def test_exact_phrasing(self):
+        entry, score = find_faq('School fees for Computer Science!')
+        self.assertEqual((entry['id'], score), (1, 1.0))
+
+    def test_similar_phrasing(self):
+        entry, score = find_faq('how much are computer science school fees please')
+        self.assertEqual(entry['id'], 1)
+        self.assertGreaterEqual(score, 0.6)
+
+    def test_single_shared_word_is_not_enough(self):
+        self.assertEqual(find_faq('fees'), (None, 0.0))
+
+    def test_below_threshold(self):
+        entry, score = find_faq('school fees for nursing')
+        self.assertIsNone(entry)
+        self.assertLess(score, 0.6)
+
+
+@mock.patch.object(FAQEntry, 'save')
+class GenerateAnswersTests(SimpleTestCase):
+    def _generate(self, answer):
+        entry = FAQEntry(id=1, question='What are the school fees?')
+        sources = [{'title': 'Fees', 'url': 'https://jabu.edu.ng/fees'}]
+        with mock.patch.object(ChatService, 'answer_question', return_value=(answer, sources)):
+            return generate_answers([entry]), entry
+
+    def test_stores_model_answers(self, save):
+        answered, entry = self._generate('The fees are on the bursary page.')
+        self.assertEqual(answered, 1)
+        self.assertEqual(entry.answer, 'The fees are on the bursary page.')
+        self.assertEqual(entry.source_url, 'https://jabu.edu.ng/fees')
+        save.assert_called_once()
+
+    def test_leaves_entries_pending_on_fallback_responses(self, save):
+        for answer in (
+            ChatService.UNAVAILABLE_RESPONSE,
+            ChatService.API_ERROR_RESPONSE,
+            f'{ChatService.DEMO_PREFIX} This is a sample response about: fees',
+        ):
+            with self.subTest(answer=answer):
+                answered, entry = self._generate(answer)
+                self.assertEqual((answered, entry.answer), (0, ''))
+        save.assert_not_called()
+
+
+@override_settings(FAQ_ENABLED=True, PRECOMPUTED_ANSWERS_ENABLED=True)
+@mock.patch.object(ChatService, '_save_chat_log', return_value='conversation')
+@mock.patch('chat.services.record_faq_hit')
+@mock.patch('chat.services.get_precomputed_answer', return_value=('Computer Science fees are...', []))
+class FAQRoutingTests(SimpleTestCase):
+    faq_entry = {'id': 1, 'question': 'School fees', 'answer': 'The fees are...', 'source_url': None}
+
+    def _respond(self, program):
+        student = StudentProfile(student_id='JABU/001', program='Computer Science')
+        with mock.patch('chat.services.answer_program', return_value=program), \
+                mock.patch('chat.services.match_faq', return_value=self.faq_entry) as match_faq:
+            response = ChatService().generate_response('what are the school fees', student=student)
+        return response['response'], match_faq
+
+    def test_generic_students_get_the_faq_answer(self, *mocks):
+        answer, match_faq = self._respond('')
+        self.assertEqual(answer, 'The fees are...')
+        match_faq.assert_called_once()
+
+    def test_program_students_skip_the_faq(self, *mocks):
+        answer, match_faq = self._respond('computer science')
+        self.assertEqual(answer, 'Computer Science fees are...')
+        match_faq.assert_not_called()
+
+
+@mock.patch('chat.precompute.knowledge_base_version', return_value='v1')
+class PrecomputedAnswerTests(SimpleTestCase):
+    question = 'what are the school fees'
+
+    def setUp(self):
+        ANSWER_CACHE.invalidate()
+
+    def _lookup(self, program, year):
+        student = StudentProfile(program='Computer Science', year_of_study=year)
+        with mock.patch('chat.precompute.answer_program', return_value=program):
+            return get_precomputed_answer('What are the school fees?', student)
+
+    def test_program_answers_are_keyed_by_year(self, version):
+        ANSWER_CACHE.set(_answer_key('v1', self.question, 'computer science', 1), ('Year 1 fees', []))
+        self.assertEqual(self._lookup('computer science', 1), ('Year 1 fees', []))
+        self.assertIsNone(self._lookup('computer science', 2))
+
+    def test_generic_answers_ignore_the_year(self, version):
+        ANSWER_CACHE.set(_answer_key('v1', self.question, ''), ('Fees', []))
+        self.assertEqual(self._lookup('', 1), ('Fees', []))
+        self.assertEqual(self._lookup('', 3), ('Fees', []))
+
+    def test_answers_are_generated_for_the_year(self, version):
+        item = {'question': 'What are the school fees?', 'program': 'computer science', 'year': 3,
+                'count': 5, 'unanswered': False}
+        with mock.patch.object(ChatService, 'answer_question', return_value=('Year 3 fees', [])) as answer_question:
+            stats = precompute_answers([item], concurrency=1)
+        self.assertEqual(stats['stored'], 1)
+        student = answer_question.call_args.args[1]
+        self.assertEqual((student.program, student.year_of_study), ('computer science', 3))
+        self.assertEqual(ANSWER_CACHE.get(_answer_key('v1', self.question, 'computer science', 3)), ('Year 3 fees', []))
+
+
+class CursorTests(SimpleTestCase):
+    def test_round_trip(self):
+        timestamp = datetime(2025, 3, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+        cursor = encode_cursor(ChatLog(id=1234, timestamp=timestamp))
+        self.assertRegex(cursor, r'^[A-Za-z0-9_=-]+$')
+        self.assertEqual(decode_cursor(cursor), (timestamp, 1234))
+
+    def test_malformed(self):
+        bad_id = base64.urlsafe_b64encode(b'2025-01-01T00:00:00+00:00|latest').decode('ascii')
+        for cursor in ('', 'not base64!', bad_id):
+            with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+
+class AdminFullTextSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        student = StudentProfile.objects.create(
+            user=User.objects.create_user('ada'), name='Ada Lovelace', email='ada@jabu.edu.ng',
+            program='Computer Science', year_of_study=2, student_id='JABU/002',
+        )
+        cls.fees = ChatLog.objects.create(student=student, user_message='What are the school fees?', ai_response='See the bursary.')
+        cls.hostel = ChatLog.objects.create(student=student, user_message='Hostel rules', ai_response='No cooking in rooms.')
+        cls.fees_feedback = Feedback.objects.create(chat_log=cls.fees, rating=5)
+        cls.hostel_feedback = Feedback.objects.create(chat_log=cls.hostel, rating=2, comment='Cooking answer was wrong')
+
+    def _search(self, model, search_term):
+        queryset, may_have_duplicates = site._registry[model].get_search_results(None, model.objects.all(), search_term)
+        return set(queryset)
+
+    def test_chat_logs(self):
+        self.assertEqual(self._search(ChatLog, 'fee'), {self.fees})
+        self.assertEqual(self._search(ChatLog, 'cook'), {self.hostel})
+        self.assertEqual(self._search(ChatLog, 'Lovelace'), {self.fees, self.hostel})
+
+    def test_feedback_matches_its_comment_or_the_rated_chat(self):
+        self.assertEqual(self._search(Feedback, 'wrong'), {self.hostel_feedback})
+        self.assertEqual(self._search(Feedback, 'bursary'), {self.fees_feedback})
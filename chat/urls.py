@@ -5,4 +5,6 @@ urlpatterns = [
     path('chat/', views.chat_message, name='chat-message'),
     path('feedback/', views.submit_feedback, name='submit-feedback'),
     path('history/', views.get_chat_history, name='chat-history'),
+    path('stats/', views.usage_stats, name='usage-stats'),
+    path('export/chat-logs/', views.export_chat_logs, name='export-chat-logs'),
 ]
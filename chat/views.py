@@ -1,12 +1,24 @@
 from django.shortcuts import render
 from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from core.cache import STATS_CACHE
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from .serializers import ChatMessageSerializer, ChatResponseSerializer, FeedbackSerializer
 from .services import ChatService  # Use the simplified service
-from .models import ChatLog, Feedback
+from .models import ChatLog, Conversation, Feedback
+from .pagination import paginate_before
+from .rollups import usage_stats as build_usage_stats
+from .export import EXPORT_FORMATS, export_rows, parse_bound, render_export
 from users.models import StudentProfile
+from users.profiles import get_request_profile
+from core.timing import stage
+
+# History page sizes
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 100
 
 # Create your views here.
 @api_view(['POST'])
@@ -17,20 +29,29 @@ def chat_message(request):
     
     POST Data:
         - message: Student's message or question (required)
-        - student_id: Student's ID (required) - ID of the authenticated student
+        - student_id: Student's ID (optional) - defaults to the authenticated student; staff may pass another
         - conversation_id: Conversation ID for continuing conversations (optional)
     """
-    # Get student_id from the authenticated user if not provided
+    # The authenticated user's profile, resolved once and passed to the service
+    with stage('profile'):
+        student = get_request_profile(request)
     data = request.data.copy()
-    if not data.get('student_id'):
-        try:
-            student_profile = StudentProfile.objects.get(user=request.user)
-            data['student_id'] = student_profile.student_id
-        except StudentProfile.DoesNotExist:
+    requested_id = data.get('student_id')
+    if requested_id and (student is None or requested_id != student.student_id):
+        # Only staff may chat on behalf of another student
+        if not request.user.is_staff:
             return Response({
                 'status': 'error',
-                'message': 'Student profile not found for authenticated user'
-            }, status=400)
+                'message': 'student_id does not match the authenticated user'
+            }, status=403)
+        with stage('profile'):
+            student = StudentProfile.objects.select_related('user').filter(student_id=requested_id).first()
+    if student is None:
+        return Response({
+            'status': 'error',
+            'message': 'Student profile not found for authenticated user'
+        }, status=400)
+    data['student_id'] = student.student_id
     
     serializer = ChatMessageSerializer(data=data)
     
@@ -51,7 +72,7 @@ def chat_message(request):
     # Call the service to generate a response - now fully synchronous
     try:
         response_data = chat_service.generate_response(
-            message, student_id, conversation_id
+            message, student_id, conversation_id, student=student
         )
         
         # Return response
@@ -86,10 +107,12 @@ def chat_message(request):
 @permission_classes([IsAuthenticated])
 def get_chat_history(request):
     """
-    Retrieve chat history for a specific conversation
+    Retrieve chat history for a specific conversation, newest page first
     
     GET Parameters:
         - conversation_id: ID of the conversation to retrieve
+        - before: Cursor returned as next_cursor to load older turns (optional)
+        - limit: Maximum number of turns (optional, default: 20, max: 100)
     """
     conversation_id = request.GET.get('conversation_id')
     
@@ -99,13 +122,43 @@ def get_chat_history(request):
             'message': 'conversation_id is required'
         }, status=400)
     
-    # Get chat logs for this conversation
-    chat_logs = ChatLog.objects.filter(conversation_id=conversation_id).order_by('timestamp')
+    try:
+        limit = min(max(int(request.GET.get('limit', HISTORY_PAGE_SIZE)), 1), HISTORY_MAX_PAGE_SIZE)
+    except ValueError:
+        limit = HISTORY_PAGE_SIZE
+    
+    # Only the owning student (or staff) may read a conversation
+    conversation = Conversation.objects.filter(conversation_id=conversation_id).first()
+    if conversation is None or (
+        not request.user.is_staff
+        and getattr(get_request_profile(request), 'id', None) != conversation.student_id
+    ):
+        return Response({
+            'status': 'error',
+            'message': 'Conversation not found'
+        }, status=404)
+    
+    # The lower timestamp bound lets Postgres skip partitions older than the conversation
+    chat_logs = ChatLog.objects.filter(
+        conversation_id=conversation_id,
+        timestamp__gte=conversation.created_at
+    ).only(
+        'id', 'user_message', 'ai_response', 'timestamp'
+    )
+    
+    try:
+        page, next_cursor = paginate_before(chat_logs, request.GET.get('before'), limit)
+    except ValueError as e:
+        return Response({
+            'status': 'error',
+            'message': str(e)
+        }, status=400)
     
     # Format the chat history
     history = []
-    for log in chat_logs:
+    for log in page:
         history.append({
+            'id': log.id,
             'user_message': log.user_message,
             'ai_response': log.ai_response,
             'timestamp': log.timestamp.isoformat()
@@ -115,7 +168,11 @@ def get_chat_history(request):
         'status': 'success',
         'data': {
             'conversation_id': conversation_id,
-            'history': history
+            'turn_count': conversation.turn_count,
+            'last_activity_at': conversation.last_activity_at.isoformat(),
+            'history': history,
+            'has_more': next_cursor is not None,
+            'next_cursor': next_cursor
         }
     }, status=200)
 
@@ -149,3 +206,69 @@ def submit_feedback(request):
             'rating': feedback.rating
         }
     }, status=201)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def usage_stats(request):
+    """
+    Usage and feedback statistics for the dashboard, read from the rollup tables
+    
+    GET Parameters:
+        - days: Number of days to cover, including today (optional, default: 30, max: 365)
+        - top: Number of top questions (optional, default: 10, max: 50)
+    """
+    try:
+        days = min(max(int(request.GET.get('days', 30)), 1), 365)
+        top = min(max(int(request.GET.get('top', 10)), 1), 50)
+    except ValueError:
+        return Response({
+            'status': 'error',
+            'message': 'days and top must be integers'
+        }, status=400)
+    
+    # Rollups only change when update_rollups runs, so a short cache is safe
+    stats = STATS_CACHE.get_or_compute(
+        f"usage:{days}:{top}", lambda: build_usage_stats(days, top), settings.USAGE_STATS_CACHE_SECONDS
+    )
+    
+    return Response({
+        'status': 'success',
+        'data': stats
+    }, status=200)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_chat_logs(request):
+    """
+    Stream chat logs with their feedback and student details
+    
+    GET Parameters:
+        - export_format: "ndjson" or "csv" (optional, default: ndjson)
+        - start: Earliest date or datetime to include (optional)
+        - end: Last date to include, or exclusive datetime bound (optional)
+        - program: Only export students in this program (optional)
+    """
+    # Not "format", which DRF reserves for choosing a response renderer
+    export_format = request.GET.get('export_format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return Response({
+            'status': 'error',
+            'message': f"export_format must be one of: {', '.join(EXPORT_FORMATS)}"
+        }, status=400)
+    
+    try:
+        start = parse_bound(request.GET.get('start'))
+        end = parse_bound(request.GET.get('end'), end=True)
+    except ValueError as e:
+        return Response({
+            'status': 'error',
+            'message': str(e)
+        }, status=400)
+    
+    rows = export_rows(start, end, request.GET.get('program'))
+    content_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    filename = f"chat_logs_{timezone.now():%Y%m%d_%H%M%S}.{export_format}"
+    
+    response = StreamingHttpResponse(render_export(rows, export_format), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -1,3 +1,45 @@
+import os
 from django.contrib import admin
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+from .models import RequestProfile
 
 # Register your models here.
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'name', 'status_code', 'duration_ms', 'mode', 'trigger', 'user', 'download_link')
+    list_filter = ('mode', 'trigger', 'created_at')
+    search_fields = ('name', 'view')
+    readonly_fields = ('created_at', 'name', 'view', 'status_code', 'duration_ms', 'mode', 'trigger', 'user', 'file_name', 'file_size', 'download_link')
+    list_select_related = ('user',)
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def get_urls(self):
+        return [
+            path('<int:pk>/download/', self.admin_site.admin_view(self.download_view), name='core_requestprofile_download'),
+        ] + super().get_urls()
+    
+    def download_view(self, request, pk):
+        if not self.has_view_permission(request):
+            raise Http404
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        if not os.path.exists(profile.path):
+            raise Http404('Profile file is missing')
+        return FileResponse(open(profile.path, 'rb'), as_attachment=True, filename=profile.file_name)
+    
+    def download_link(self, obj):
+        return format_html('<a href="{}">{}</a>', reverse('admin:core_requestprofile_download', args=[obj.pk]), obj.file_name)
+    
+    download_link.short_description = 'File'
+    
+    def delete_queryset(self, request, queryset):
+        # One by one so each profile's file is removed too
+        for profile in queryset:
+            profile.delete()
@@ -0,0 +1,154 @@
+"""
+REST framework authentication classes that report their cost as the "auth" stage
+
+JWTAuthentication is tried first and serves the chat hot path without the
+database. The user's authentication fields (never the password hash) are
+cached in AUTH_CACHE, together with their StudentProfile, until the access
+token expires. The cached entry is dropped
+whenever the User or StudentProfile is saved or deleted (see
+invalidate_cached_user). BasicAuthentication hashes the password with PBKDF2
+on every request, so it only runs on BASIC_AUTH_PATHS.
+"""
+import time
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import router
+from django.db.models.signals import post_delete, post_save
+from django.utils.translation import gettext_lazy as _
+from rest_framework import authentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication as BaseJWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from core.cache import AUTH_CACHE
+from core.timing import stage
+from core.tracing import set_span_attributes
+
+# User fields kept in AUTH_CACHE; the rest are loaded on first access
+CACHED_USER_FIELDS = ('id', 'username', 'is_active', 'is_staff', 'is_superuser')
+
+
+class TimedAuthenticationMixin:
+    """Time authenticate() under the "auth" request stage"""
+    def authenticate(self, request):
+        with stage('auth'):
+            return super().authenticate(request)
+
+
+class SessionAuthentication(TimedAuthenticationMixin, authentication.SessionAuthentication):
+    pass
+
+
+class BasicAuthentication(TimedAuthenticationMixin, authentication.BasicAuthentication):
+    """
+    HTTP Basic authentication, only on paths starting with one of BASIC_AUTH_PATHS
+
+    Elsewhere Basic credentials are ignored without hashing the password.
+    """
+    def authenticate(self, request):
+        if not request.path.startswith(tuple(getattr(settings, 'BASIC_AUTH_PATHS', ()))):
+            return None
+        return super().authenticate(request)
+
+
+class JWTAuthentication(TimedAuthenticationMixin, BaseJWTAuthentication):
+    """
+    JWT authentication with the user and StudentProfile cached for the token's lifetime
+
+    ``request.user.student_profile`` is loaded with the user, so reading it
+    costs no query (it raises RelatedObjectDoesNotExist as usual when the
+    user has no profile). Only CACHED_USER_FIELDS are cached; other User
+    fields are deferred and cost a query when read, and saving the user only
+    writes the loaded fields.
+    """
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+
+        cached = AUTH_CACHE.get(user_id)
+        set_span_attributes({'auth.user_cache': 'miss' if cached is None else 'hit'})
+        if cached is None:
+            cached = self._cached_fields(self._load_user(user_id))
+            timeout = min(int(validated_token['exp'] - time.time()), settings.AUTH_USER_CACHE_SECONDS)
+            if timeout > 0:
+                AUTH_CACHE.set(user_id, cached, timeout)
+
+        # Same checks as simplejwt, repeated on cached users
+        if api_settings.CHECK_USER_IS_ACTIVE and not cached['user']['is_active']:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if getattr(api_settings, 'CHECK_REVOKE_TOKEN', False):
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != cached['password_hash']:
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return self._rebuild_user(cached)
+
+    def _load_user(self, user_id):
+        try:
+            # One query for both; a missing profile is remembered as well
+            return self.user_model.objects.select_related('student_profile').get(
+                **{api_settings.USER_ID_FIELD: user_id}
+            )
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+    def _cached_fields(self, user):
+        """Plain values of the user and profile to cache, without the password hash"""
+        try:
+            profile = user.student_profile
+        except self.user_model.student_profile.RelatedObjectDoesNotExist:
+            profile = None
+        password_hash = None
+        if getattr(api_settings, 'CHECK_REVOKE_TOKEN', False):
+            # The token carries the same digest, so caching it reveals nothing new
+            from rest_framework_simplejwt.utils import get_md5_hash_password
+            password_hash = get_md5_hash_password(user.password)
+        return {
+            'user': {name: getattr(user, name) for name in CACHED_USER_FIELDS},
+            'profile': None if profile is None else {
+                field.attname: getattr(profile, field.attname) for field in profile._meta.concrete_fields
+            },
+            'password_hash': password_hash,
+        }
+
+    def _rebuild_user(self, cached):
+        """User (with its profile) built from cached values, without a query"""
+        db = router.db_for_read(self.user_model)
+        user = _from_values(self.user_model, db, cached['user'])
+        profile_relation = self.user_model.student_profile
+        if cached['profile'] is None:
+            profile_relation.related.set_cached_value(user, None)
+        else:
+            profile_model = profile_relation.related.related_model
+            profile = _from_values(profile_model, db, cached['profile'])
+            profile_relation.related.set_cached_value(user, profile)
+            profile_relation.related.field.set_cached_value(profile, user)
+        return user
+
+
+def _from_values(model, db, values):
+    """Instance as loaded from the database, with fields missing from values deferred"""
+    names = [field.attname for field in model._meta.concrete_fields if field.attname in values]
+    return model.from_db(db, names, [values[name] for name in names])
+
+def invalidate_cached_user(user_id):
+    """
+    Forget the cached user so the next request reloads it
+
+    Other processes may keep their copy for up to CACHE_LOCAL_TIMEOUT seconds.
+    """
+    AUTH_CACHE.delete(user_id)
+
+def _user_changed(sender, instance, **kwargs):
+    invalidate_cached_user(getattr(instance, api_settings.USER_ID_FIELD))
+
+def _profile_changed(sender, instance, **kwargs):
+    invalidate_cached_user(instance.user_id)
+
+def connect_signals():
+    """Invalidate cached users on User and StudentProfile changes (called from CoreConfig.ready)"""
+    from users.models import StudentProfile
+
+    user_model = get_user_model()
+    for signal in (post_save, post_delete):
+        signal.connect(_user_changed, sender=user_model)
+        signal.connect(_profile_changed, sender=StudentProfile)
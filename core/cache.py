@@ -0,0 +1,298 @@
+"""
+Tiered caching
+
+settings.CACHES["default"] is a TieredCache. Reads look in a small
+per-process LRU first, then in the shared cache (Redis when REDIS_URL is
+set, local memory otherwise). Entries stay at most LOCAL_TIMEOUT seconds in
+the LRU, so another worker's writes become visible within that time, and
+never outlive their expiry in the shared cache when it is known (values
+stored by a CacheNamespace carry it).
+
+Application code caches through a CacheNamespace, one per subsystem:
+
+    profile = PROFILE_CACHE.get_or_compute(user.id, load_profile, timeout=60)
+    PROFILE_CACHE.delete(user.id)    # one entry
+    KB_CACHE.invalidate()            # every entry in the namespace
+
+get_or_compute protects expensive computations from stampedes. Entries are
+recomputed slightly before they expire (probabilistic early expiration),
+and only the caller holding a short lock recomputes a missing entry while
+the others wait for its result; if that caller fails, the next waiter takes
+the lock over.
+"""
+import math
+import pickle
+import random
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from core.metrics import CACHE_REQUESTS, CACHE_NAMESPACE_REQUESTS, CACHE_RECOMPUTES
+
+_MISSING = object()
+
+# A CacheNamespace value as stored in the cache; expires_at is a time.time()
+CacheEntry = namedtuple('CacheEntry', ['value', 'compute_seconds', 'expires_at'])
+
+
+class LocalLRU:
+    """
+    Thread-safe in-process LRU of pickled values with per-entry expiry
+
+    Args:
+        max_entries (int): Entries kept before the least recently used is evicted
+    """
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, pickled = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+        return pickle.loads(pickled)
+
+    def set(self, key, value, timeout):
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._data[key] = (time.monotonic() + timeout, pickled)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class TieredCache(BaseCache):
+    """
+    Django cache backend: a LocalLRU in front of another configured cache
+
+    OPTIONS:
+        SHARED: Alias of the shared cache in settings.CACHES (default "shared")
+        LOCAL_MAX_ENTRIES: LRU size per process (default 1000)
+        LOCAL_TIMEOUT: Longest an entry stays in the LRU, in seconds (default 5)
+    """
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = options.get('SHARED', 'shared')
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self.local = LocalLRU(options.get('LOCAL_MAX_ENTRIES', 1000))
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def _local_key(self, key, version):
+        return self.make_and_validate_key(key, version=version)
+
+    def _local_timeout(self, timeout):
+        timeout = self.get_backend_timeout(timeout)
+        return self.local_timeout if timeout is None else min(timeout - time.time(), self.local_timeout)
+
+    def get(self, key, default=None, version=None):
+        local_key = self._local_key(key, version)
+        value = self.local.get(local_key)
+        if value is not _MISSING:
+            CACHE_REQUESTS.labels('local', 'hit').inc()
+            return value
+        CACHE_REQUESTS.labels('local', 'miss').inc()
+
+        value = self.shared.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            CACHE_REQUESTS.labels('shared', 'miss').inc()
+            return default
+        CACHE_REQUESTS.labels('shared', 'hit').inc()
+        local_timeout = self.local_timeout
+        if isinstance(value, CacheEntry):
+            # Don't serve it locally after it has expired in the shared cache
+            local_timeout = min(local_timeout, value.expires_at - time.time())
+        if local_timeout > 0:
+            self.local.set(local_key, value, local_timeout)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self._store_local(key, value, timeout, version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        # Decided by the shared cache so it works as a lock across workers
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._store_local(key, value, timeout, version)
+        return added
+
+    def _store_local(self, key, value, timeout, version):
+        local_key = self._local_key(key, version)
+        local_timeout = self._local_timeout(timeout)
+        if local_timeout > 0:
+            self.local.set(local_key, value, local_timeout)
+        else:
+            self.local.delete(local_key)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self.local.delete(self._local_key(key, version))
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self.local.delete(self._local_key(key, version))
+        return self.shared.delete(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self.local.delete(self._local_key(key, version))
+        return self.shared.incr(key, delta, version=version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISSING, version=version) is not _MISSING
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+
+class CacheNamespace:
+    """
+    Keys of one subsystem, invalidated together by bumping a version
+
+    Args:
+        name (str): Namespace prefix, e.g. "kb"
+        timeout (int): Default entry lifetime in seconds
+        alias (str): Cache alias in settings.CACHES
+    """
+    # Higher recomputes earlier; 1.0 is the usual XFetch setting
+    EARLY_RECOMPUTE_BETA = 1.0
+    LOCK_TIMEOUT = 30
+    WAIT_INTERVAL = 0.05
+
+    def __init__(self, name, timeout=300, alias='default'):
+        self.name = name
+        self.timeout = timeout
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def _version_key(self):
+        return f'ns:{self.name}:version'
+
+    def version(self):
+        """Current namespace version; part of every key"""
+        version = self.cache.get(self._version_key)
+        if version is None:
+            # Time-based so a version lost to eviction never returns to an older one
+            self.cache.add(self._version_key, int(time.time()), None)
+            version = self.cache.get(self._version_key, 0)
+        return version
+
+    def key(self, key):
+        return f'{self.name}:v{self.version()}:{key}'
+
+    def invalidate(self):
+        """
+        Drop every entry by moving the namespace to a new version
+
+        Old entries are never read again and expire on their own. Other
+        processes see the change within the LRU's LOCAL_TIMEOUT.
+        """
+        try:
+            return self.cache.incr(self._version_key)
+        except ValueError:
+            # No version yet (or it was evicted)
+            version = int(time.time())
+            self.cache.set(self._version_key, version, None)
+            return version
+
+    def get(self, key, default=None):
+        entry = self.cache.get(self.key(key))
+        CACHE_NAMESPACE_REQUESTS.labels(self.name, 'miss' if entry is None else 'hit').inc()
+        return default if entry is None else entry[0]
+
+    def set(self, key, value, timeout=None, compute_seconds=0.0):
+        timeout = self.timeout if timeout is None else timeout
+        # Stored with the cost of computing it and its expiry for early recomputation
+        self.cache.set(self.key(key), CacheEntry(value, compute_seconds, time.time() + timeout), timeout)
+
+    def delete(self, key):
+        self.cache.delete(self.key(key))
+
+    def get_or_compute(self, key, compute, timeout=None):
+        """
+        Return the cached value for key, computing and storing it when needed
+
+        Args:
+            key: Key within the namespace (str() is applied)
+            compute (callable): Called with no arguments to produce the value
+            timeout (int): Entry lifetime in seconds (default: the namespace's)
+
+        Returns:
+            The cached or freshly computed value
+        """
+        full_key = self.key(key)
+        entry = self.cache.get(full_key)
+        if entry is not None:
+            CACHE_NAMESPACE_REQUESTS.labels(self.name, 'hit').inc()
+            value, compute_seconds, expires_at = entry
+            # XFetch: recompute early with a probability that rises as expiry nears
+            early = time.time() - compute_seconds * self.EARLY_RECOMPUTE_BETA * math.log(random.random() or 1e-12)
+            # Only the caller that takes the lock refreshes; the rest keep the current value
+            if early < expires_at or not self.cache.add(f'{full_key}:lock', 1, self.LOCK_TIMEOUT):
+                return value
+            return self._recompute(key, full_key, compute, timeout, 'early')
+
+        CACHE_NAMESPACE_REQUESTS.labels(self.name, 'miss').inc()
+        if self.cache.add(f'{full_key}:lock', 1, self.LOCK_TIMEOUT):
+            return self._recompute(key, full_key, compute, timeout, 'miss')
+
+        # Someone else is computing it: wait for their result
+        deadline = time.monotonic() + self.LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(self.WAIT_INTERVAL)
+            entry = self.cache.get(full_key)
+            if entry is not None:
+                return entry[0]
+            # No value and the lock is free: the holder failed, so take over
+            if self.cache.add(f'{full_key}:lock', 1, self.LOCK_TIMEOUT):
+                entry = self.cache.get(full_key)
+                if entry is not None:
+                    # Stored just before the lock was released
+                    self.cache.delete(f'{full_key}:lock')
+                    return entry[0]
+                return self._recompute(key, full_key, compute, timeout, 'takeover')
+        CACHE_RECOMPUTES.labels(self.name, 'lock_timeout').inc()
+        return compute()
+
+    def _recompute(self, key, full_key, compute, timeout, reason):
+        CACHE_RECOMPUTES.labels(self.name, reason).inc()
+        try:
+            start = time.perf_counter()
+            value = compute()
+            self.set(key, value, timeout, compute_seconds=time.perf_counter() - start)
+            return value
+        finally:
+            self.cache.delete(f'{full_key}:lock')
+
+
+KB_CACHE = CacheNamespace('kb', timeout=600)
+PROFILE_CACHE = CacheNamespace('profiles', timeout=60)
+ANSWER_CACHE = CacheNamespace('answers', timeout=3600)
+STATS_CACHE = CacheNamespace('stats', timeout=300)
+AUTH_CACHE = CacheNamespace('auth', timeout=3600)
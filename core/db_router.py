@@ -0,0 +1,94 @@
+"""
+Database router sending knowledge base reads to a read replica
+"""
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+REPLICA = 'replica'
+PRIMARY = 'default'
+
+
+class ReplicaRouter:
+    """
+    Route reads of REPLICA_READ_MODELS to the "replica" alias and everything
+    else to "default"
+
+    The replica is only used while it is reachable and less than
+    REPLICA_MAX_LAG_SECONDS behind the primary (a replica with no received
+    WAL left to replay counts as current). Its health is re-checked at
+    most every REPLICA_CHECK_INTERVAL_SECONDS per process, so a failing or
+    lagging replica costs one probe per interval rather than one per query.
+    Reads inside a transaction on the primary stay on the primary so they
+    see the transaction's own writes.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._healthy = False
+        self._checked_at = None
+
+    def _replica_models(self):
+        return {label.lower() for label in getattr(settings, 'REPLICA_READ_MODELS', [])}
+
+    def _replica_available(self):
+        if REPLICA not in settings.DATABASES:
+            return False
+
+        interval = getattr(settings, 'REPLICA_CHECK_INTERVAL_SECONDS', 10)
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < interval:
+            return self._healthy
+
+        with self._lock:
+            # Another thread may have refreshed the status while we waited
+            if self._checked_at is None or now - self._checked_at >= interval:
+                self._healthy = self._check_replica()
+                self._checked_at = time.monotonic()
+            return self._healthy
+
+    def _check_replica(self):
+        """Probe the replica and measure its replay lag"""
+        try:
+            with connections[REPLICA].cursor() as cursor:
+                # NULL when the server isn't a streaming standby (e.g. a
+                # second independent instance in development). The last
+                # replayed transaction gets older while the primary is idle,
+                # so a standby that has replayed all the WAL it received is
+                # not lagging, however old that transaction is.
+                cursor.execute(
+                    "SELECT CASE WHEN NOT pg_is_in_recovery() THEN NULL "
+                    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+                )
+                lag = cursor.fetchone()[0]
+        except Exception as e:
+            logger.warning(f"Read replica unavailable, using primary: {str(e)}")
+            return False
+
+        max_lag = getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 30)
+        if lag is not None and lag > max_lag:
+            logger.warning(f"Read replica is {lag:.1f}s behind (max {max_lag}s), using primary")
+            return False
+        return True
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower not in self._replica_models():
+            return PRIMARY
+        if connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        return REPLICA if self._replica_available() else PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary and is never migrated directly
+        return db == PRIMARY
@@ -0,0 +1,237 @@
+"""
+Non-blocking logging pipeline
+
+Request threads only put records on an in-memory queue
+(QueueListenerHandler). A background thread hands them to the real
+handlers (console, rotating JSON file), so disk and terminal I/O never
+block a request. Everything is configured from settings.LOGGING:
+
+    'queue': {
+        '()': 'core.log.QueueListenerHandler',
+        'handlers': ['cfg://handlers.console', 'cfg://handlers.file'],
+        'filters': ['sample_info'],
+    }
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import weakref
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Attributes every LogRecord has; anything else came from ``extra=``
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format records as one JSON object per line
+
+    Fields passed through ``extra=`` are included as top-level keys.
+    """
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'process': record.process,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of INFO and DEBUG records from busy loggers
+
+    Warnings and errors always pass.
+
+    Args:
+        rate (float): Fraction of records to keep, 0.0-1.0
+        loggers (list): Logger names (and their children) to sample;
+            all loggers when omitted
+    """
+    def __init__(self, rate=1.0, loggers=None):
+        super().__init__()
+        self.rate = float(rate)
+        self.loggers = tuple(loggers or ())
+
+    def _applies_to(self, name):
+        if not self.loggers:
+            return True
+        return any(name == logger or name.startswith(logger + '.') for logger in self.loggers)
+
+    def filter(self, record):
+        if self.rate >= 1.0 or record.levelno >= logging.WARNING or not self._applies_to(record.name):
+            return True
+        return random.random() < self.rate
+
+
+class MultiProcessRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler that several processes (gunicorn workers) can share
+
+    Every write takes an exclusive lock on "<filename>.lock", and a process
+    reopens the file when another one has rotated it, so workers neither
+    rotate the same file twice nor keep writing to a renamed backup. Without
+    fcntl (Windows) it behaves like RotatingFileHandler.
+    """
+    def __init__(self, filename, *args, **kwargs):
+        super().__init__(filename, *args, **kwargs)
+        self._lock_file = None
+        self._lock_pid = None
+
+    def _acquire_file_lock(self):
+        if fcntl is None:
+            return
+        # flock locks belong to the open file, which a forked child shares
+        # with its parent, so each process opens its own
+        if self._lock_pid != os.getpid():
+            self._lock_file = open(self.baseFilename + '.lock', 'a')
+            self._lock_pid = os.getpid()
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+
+    def _release_file_lock(self):
+        if fcntl is not None and self._lock_file is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _reopen_if_rotated(self):
+        if self.stream is None:
+            return
+        try:
+            current = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            current = None
+        opened = os.fstat(self.stream.fileno())
+        if current is None or (current.st_dev, current.st_ino) != (opened.st_dev, opened.st_ino):
+            self.stream.close()
+            self.stream = self._open()
+
+    def emit(self, record):
+        try:
+            self._acquire_file_lock()
+        except OSError:
+            self.handleError(record)
+            return
+        try:
+            self._reopen_if_rotated()
+            super().emit(record)
+        finally:
+            self._release_file_lock()
+
+    def close(self):
+        super().close()
+        if self._lock_file is not None and self._lock_pid == os.getpid():
+            self._lock_file.close()
+        self._lock_file = None
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+    QueueHandler that owns a QueueListener feeding the given handlers
+
+    Configure it with a '()' factory key rather than 'class': Python 3.12+
+    treats 'class' QueueHandlers specially and would consume 'handlers'.
+    The listener thread starts with the first record and is stopped (after
+    draining the queue) at exit. A forked child (gunicorn --preload,
+    ProcessPoolExecutor workers) gets a fresh queue and starts its own
+    listener, since the parent's thread does not exist in it.
+
+    Args:
+        handlers (list): Handlers to feed; in settings.LOGGING, refer to them
+            as 'cfg://handlers.<name>'
+        queue_size (int): Maximum queued records; 0 means unbounded
+    """
+    def __init__(self, handlers, queue_size=0):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.listener = None
+        self._pid = os.getpid()
+        self._start_lock = threading.Lock()
+        # dictConfig resolves 'cfg://handlers.<name>' when the list is indexed
+        # (not iterated): to the handler once it is configured, to its config
+        # dict before that. The message tells dictConfig to retry this
+        # handler once the others exist.
+        self.targets = [handlers[index] for index in range(len(handlers))]
+        if not all(isinstance(target, logging.Handler) for target in self.targets):
+            raise ValueError('target not configured yet')
+        _queue_handlers.add(self)
+
+    def _after_fork(self):
+        # Records queued by the parent are its own to write; the lock may
+        # have been held by a parent thread that does not exist here
+        self.queue = queue.Queue(maxsize=self.queue.maxsize)
+        self.listener = None
+        self._pid = os.getpid()
+        self._start_lock = threading.Lock()
+
+    def _start(self):
+        if self._pid != os.getpid():
+            self._after_fork()
+        with self._start_lock:
+            if self.listener is not None:
+                return
+            self.listener = QueueListener(self.queue, *self.targets, respect_handler_level=True)
+            self.listener.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        """Flush queued records and stop the listener thread"""
+        with self._start_lock:
+            if self.listener is not None and self._pid == os.getpid():
+                self.listener.stop()
+            self.listener = None
+
+    def prepare(self, record):
+        # Render the message now (arguments may change after this call) but
+        # keep the traceback separate so formatters can place it themselves
+        message = record.getMessage()
+        exc_text = record.exc_text
+        if record.exc_info and not exc_text:
+            exc_text = logging.Formatter().formatException(record.exc_info)
+        record = logging.makeLogRecord(vars(record))
+        record.msg = message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = exc_text
+        return record
+
+    def enqueue(self, record):
+        if self.listener is None or self._pid != os.getpid():
+            self._start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Drop rather than block the request when the writer falls behind
+            pass
+
+    def close(self):
+        self.stop()
+        super().close()
+
+
+_queue_handlers = weakref.WeakSet()
+
+def _reset_queue_handlers():
+    for handler in list(_queue_handlers):
+        handler._after_fork()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_queue_handlers)
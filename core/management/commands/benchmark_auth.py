@@ -0,0 +1,96 @@
+import base64
+import statistics
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework import authentication
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication as UncachedJWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+from core.authentication import invalidate_cached_user
+from users.models import StudentProfile
+
+# The chain used before core.authentication.JWTAuthentication was cached and moved first
+PREVIOUS_CHAIN = [authentication.SessionAuthentication, authentication.BasicAuthentication, UncachedJWTAuthentication]
+PASSWORD = 'benchmark-password'
+
+class Command(BaseCommand):
+    help = 'Measures per-request authentication cost (time and queries) of the previous and current auth chains'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Authenticated requests per scenario (default: 200)')
+        parser.add_argument('--path', type=str, default='/api/chat/', help='Request path (default: /api/chat/)')
+
+    def _run(self, authenticators, headers, path, count):
+        """Authenticate count requests and read the user's profile, as the chat view does"""
+        factory = APIRequestFactory()
+        durations = []
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_queries):
+            for _ in range(count):
+                request = Request(factory.post(path, **headers), authenticators=[cls() for cls in authenticators])
+                start = time.perf_counter()
+                user = request.user
+                try:
+                    user.student_profile
+                except StudentProfile.DoesNotExist:
+                    pass
+                durations.append((time.perf_counter() - start) * 1000)
+
+        assert user.is_authenticated, 'benchmark request was not authenticated'
+        durations.sort()
+        return {
+            'mean': statistics.mean(durations),
+            'p50': durations[len(durations) // 2],
+            'p99': durations[min(len(durations) - 1, int(0.99 * len(durations)))],
+            'queries': queries / count,
+        }
+
+    def handle(self, *args, **options):
+        # Throwaway user and profile, rolled back at the end
+        with transaction.atomic():
+            user = User.objects.create_user('auth-benchmark', password=PASSWORD)
+            StudentProfile.objects.create(
+                user=user, name='Auth Benchmark', email='auth-benchmark@example.com',
+                program='Computer Science', year_of_study=1, student_id='AUTH-BENCH',
+            )
+            bearer = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'}
+            credentials = base64.b64encode(f'{user.username}:{PASSWORD}'.encode()).decode()
+            basic = {'HTTP_AUTHORIZATION': f'Basic {credentials}'}
+            current_chain = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+
+            scenarios = [
+                ('previous chain, Basic', PREVIOUS_CHAIN, basic),
+                ('previous chain, JWT', PREVIOUS_CHAIN, bearer),
+                ('current chain, JWT', current_chain, bearer),
+            ]
+            try:
+                invalidate_cached_user(user.pk)
+                self.stdout.write(f'{options["requests"]} requests per scenario on {options["path"]}')
+                results = {}
+                for label, chain, headers in scenarios:
+                    result = self._run(chain, headers, options['path'], options['requests'])
+                    results[label] = result
+                    self.stdout.write(
+                        f'{label:<22} mean {result["mean"]:>8.3f}ms  p50 {result["p50"]:>8.3f}ms  '
+                        f'p99 {result["p99"]:>8.3f}ms  queries/request {result["queries"]:.2f}'
+                    )
+            finally:
+                invalidate_cached_user(user.pk)
+                transaction.set_rollback(True)
+
+        before, after = results['previous chain, JWT'], results['current chain, JWT']
+        self.stdout.write(self.style.SUCCESS(
+            f'JWT request: {before["mean"]:.3f}ms -> {after["mean"]:.3f}ms, '
+            f'{before["queries"]:.2f} -> {after["queries"]:.2f} queries'
+        ))
+
@@ -0,0 +1,93 @@
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+from django.core.management.base import BaseCommand
+from core.log import JsonFormatter, MultiProcessRotatingFileHandler, QueueListenerHandler
+
+VERBOSE_FORMAT = '{levelname} {asctime} {module} {message}'
+
+class Command(BaseCommand):
+    help = 'Compares request-thread logging cost of direct file handlers against the queue pipeline'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Simulated requests per thread (default: 2000)')
+        parser.add_argument('--lines', type=int, default=5, help='Log lines per request (default: 5)')
+        parser.add_argument('--threads', type=int, default=4, help='Concurrent request threads (default: 4)')
+        parser.add_argument('--work-ms', type=float, default=2.0,
+                            help='Simulated I/O wait per request, e.g. database and LLM calls (default: 2)')
+    
+    def _handlers(self, directory, name):
+        # Same targets as settings.LOGGING: a console-style text stream and a JSON file
+        stream = logging.FileHandler(os.path.join(directory, f'{name}-console.log'))
+        stream.setFormatter(logging.Formatter(VERBOSE_FORMAT, style='{'))
+        rotating = MultiProcessRotatingFileHandler(os.path.join(directory, f'{name}.log'), maxBytes=10 * 1024 * 1024, backupCount=2)
+        rotating.setFormatter(JsonFormatter())
+        return [stream, rotating]
+    
+    def _run(self, logger, options):
+        """Log from several threads and return per-request logging times in ms"""
+        durations = []
+        lock = threading.Lock()
+        
+        def worker():
+            local = []
+            for i in range(options['requests']):
+                start = time.perf_counter()
+                for line in range(options['lines']):
+                    logger.info(f'request {i} step {line}', extra={'view': 'chat:message', 'status': 200})
+                local.append((time.perf_counter() - start) * 1000)
+                time.sleep(options['work_ms'] / 1000)
+            with lock:
+                durations.extend(local)
+        
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return durations, time.perf_counter() - started
+    
+    def _report(self, label, durations, wall):
+        durations.sort()
+        quantile = lambda q: durations[min(len(durations) - 1, int(q * len(durations)))]
+        self.stdout.write(
+            f'{label:<7} mean {statistics.mean(durations):.3f}ms  p50 {quantile(0.5):.3f}ms  '
+            f'p95 {quantile(0.95):.3f}ms  p99 {quantile(0.99):.3f}ms  max {durations[-1]:.3f}ms  '
+            f'(wall {wall:.2f}s)'
+        )
+        return quantile(0.99)
+    
+    def handle(self, *args, **options):
+        total = options['requests'] * options['threads'] * options['lines']
+        self.stdout.write(f'{total} records from {options["threads"]} threads, {options["lines"]} per request')
+        
+        with tempfile.TemporaryDirectory() as directory:
+            direct = logging.getLogger('benchmark.direct')
+            direct.propagate = False
+            direct.setLevel(logging.INFO)
+            for handler in self._handlers(directory, 'direct'):
+                direct.addHandler(handler)
+            direct_p99 = self._report('direct', *self._run(direct, options))
+            
+            queued = logging.getLogger('benchmark.queue')
+            queued.propagate = False
+            queued.setLevel(logging.INFO)
+            targets = self._handlers(directory, 'queue')
+            queue_handler = QueueListenerHandler(targets)
+            queued.addHandler(queue_handler)
+            durations, wall = self._run(queued, options)
+            # Include the time the listener needs to catch up
+            drain_start = time.perf_counter()
+            queue_handler.stop()
+            drain = time.perf_counter() - drain_start
+            queue_p99 = self._report('queue', durations, wall)
+            self.stdout.write(f'        listener drained the backlog in {drain:.2f}s after the last request')
+            
+            for handler in direct.handlers + [queue_handler] + targets:
+                handler.close()
+        
+        self.stdout.write(self.style.SUCCESS(f'p99 per request: {direct_p99:.3f}ms direct, {queue_p99:.3f}ms queued'))
@@ -0,0 +1,64 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from core.tracing import STATUS_ERROR, read_traces
+
+# Attributes already shown in a span's line or too noisy to repeat
+HIDDEN_ATTRIBUTES = {'db.system', 'db.statement', 'db.operation', 'http.request.method', 'url.path'}
+
+class Command(BaseCommand):
+    help = 'Prints traces from the tracing file as span trees, slowest first'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--file', type=str, default=None, help='Trace file (default: settings.TRACING_FILE)')
+        parser.add_argument('--trace', type=str, help='Show only this trace ID')
+        parser.add_argument('--conversation', type=str, help='Show traces of this chat conversation ID')
+        parser.add_argument('--slowest', type=int, default=5, help='Number of traces to show (default: 5)')
+        parser.add_argument('--hide-db', action='store_true', help='Leave out individual database query spans')
+    
+    def handle(self, *args, **options):
+        path = options['file'] or settings.TRACING_FILE
+        if not os.path.exists(path):
+            raise CommandError(f'Trace file not found: {path}')
+        
+        traces = read_traces(path)
+        selected = []
+        for trace_id, spans in traces.items():
+            if options['trace'] and trace_id != options['trace']:
+                continue
+            # The server span; its parent (from a traceparent header) lives in another service
+            span_ids = {item['span_id'] for item in spans}
+            roots = [item for item in spans if item['parent_id'] not in span_ids]
+            if not roots:
+                continue
+            root = min(roots, key=lambda item: item['start_ns'])
+            if options['conversation'] and root['attributes'].get('chat.conversation_id') != options['conversation']:
+                continue
+            selected.append((trace_id, root, spans))
+        
+        selected.sort(key=lambda entry: entry[1]['duration_ms'], reverse=True)
+        if not selected:
+            self.stdout.write('No matching traces')
+            return
+        
+        for trace_id, root, spans in selected[:options['slowest']]:
+            children = {}
+            for item in spans:
+                children.setdefault(item['parent_id'], []).append(item)
+            self.stdout.write(self.style.SUCCESS(f'Trace {trace_id}'))
+            self._print(root, children, 0, root['start_ns'], options['hide_db'])
+            self.stdout.write('')
+    
+    def _print(self, item, children, depth, origin, hide_db):
+        if hide_db and item['name'] == 'db.query':
+            return
+        attributes = item['attributes']
+        if item['name'] == 'db.query':
+            detail = attributes.get('db.statement', '')[:100]
+        else:
+            detail = ' '.join(f'{key}={value}' for key, value in attributes.items() if key not in HIDDEN_ATTRIBUTES)
+        offset = (item['start_ns'] - origin) / 1e6
+        line = f'{"  " * depth}{item["name"]:<{max(40 - 2 * depth, 10)}} {item["duration_ms"]:>9.1f}ms  (+{offset:.1f}ms)  {detail}'
+        self.stdout.write(self.style.ERROR(line) if item['status'] == STATUS_ERROR else line)
+        for child in sorted(children.get(item['span_id'], []), key=lambda child: child['start_ns']):
+            self._print(child, children, depth + 1, origin, hide_db)
@@ -0,0 +1,106 @@
+"""
+Prometheus metrics for the chat, search, crawl and cache subsystems
+
+All metrics are declared here and updated from the code paths they
+describe. GET /metrics renders them in the Prometheus text format.
+
+Multi-process servers (gunicorn, uWSGI) must set PROMETHEUS_MULTIPROC_DIR
+to an empty, writable directory before the workers start. Every worker
+then writes its values to files in that directory and /metrics merges
+them, so a scrape sees the whole server rather than one worker. Call
+mark_process_dead() from the server's worker-exit hook to drop the live
+gauges of exited workers; gunicorn.conf.py does this for gunicorn.
+"""
+import os
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess,
+)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+LLM_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# HTTP
+HTTP_REQUESTS = Counter(
+    'http_requests_total', 'HTTP requests handled', ['view', 'method', 'status']
+)
+HTTP_REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Time to produce a response', ['view'], buckets=LATENCY_BUCKETS
+)
+
+# Database
+DB_QUERIES = Counter('db_queries_total', 'Database queries executed during requests', ['view'])
+DB_QUERY_LATENCY = Histogram('db_query_duration_seconds', 'Duration of single database queries', buckets=LATENCY_BUCKETS)
+DB_QUERIES_PER_REQUEST = Histogram(
+    'db_queries_per_request', 'Database queries run by one request', ['view'], buckets=COUNT_BUCKETS
+)
+
+# Chat / LLM
+CHAT_RESPONSES = Counter('chat_responses_total', 'Chat responses generated')
+CHAT_RESPONSE_LATENCY = Histogram(
+    'chat_response_duration_seconds', 'ChatService.generate_response duration', buckets=LLM_LATENCY_BUCKETS
+)
+LLM_REQUESTS = Counter(
+    'llm_requests_total', 'Calls to the language model', ['backend', 'outcome']
+)
+LLM_LATENCY = Histogram(
+    'llm_request_duration_seconds', 'Language model call duration', ['backend'], buckets=LLM_LATENCY_BUCKETS
+)
+LLM_TOKENS = Counter('llm_tokens_total', 'Tokens reported by the language model', ['kind'])
+LLM_FALLBACKS = Counter('llm_fallbacks_total', 'Groq SDK failures retried through the HTTP API')
+
+# FAQ fast path (chat/faq.py)
+FAQ_LOOKUPS = Counter('faq_lookups_total', 'FAQ fast path lookups', ['result'])
+FAQ_MATCH_LATENCY = Histogram('faq_match_duration_seconds', 'Time to match a message against the FAQ', buckets=LATENCY_BUCKETS)
+FAQ_SECONDS_SAVED = Counter('faq_seconds_saved_total', 'Estimated answer time saved by FAQ hits')
+
+# Precomputed answers (chat/precompute.py)
+PRECOMPUTED_ANSWER_LOOKUPS = Counter('precomputed_answer_lookups_total', 'Precomputed answer cache lookups', ['result'])
+PRECOMPUTED_ANSWERS = Counter('precomputed_answers_total', 'Answers generated by precompute_answers', ['result'])
+
+# Knowledge base search
+KB_SEARCH_LATENCY = Histogram(
+    'kb_search_duration_seconds', 'Knowledge base search duration', ['function'], buckets=LATENCY_BUCKETS
+)
+KB_SEARCH_RESULTS = Histogram(
+    'kb_search_results', 'Entries returned by a knowledge base search', ['function'], buckets=COUNT_BUCKETS
+)
+
+# Crawler
+CRAWL_STAGE_LATENCY = Histogram(
+    'crawler_stage_duration_seconds', 'Time spent per page in each crawl stage', ['stage'], buckets=LATENCY_BUCKETS
+)
+CRAWL_PAGES = Counter('crawler_pages_total', 'Pages crawled', ['outcome'])
+CRAWL_JOBS_RUNNING = Gauge(
+    'crawler_jobs_running', 'Crawl jobs currently executing', multiprocess_mode='livesum'
+)
+
+# Cache (core/cache.py)
+CACHE_REQUESTS = Counter('cache_requests_total', 'Tiered cache lookups', ['tier', 'result'])
+CACHE_NAMESPACE_REQUESTS = Counter('cache_namespace_requests_total', 'Cache namespace lookups', ['namespace', 'result'])
+CACHE_RECOMPUTES = Counter(
+    'cache_recomputes_total', 'Values computed by get_or_compute', ['namespace', 'reason']
+)
+
+
+def is_multiprocess():
+    return bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+def render_metrics():
+    """
+    Render all metrics in the Prometheus text format
+
+    Returns:
+        bytes: Exposition text, merged across worker processes when
+               PROMETHEUS_MULTIPROC_DIR is set
+    """
+    if is_multiprocess():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+def mark_process_dead(pid):
+    """Discard live gauge values of an exited worker (multi-process mode only)"""
+    if is_multiprocess():
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,190 @@
+"""
+Request middleware
+"""
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from core.timing import start_timer, stop_timer, count_queries, server_timing_header, registry
+from core.metrics import HTTP_REQUESTS, HTTP_REQUEST_LATENCY, DB_QUERIES, DB_QUERIES_PER_REQUEST
+from core.profiling import PROFILE_HEADER, Profiler, read_profile_token
+from core.tracing import STATUS_ERROR, end_trace, parse_traceparent, should_sample, start_trace
+
+logger = logging.getLogger('core.timing')
+
+
+class StageTimingMiddleware:
+    """
+    Time every request and the stages marked with core.timing.stage
+
+    Adds a Server-Timing header to responses for staff users (for every
+    client when SERVER_TIMING_HEADERS is True), logs one JSON line per request to the "core.timing" logger and records
+    latency histograms per view and stage. Place it first in MIDDLEWARE so
+    the total includes the other middleware.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer, token = start_timer()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(count_queries))
+                response = self.get_response(request)
+            total = timer.elapsed()
+        finally:
+            stop_timer(token)
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name or match.route) if match else 'unresolved'
+        registry.observe(view, timer, total)
+        HTTP_REQUESTS.labels(view, request.method, response.status_code).inc()
+        HTTP_REQUEST_LATENCY.labels(view).observe(total)
+        DB_QUERIES.labels(view).inc(timer.queries)
+        DB_QUERIES_PER_REQUEST.labels(view).observe(timer.queries)
+
+        # DRF sets request.user once the view has authenticated the request
+        user = getattr(request, 'user', None)
+        if getattr(settings, 'SERVER_TIMING_HEADERS', False) or getattr(user, 'is_staff', False):
+            response['Server-Timing'] = server_timing_header(timer, total)
+
+        logger.info(json.dumps({
+            'event': 'request_timing',
+            'method': request.method,
+            'path': request.path,
+            'view': view,
+            'status': response.status_code,
+            'trace_id': getattr(request, 'trace_id', None),
+            'total_ms': round(total * 1000, 1),
+            'db_queries': timer.queries,
+            'db_ms': round(timer.db_seconds * 1000, 1),
+            'databases': {
+                alias: {'ms': round(entry['seconds'] * 1000, 1), 'queries': entry['queries']}
+                for alias, entry in timer.databases.items()
+            },
+            'stages': {
+                name: {'ms': round(entry['seconds'] * 1000, 1), 'queries': entry['queries']}
+                for name, entry in timer.stages.items()
+            },
+        }))
+        return response
+
+
+class TracingMiddleware:
+    """
+    Trace requests (see core/tracing.py)
+
+    Starts a trace with a server span per request, joining the caller's
+    trace when a W3C traceparent header is sent, and returns the trace ID in
+    an X-Trace-Id header. Unused unless TRACING_EXPORTER is set. A valid
+    traceparent's sampled flag decides whether the request is traced;
+    otherwise a TRACING_SAMPLE_RATE below 1 traces that fraction of requests.
+    """
+    def __init__(self, get_response):
+        if not getattr(settings, 'TRACING_EXPORTER', ''):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        traceparent = request.META.get('HTTP_TRACEPARENT')
+        # The caller's sampled flag decides; without a valid header, sample at the configured rate
+        sampled = parse_traceparent(traceparent)[2]
+        if not (should_sample() if sampled is None else sampled):
+            return self.get_response(request)
+
+        root, token = start_trace(f'{request.method} {request.path}', {
+            'http.request.method': request.method,
+            'url.path': request.path,
+        }, traceparent)
+        request.trace_id = root.trace_id
+        try:
+            response = self.get_response(request)
+        except Exception as e:
+            root.record_exception(e)
+            end_trace(root, token)
+            raise
+
+        match = getattr(request, 'resolver_match', None)
+        if match and match.route:
+            root.name = f'{request.method} /{match.route}'
+            root.set_attributes({'http.route': match.route})
+        root.set_attributes({'http.response.status_code': response.status_code})
+        if response.status_code >= 500:
+            root.status_code = STATUS_ERROR
+        end_trace(root, token)
+
+        response['X-Trace-Id'] = root.trace_id
+        return response
+
+
+class RequestProfilingMiddleware:
+    """
+    Profile requests on demand (see core/profiling.py)
+
+    A request is profiled when it carries a valid X-Profile-Request header
+    signed for an active staff user, or at random for a PROFILE_SAMPLE_RATE
+    fraction of requests. Other requests only pay for a dictionary lookup.
+    Header-triggered responses get an X-Profile-Id header naming the
+    stored RequestProfile.
+    """
+    header_key = 'HTTP_' + PROFILE_HEADER.upper().replace('-', '_')
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILE_SAMPLE_RATE', 0)
+
+    def __call__(self, request):
+        token = request.META.get(self.header_key)
+        if token is None and not (self.sample_rate and random.random() < self.sample_rate):
+            return self.get_response(request)
+        return self._profile(request, token)
+
+    def _profile(self, request, token):
+        user_id = None
+        if token is None:
+            trigger, mode = 'sample', settings.PROFILE_MODE
+        else:
+            claims = read_profile_token(token)
+            if claims is None or not get_user_model().objects.filter(pk=claims[0], is_staff=True, is_active=True).exists():
+                logger.warning(f"Ignoring invalid {PROFILE_HEADER} header on {request.path}")
+                return self.get_response(request)
+            trigger = 'header'
+            user_id, mode = claims
+
+        profiler = Profiler(mode)
+        try:
+            profiler.start()
+        except ValueError as e:
+            # Another profiler is active in this process
+            logger.warning(f"Not profiling {request.path}: {str(e)}")
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.stop()
+        duration_ms = (time.perf_counter() - start) * 1000
+
+        match = getattr(request, 'resolver_match', None)
+        try:
+            profile = profiler.save(
+                f'{request.method} {request.path}', duration_ms, trigger,
+                user_id=user_id, view=(match.view_name or match.route) if match else '',
+                status_code=response.status_code,
+            )
+        except Exception as e:
+            logger.error(f"Failed to save request profile: {str(e)}")
+            return response
+
+        if trigger == 'header':
+            response['X-Profile-Id'] = str(profile.id)
+        return response
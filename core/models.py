@@ -1,3 +1,53 @@
+import os
+from django.conf import settings
 from django.db import models
 
 # Create your models here.
+class RequestProfile(models.Model):
+    """A stored cProfile or stack-sampling profile (see core/profiling.py)"""
+    MODE_CPROFILE = 'cprofile'
+    MODE_SAMPLE = 'sample'
+    MODE_CHOICES = [
+        (MODE_CPROFILE, 'cProfile'),
+        (MODE_SAMPLE, 'Stack sampling'),
+    ]
+    TRIGGER_HEADER = 'header'
+    TRIGGER_SAMPLE = 'sample'
+    TRIGGER_MANUAL = 'manual'
+    TRIGGER_CHOICES = [
+        (TRIGGER_HEADER, 'Signed header'),
+        (TRIGGER_SAMPLE, 'Random sample'),
+        (TRIGGER_MANUAL, 'profile_block'),
+    ]
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    name = models.CharField(max_length=255)
+    view = models.CharField(max_length=200, blank=True)
+    status_code = models.PositiveSmallIntegerField(blank=True, null=True)
+    duration_ms = models.FloatField()
+    mode = models.CharField(max_length=20, choices=MODE_CHOICES)
+    trigger = models.CharField(max_length=20, choices=TRIGGER_CHOICES)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="request_profiles")
+    file_name = models.CharField(max_length=255)
+    file_size = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
+    
+    @property
+    def path(self):
+        return os.path.join(settings.PROFILE_DIR, self.file_name)
+    
+    def delete(self, *args, **kwargs):
+        """Remove the profile file along with the record"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        return super().delete(*args, **kwargs)
+    
+    def __str__(self):
+        return f"{self.name} ({self.get_mode_display()}, {self.duration_ms:.0f} ms)"
@@ -0,0 +1,50 @@
+"""
+Paginator for admin changelists over very large tables
+"""
+import json
+import logging
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+logger = logging.getLogger(__name__)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that trusts the Postgres planner's row estimate for large results
+
+    An exact COUNT(*) has to visit every matching row, which dominates the
+    changelist on tables with millions of rows. The planner estimate from
+    EXPLAIN costs about as much as planning the query. Only when it falls
+    below ``exact_count_threshold`` is an exact count run, so small tables
+    and narrow filters still show precise totals.
+    """
+    exact_count_threshold = 10000
+
+    def _estimate_count(self):
+        queryset = self.object_list
+        compiler = queryset.query.get_compiler(using=queryset.db)
+        sql, params = compiler.as_sql()
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not hasattr(queryset, 'query') or connections[queryset.db].vendor != 'postgresql':
+            return super().count
+
+        try:
+            estimate = self._estimate_count()
+        except Exception as e:
+            logger.warning(f"Row estimate failed, counting exactly: {str(e)}")
+            return super().count
+
+        if estimate < self.exact_count_threshold:
+            return super().count
+        return estimate
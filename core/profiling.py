@@ -0,0 +1,199 @@
+"""
+On-demand profiling of requests and code blocks
+
+Two profilers are available:
+
+- "cprofile": deterministic cProfile run saved as a .pstats file (open
+  with pstats, snakeviz or `python -m pstats`)
+- "sample": a background thread records the profiled thread's stack every
+  PROFILE_SAMPLE_INTERVAL_MS and saves collapsed stacks (.folded), ready
+  for flamegraph.pl or speedscope. Its overhead does not grow with the
+  number of function calls.
+
+RequestProfilingMiddleware profiles requests that carry a signed
+X-Profile-Request header (issued to staff by GET /api/profiling/token/) and
+a random PROFILE_SAMPLE_RATE fraction of all requests. Code outside
+requests can be profiled with ``profile_block``. Every profile is recorded
+as a RequestProfile and can be downloaded from the admin.
+"""
+import cProfile
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+from django.utils.text import slugify
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile-Request'
+PROFILE_MODES = ('cprofile', 'sample')
+FILE_EXTENSIONS = {'cprofile': 'pstats', 'sample': 'folded'}
+_SIGNING_SALT = 'core.profiling'
+
+
+def make_profile_token(user, mode='cprofile'):
+    """
+    Sign a header value that profiles requests as ``user``
+
+    Returns:
+        str: Value for the X-Profile-Request header
+    """
+    return signing.TimestampSigner(salt=_SIGNING_SALT).sign(f'{user.pk}:{mode}')
+
+def read_profile_token(token):
+    """
+    Verify an X-Profile-Request header value
+
+    Returns:
+        tuple: (user_id, mode), or None if the token is forged, expired or malformed
+    """
+    try:
+        value = signing.TimestampSigner(salt=_SIGNING_SALT).unsign(token, max_age=settings.PROFILE_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    user_id, _, mode = value.partition(':')
+    if not user_id.isdigit() or mode not in PROFILE_MODES:
+        return None
+    return int(user_id), mode
+
+
+class StackSampler:
+    """
+    Count the stacks of one thread, sampled from a background thread
+
+    Args:
+        thread_id (int): threading.get_ident() of the thread to sample
+        interval (float): Seconds between samples
+    """
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path):
+        """Write collapsed stacks, one "frame;frame;frame count" line per stack"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+class Profiler:
+    """
+    One cProfile or sampling session on the current thread
+
+    Args:
+        mode (str): "cprofile" or "sample"
+    """
+    def __init__(self, mode):
+        self.mode = mode
+        self._profile = None
+        self._sampler = None
+
+    def start(self):
+        """
+        Raises:
+            ValueError: If another profiler is already active (cProfile on Python 3.12+)
+        """
+        if self.mode == 'cprofile':
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._sampler = StackSampler(threading.get_ident(), settings.PROFILE_SAMPLE_INTERVAL_MS / 1000)
+            self._sampler.start()
+
+    def stop(self):
+        if self._profile is not None:
+            self._profile.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+
+    def save(self, name, duration_ms, trigger, user_id=None, view='', status_code=None):
+        """
+        Write the profile to PROFILE_DIR and record it
+
+        Returns:
+            RequestProfile: The stored profile
+        """
+        from core.models import RequestProfile
+
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        file_name = (
+            f'{timezone.now():%Y%m%d-%H%M%S}-{slugify(name)[:60] or "profile"}-'
+            f'{uuid.uuid4().hex[:8]}.{FILE_EXTENSIONS[self.mode]}'
+        )
+        path = os.path.join(settings.PROFILE_DIR, file_name)
+        if self._profile is not None:
+            self._profile.dump_stats(path)
+        else:
+            self._sampler.dump(path)
+
+        profile = RequestProfile.objects.create(
+            name=name[:255],
+            view=view[:200],
+            status_code=status_code,
+            duration_ms=round(duration_ms, 1),
+            mode=self.mode,
+            trigger=trigger,
+            user_id=user_id,
+            file_name=file_name,
+            file_size=os.path.getsize(path),
+        )
+        prune_profiles()
+        return profile
+
+
+def prune_profiles():
+    """Delete the oldest profiles beyond PROFILE_MAX_COUNT, with their files"""
+    from core.models import RequestProfile
+
+    stale = RequestProfile.objects.order_by('-created_at')[settings.PROFILE_MAX_COUNT:]
+    for profile in stale:
+        profile.delete()
+
+@contextmanager
+def profile_block(name, mode='sample'):
+    """
+    Profile a block of code outside the request cycle, e.g. in a shell:
+
+        with profile_block('scrape_webpage'):
+            scrape_webpage(url)
+
+    Args:
+        name (str): Label shown in the admin
+        mode (str): "cprofile" or "sample"
+    """
+    profiler = Profiler(mode)
+    profiler.start()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        profiler.save(name, (time.perf_counter() - start) * 1000, trigger='manual')
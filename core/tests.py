@@ -1,3 +1,251 @@
-from django.test import TestCase
+import threading
+import time
+from unittest import mock
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from core.authentication import JWTAuthentication
+from core.cache import _MISSING, AUTH_CACHE, CacheEntry, CacheNamespace, LocalLRU
+from core.middleware import TracingMiddleware
+from core.tracing import parse_traceparent
+from core.views import metrics
+from users.models import StudentProfile
 
-# Create your tests here.
+TRACE_ID = '4bf92f3577b34da6a3ce929d0e0e4736'
+PARENT_ID = '00f067aa0ba902b7'
+
+
+class LocalLRUTests(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        lru = LocalLRU(max_entries=2)
+        lru.set('a', 1, 60)
+        lru.set('b', 2, 60)
+        lru.get('a')
+        lru.set('c', 3, 60)
+        self.assertEqual(lru.get('a'), 1)
+        self.assertIs(lru.get('b'), _MISSING)
+        self.assertEqual(lru.get('c'), 3)
+
+    def test_expired_entries_are_missing(self):
+        lru = LocalLRU()
+        lru.set('a', 1, 0.01)
+        time.sleep(0.02)
+        self.assertIs(lru.get('a'), _MISSING)
+
+
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = caches['default']
+        self.cache.clear()
+
+    def test_shared_hit_is_kept_locally(self):
+        self.cache.shared.set('plain', 'value', 60)
+        self.assertEqual(self.cache.get('plain'), 'value')
+        self.assertEqual(self.cache.local.get(self.cache._local_key('plain', None)), 'value')
+
+    def test_local_copy_does_not_outlive_the_entry(self):
+        entry = CacheEntry('value', 0.0, time.time() + 0.05)
+        self.cache.shared.set('entry', entry, 60)
+        self.assertEqual(self.cache.get('entry'), entry)
+        time.sleep(0.06)
+        self.assertIs(self.cache.local.get(self.cache._local_key('entry', None)), _MISSING)
+
+    def test_expired_entry_is_not_kept_locally(self):
+        self.cache.shared.set('entry', CacheEntry('value', 0.0, time.time() - 1), 60)
+        self.cache.get('entry')
+        self.assertIs(self.cache.local.get(self.cache._local_key('entry', None)), _MISSING)
+
+
+class CacheNamespaceTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.namespace = CacheNamespace('test', timeout=60)
+
+    def test_get_or_compute_caches_the_value(self):
+        compute = mock.Mock(return_value=42)
+        self.assertEqual(self.namespace.get_or_compute('key', compute), 42)
+        self.assertEqual(self.namespace.get_or_compute('key', compute), 42)
+        self.assertEqual(compute.call_count, 1)
+
+    def test_invalidate_moves_to_a_new_version(self):
+        self.namespace.set('key', 'old')
+        version = self.namespace.version()
+        self.namespace.invalidate()
+        self.assertNotEqual(self.namespace.version(), version)
+        self.assertIsNone(self.namespace.get('key'))
+        self.assertEqual(self.namespace.get_or_compute('key', lambda: 'new'), 'new')
+
+    def test_invalidate_without_a_version(self):
+        caches['default'].delete(self.namespace._version_key)
+        self.namespace.invalidate()
+        self.assertIsNotNone(caches['default'].get(self.namespace._version_key))
+
+    def test_xfetch_recomputes_close_to_expiry(self):
+        self.namespace.set('key', 'old', timeout=10, compute_seconds=1.0)
+        # -log(1e-9) * 1s of compute time reaches past the 10s expiry
+        with mock.patch('core.cache.random.random', return_value=1e-9):
+            self.assertEqual(self.namespace.get_or_compute('key', lambda: 'new'), 'new')
+        self.assertEqual(self.namespace.get('key'), 'new')
+
+    def test_xfetch_keeps_the_value_far_from_expiry(self):
+        self.namespace.set('key', 'old', timeout=10, compute_seconds=1.0)
+        with mock.patch('core.cache.random.random', return_value=0.99):
+            self.assertEqual(self.namespace.get_or_compute('key', lambda: 'new'), 'old')
+
+    def test_xfetch_only_the_lock_holder_recomputes(self):
+        self.namespace.set('key', 'old', timeout=10, compute_seconds=1.0)
+        caches['default'].add(f'{self.namespace.key("key")}:lock', 1, 30)
+        with mock.patch('core.cache.random.random', return_value=1e-9):
+            self.assertEqual(self.namespace.get_or_compute('key', lambda: 'new'), 'old')
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.namespace.get_or_compute('key', compute)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 8)
+
+    def test_waiter_takes_over_when_the_holder_fails(self):
+        holder_started = threading.Event()
+
+        def failing():
+            holder_started.set()
+            time.sleep(0.1)
+            raise RuntimeError('backend down')
+
+        def holder():
+            with self.assertRaises(RuntimeError):
+                self.namespace.get_or_compute('key', failing)
+
+        thread = threading.Thread(target=holder)
+        thread.start()
+        holder_started.wait()
+        start = time.monotonic()
+        self.assertEqual(self.namespace.get_or_compute('key', lambda: 'value'), 'value')
+        thread.join()
+        self.assertLess(time.monotonic() - start, 1)
+
+
+class TraceparentTests(SimpleTestCase):
+    def test_sampled(self):
+        self.assertEqual(parse_traceparent(f'00-{TRACE_ID}-{PARENT_ID}-01'), (TRACE_ID, PARENT_ID, True))
+
+    def test_not_sampled(self):
+        self.assertEqual(parse_traceparent(f'00-{TRACE_ID}-{PARENT_ID}-00'), (TRACE_ID, PARENT_ID, False))
+
+    def test_future_version_may_have_more_fields(self):
+        self.assertEqual(parse_traceparent(f'01-{TRACE_ID}-{PARENT_ID}-03-extra'), (TRACE_ID, PARENT_ID, True))
+
+    def test_malformed(self):
+        for header in (
+            None, '', 'garbage',
+            f'00-{TRACE_ID}-{PARENT_ID}',
+            f'00-{TRACE_ID}-{PARENT_ID}-01-extra',
+            f'ff-{TRACE_ID}-{PARENT_ID}-01',
+            f'00-{TRACE_ID.upper()}-{PARENT_ID}-01',
+            f'00-{"0" * 32}-{PARENT_ID}-01',
+            f'00-{TRACE_ID}-{"0" * 16}-01',
+            f'00-{TRACE_ID}-{PARENT_ID}-zz',
+            f'00-{TRACE_ID[:-1]}x-{PARENT_ID}-01',
+        ):
+            with self.subTest(header=header):
+                self.assertEqual(parse_traceparent(header), (None, None, None))
+
+
+@override_settings(TRACING_EXPORTER='file', TRACING_SAMPLE_RATE=0.0)
+@mock.patch('core.tracing.get_exporter', return_value=None)
+class TracingMiddlewareTests(SimpleTestCase):
+    def _trace_id(self, **headers):
+        middleware = TracingMiddleware(lambda request: HttpResponse('ok'))
+        return middleware(RequestFactory().get('/api/chat/', **headers)).get('X-Trace-Id')
+
+    def test_sampled_traceparent_joins_the_trace(self, get_exporter):
+        self.assertEqual(self._trace_id(HTTP_TRACEPARENT=f'00-{TRACE_ID}-{PARENT_ID}-01'), TRACE_ID)
+
+    def test_unsampled_traceparent_is_not_traced(self, get_exporter):
+        self.assertIsNone(self._trace_id(HTTP_TRACEPARENT=f'00-{TRACE_ID}-{PARENT_ID}-00'))
+
+    def test_invalid_traceparent_uses_the_sample_rate(self, get_exporter):
+        self.assertIsNone(self._trace_id(HTTP_TRACEPARENT='garbage'))
+        with override_settings(TRACING_SAMPLE_RATE=1.0):
+            trace_id = self._trace_id(HTTP_TRACEPARENT='garbage')
+        self.assertIsNotNone(trace_id)
+        self.assertNotEqual(trace_id, TRACE_ID)
+
+
+@override_settings(METRICS_TOKEN='secret', METRICS_PUBLIC=False)
+class MetricsViewTests(SimpleTestCase):
+    def _status(self, user=None, **headers):
+        request = RequestFactory().get('/metrics', **headers)
+        request.user = user or AnonymousUser()
+        return metrics(request).status_code
+
+    def test_anonymous_requests_are_refused(self):
+        self.assertEqual(self._status(), 401)
+        self.assertEqual(self._status(HTTP_AUTHORIZATION='Bearer wrong'), 401)
+        with override_settings(METRICS_TOKEN=None):
+            self.assertEqual(self._status(), 401)
+            self.assertEqual(self._status(HTTP_AUTHORIZATION='Bearer None'), 401)
+
+    def test_token_or_staff_session(self):
+        self.assertEqual(self._status(HTTP_AUTHORIZATION='Bearer secret'), 200)
+        self.assertEqual(self._status(User(username='admin', is_staff=True)), 200)
+        self.assertEqual(self._status(User(username='student')), 401)
+
+    def test_public(self):
+        with override_settings(METRICS_PUBLIC=True):
+            self.assertEqual(self._status(), 200)
+
+
+class CachedJWTUserTests(TestCase):
+    def setUp(self):
+        AUTH_CACHE.invalidate()
+        self.user = User.objects.create_user('ada', password='secret-password', is_staff=True)
+        self.token = AccessToken.for_user(self.user)
+
+    def _authenticate(self):
+        return JWTAuthentication().get_user(self.token)
+
+    def test_password_hash_is_not_cached(self):
+        self._authenticate()
+        cached = AUTH_CACHE.get(self.user.id)
+        self.assertNotIn(self.user.password, repr(cached))
+        self.assertEqual(cached['user'], {
+            'id': self.user.id, 'username': 'ada', 'is_active': True, 'is_staff': True, 'is_superuser': False,
+        })
+
+    def test_cached_user_and_profile_need_no_query(self):
+        profile = StudentProfile.objects.create(
+            user=self.user, name='Ada Lovelace', email='ada@jabu.edu.ng',
+            program='Computer Science', year_of_study=2, student_id='JABU/002',
+        )
+        self._authenticate()
+        with self.assertNumQueries(0):
+            user = self._authenticate()
+            self.assertEqual((user.pk, user.is_staff), (self.user.pk, True))
+            self.assertEqual((user.student_profile.pk, user.student_profile.program), (profile.pk, 'Computer Science'))
+        # Other fields are deferred: read with a query, never overwritten on save
+        self.assertTrue(user.check_password('secret-password'))
+        user.save()
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('secret-password'))
+
+    def test_missing_profile_is_remembered(self):
+        self._authenticate()
+        with self.assertNumQueries(0), self.assertRaises(StudentProfile.DoesNotExist):
+            self._authenticate().student_profile
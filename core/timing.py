@@ -0,0 +1,233 @@
+"""
+Per-request stage timing
+
+StageTimingMiddleware starts a RequestTimer for every request. Code on the
+request path marks interesting sections with the ``stage`` context manager:
+
+    with stage('kb_search'):
+        knowledge = self._search_knowledge_base(message)
+
+Each stage records its wall-clock duration and the number of database
+queries it ran (on any connection; the request totals are also kept per
+database alias), and is a span in the request's trace (see core.tracing). At the end of the request the stages are sent as a
+Server-Timing header, written as one structured log line, and folded into
+in-memory latency histograms per view and per stage (see timing_snapshot).
+Outside a request ``stage`` does nothing.
+"""
+import bisect
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from core.metrics import DB_QUERY_LATENCY
+from core.tracing import current_span, record_span, span
+
+_current_timer = ContextVar('request_timer', default=None)
+
+# Histogram bucket upper bounds in milliseconds (the last bucket is +Inf)
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class RequestTimer:
+    """
+    Stage durations and database query counts for one request
+    """
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.stages = {}
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.databases = {}
+
+    def record(self, name, seconds, queries=0):
+        """Add a stage run; repeated stages are summed"""
+        entry = self.stages.setdefault(name, {'seconds': 0.0, 'queries': 0, 'calls': 0})
+        entry['seconds'] += seconds
+        entry['queries'] += queries
+        entry['calls'] += 1
+
+    def record_query(self, seconds, alias='default'):
+        self.queries += 1
+        self.db_seconds += seconds
+        entry = self.databases.setdefault(alias, {'seconds': 0.0, 'queries': 0})
+        entry['seconds'] += seconds
+        entry['queries'] += 1
+
+    def elapsed(self):
+        return time.perf_counter() - self.started_at
+
+
+def current_timer():
+    """The RequestTimer of the request being handled, or None"""
+    return _current_timer.get()
+
+def start_timer():
+    """
+    Start timing a request on the current thread or task
+
+    Returns:
+        tuple: (RequestTimer, token to pass to stop_timer)
+    """
+    timer = RequestTimer()
+    return timer, _current_timer.set(timer)
+
+def stop_timer(token):
+    _current_timer.reset(token)
+
+@contextmanager
+def stage(name):
+    """
+    Time a named section of the current request
+
+    Args:
+        name (str): Stage name, e.g. "llm" or "kb_search"
+    """
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+
+    queries = timer.queries
+    start = time.perf_counter()
+    try:
+        with span(name):
+            yield
+    finally:
+        timer.record(name, time.perf_counter() - start, timer.queries - queries)
+
+def count_queries(execute, sql, params, many, context):
+    """Database execute wrapper charging each query to the current request"""
+    timer = _current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+
+    traced = current_span() is not None
+    start_ns = time.time_ns() if traced else 0
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        seconds = time.perf_counter() - start
+        timer.record_query(seconds, context['connection'].alias)
+        DB_QUERY_LATENCY.observe(seconds)
+        if traced:
+            statement = str(sql)
+            record_span('db.query', start_ns, time.time_ns(), {
+                'db.system': 'postgresql',
+                'db.operation': statement.split(None, 1)[0].upper() if statement.strip() else '',
+                'db.statement': statement[:1000],
+            })
+
+def _metric_name(name):
+    # Server-Timing names are HTTP tokens
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', name)
+
+def server_timing_header(timer, total_seconds):
+    """
+    Format a timer as a Server-Timing header value
+
+    Args:
+        timer (RequestTimer): Finished request timer
+        total_seconds (float): Total request duration
+
+    Database time is reported per connection: "db" for the default
+    database and "db.<alias>" for the others (e.g. db.replica).
+
+    Returns:
+        str: e.g. 'llm;dur=812.4, db;dur=3.2;desc="4 queries", total;dur=830.1'
+    """
+    metrics = [
+        f'{_metric_name(name)};dur={entry["seconds"] * 1000:.1f}'
+        for name, entry in timer.stages.items()
+    ]
+    databases = timer.databases or {'default': {'seconds': 0.0, 'queries': 0}}
+    for alias, entry in databases.items():
+        name = 'db' if alias == 'default' else f'db.{_metric_name(alias)}'
+        metrics.append(f'{name};dur={entry["seconds"] * 1000:.1f};desc="{entry["queries"]} queries"')
+    metrics.append(f'total;dur={total_seconds * 1000:.1f}')
+    return ', '.join(metrics)
+
+
+class LatencyHistogram:
+    """
+    Cumulative latency histogram with fixed millisecond buckets
+    """
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+
+    def observe(self, ms):
+        self.buckets[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.sum_ms += ms
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket it falls in"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= rank:
+                return BUCKETS_MS[index] if index < len(BUCKETS_MS) else None
+        return None
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'avg_ms': round(self.sum_ms / self.count, 2) if self.count else None,
+            'p50_ms': self.quantile(0.5),
+            'p95_ms': self.quantile(0.95),
+            'p99_ms': self.quantile(0.99),
+            'buckets': {
+                (str(bound) if index < len(BUCKETS_MS) else '+Inf'): count
+                for index, (bound, count) in enumerate(zip(BUCKETS_MS + (None,), self.buckets))
+            },
+        }
+
+
+class TimingRegistry:
+    """
+    Process-wide latency histograms keyed by view and stage
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, view, timer, total_seconds):
+        with self._lock:
+            self._observe(view, 'total', total_seconds)
+            self._observe(view, 'db', timer.db_seconds)
+            for name, entry in timer.stages.items():
+                self._observe(view, name, entry['seconds'])
+
+    def _observe(self, view, stage_name, seconds):
+        histogram = self._histograms.get((view, stage_name))
+        if histogram is None:
+            histogram = self._histograms[(view, stage_name)] = LatencyHistogram()
+        histogram.observe(seconds * 1000)
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: view -> stage -> histogram summary
+        """
+        with self._lock:
+            views = {}
+            for (view, stage_name), histogram in sorted(self._histograms.items()):
+                views.setdefault(view, {})[stage_name] = histogram.as_dict()
+            return views
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+registry = TimingRegistry()
+
+def timing_snapshot():
+    """Latency histograms for this process, per view and stage"""
+    return registry.snapshot()
@@ -0,0 +1,388 @@
+"""
+Lightweight in-process tracing
+
+TracingMiddleware starts a trace for each request, with a root span for
+the request. Every core.timing.stage (auth, profile, kb_search, llm, save)
+becomes a child span automatically, and each database query becomes a
+"db.query" span. Finer sections use the ``span`` context manager:
+
+    with span('llm.groq_sdk', {'gen_ai.request.model': self.model}) as s:
+        ...
+        set_span_attributes({'gen_ai.usage.output_tokens': 120})
+
+Finished traces are handed to a background thread and exported in the
+OpenTelemetry OTLP/JSON format: appended to TRACING_FILE (one
+ExportTraceServiceRequest per line, the layout of the OTel Collector's file
+exporter) or POSTed to an OTLP/HTTP collector at TRACING_OTLP_ENDPOINT.
+Outside a trace every helper here does nothing.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_current_span = ContextVar('current_span', default=None)
+
+# OTLP enum values
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_UNSET = 0
+STATUS_ERROR = 2
+
+MAX_SPANS_PER_TRACE = 1000
+
+
+class Trace:
+    """Spans of one trace, exported together when the root span ends"""
+    def __init__(self, trace_id=None):
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.spans = []
+        self.root = None
+        self.dropped = 0
+
+
+class Span:
+    """
+    One timed operation within a trace
+
+    Attributes are plain str, bool, int or float values keyed by
+    OpenTelemetry-style dotted names.
+    """
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'kind', 'attributes', 'events',
+                 'start_ns', 'end_ns', 'status_code', 'status_message')
+
+    def __init__(self, trace, name, parent_id=None, kind=SPAN_KIND_INTERNAL, attributes=None, start_ns=None):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.events = []
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.status_code = STATUS_UNSET
+        self.status_message = ''
+
+    @property
+    def trace_id(self):
+        return self.trace.trace_id
+
+    def set_attributes(self, attributes):
+        self.attributes.update(attributes)
+
+    def record_exception(self, exc):
+        self.status_code = STATUS_ERROR
+        self.status_message = str(exc)[:500]
+        self.events.append({
+            'name': 'exception',
+            'time_ns': time.time_ns(),
+            'attributes': {'exception.type': type(exc).__name__, 'exception.message': str(exc)[:500]},
+        })
+
+    def end(self, end_ns=None):
+        self.end_ns = end_ns or time.time_ns()
+        if len(self.trace.spans) < MAX_SPANS_PER_TRACE:
+            self.trace.spans.append(self)
+        else:
+            self.trace.dropped += 1
+
+
+def current_span():
+    """The innermost open span, or None outside a trace"""
+    return _current_span.get()
+
+def set_span_attributes(attributes):
+    """Add attributes to the innermost open span, if any"""
+    current = _current_span.get()
+    if current is not None:
+        current.set_attributes(attributes)
+
+def set_trace_attributes(attributes):
+    """Add attributes to the root span of the current trace, if any"""
+    current = _current_span.get()
+    if current is not None and current.trace.root is not None:
+        current.trace.root.set_attributes(attributes)
+
+@contextmanager
+def span(name, attributes=None, kind=SPAN_KIND_INTERNAL):
+    """
+    Time a child span of the current span
+
+    Exceptions are recorded on the span and re-raised.
+
+    Yields:
+        Span: The new span, or None outside a trace
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    child = Span(parent.trace, name, parent.span_id, kind, attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.record_exception(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        child.end()
+
+def record_span(name, start_ns, end_ns, attributes=None, kind=SPAN_KIND_CLIENT):
+    """Add an already finished child span (e.g. a database query) to the current span"""
+    parent = _current_span.get()
+    if parent is not None:
+        Span(parent.trace, name, parent.span_id, kind, attributes, start_ns).end(end_ns)
+
+
+def parse_traceparent(header):
+    """
+    Read a W3C traceparent header ("00-<trace id>-<parent id>-<flags>")
+
+    Returns:
+        tuple: (trace_id, parent_span_id, sampled), or (None, None, None) if
+               absent or malformed; sampled is the caller's sampled flag
+    """
+    parts = (header or '').strip().split('-')
+    if len(parts) < 4 or len(parts[0]) != 2 or parts[0] == 'ff' or (parts[0] == '00' and len(parts) != 4):
+        return None, None, None
+    version, trace_id, parent_id, flags = parts[:4]
+    if len(trace_id) != 32 or len(parent_id) != 16 or len(flags) != 2:
+        return None, None, None
+    try:
+        int(version, 16)
+        valid = int(trace_id, 16) != 0 and int(parent_id, 16) != 0
+        sampled = bool(int(flags, 16) & 0x01)
+    except ValueError:
+        return None, None, None
+    if not valid or trace_id != trace_id.lower() or parent_id != parent_id.lower():
+        return None, None, None
+    return trace_id, parent_id, sampled
+
+def start_trace(name, attributes=None, traceparent=None):
+    """
+    Start a trace with a server root span on the current thread or task
+
+    Returns:
+        tuple: (root Span, token to pass to end_trace)
+    """
+    trace_id, parent_id, _ = parse_traceparent(traceparent)
+    trace = Trace(trace_id)
+    root = Span(trace, name, parent_id, SPAN_KIND_SERVER, attributes)
+    trace.root = root
+    return root, _current_span.set(root)
+
+def end_trace(root, token):
+    """End the root span and queue the trace for export"""
+    _current_span.reset(token)
+    root.end()
+    exporter = get_exporter()
+    if exporter is not None:
+        exporter.submit(root.trace)
+
+def should_sample():
+    rate = getattr(settings, 'TRACING_SAMPLE_RATE', 1.0)
+    return rate >= 1.0 or random.random() < rate
+
+
+def _attribute_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        # int64 is a string in proto3 JSON
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+def _attributes(attributes):
+    return [{'key': key, 'value': _attribute_value(value)} for key, value in attributes.items() if value is not None]
+
+def to_otlp(traces, service_name):
+    """
+    Encode finished traces as an OTLP/JSON ExportTraceServiceRequest
+
+    Returns:
+        dict: {"resourceSpans": [...]}
+    """
+    spans = []
+    for trace in traces:
+        for item in trace.spans:
+            encoded = {
+                'traceId': item.trace_id,
+                'spanId': item.span_id,
+                'name': item.name,
+                'kind': item.kind,
+                'startTimeUnixNano': str(item.start_ns),
+                'endTimeUnixNano': str(item.end_ns),
+                'attributes': _attributes(item.attributes),
+                'status': {'code': item.status_code},
+            }
+            if item.parent_id:
+                encoded['parentSpanId'] = item.parent_id
+            if item.status_message:
+                encoded['status']['message'] = item.status_message
+            if item.events:
+                encoded['events'] = [
+                    {'name': event['name'], 'timeUnixNano': str(event['time_ns']), 'attributes': _attributes(event['attributes'])}
+                    for event in item.events
+                ]
+            spans.append(encoded)
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': _attributes({'service.name': service_name, 'process.pid': os.getpid()})},
+            'scopeSpans': [{'scope': {'name': 'core.tracing'}, 'spans': spans}],
+        }]
+    }
+
+
+class FileSpanExporter:
+    """Append each batch as one OTLP/JSON line to a file"""
+    def __init__(self, path):
+        self.path = path
+
+    def export(self, payload):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(payload, separators=(',', ':')) + '\n')
+
+
+class OTLPHttpSpanExporter:
+    """POST each batch to an OTLP/HTTP collector (e.g. http://localhost:4318/v1/traces)"""
+    def __init__(self, endpoint, timeout=5.0):
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    def export(self, payload):
+        import httpx
+        httpx.post(self.endpoint, json=payload, timeout=self.timeout).raise_for_status()
+
+
+class BatchSpanProcessor:
+    """
+    Export finished traces from a background thread
+
+    Request threads only enqueue; traces are dropped when the queue is full
+    so a slow collector never slows requests down.
+    """
+    def __init__(self, exporter, service_name, max_queue=2048, max_batch=64, interval=1.0):
+        self.exporter = exporter
+        self.service_name = service_name
+        self.max_batch = max_batch
+        self.interval = interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def submit(self, trace):
+        try:
+            self.queue.put_nowait(trace)
+        except queue.Full:
+            pass
+
+    def _run(self):
+        while True:
+            try:
+                first = self.queue.get(timeout=self.interval)
+            except queue.Empty:
+                continue
+            if first is None:
+                return
+            batch = [first]
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._export(batch)
+            if stop:
+                return
+
+    def _export(self, traces):
+        try:
+            self.exporter.export(to_otlp(traces, self.service_name))
+        except Exception as e:
+            logger.warning(f"Failed to export {len(traces)} traces: {str(e)}")
+
+    def shutdown(self):
+        """Export what is queued and stop the thread"""
+        if self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join(timeout=5)
+
+
+def _attribute_python(value):
+    if 'intValue' in value:
+        return int(value['intValue'])
+    return next(iter(value.values()), None)
+
+def read_traces(path):
+    """
+    Load traces written by FileSpanExporter
+
+    Returns:
+        dict: trace ID -> list of spans as dicts with name, span_id,
+              parent_id, start_ns, end_ns, duration_ms, status and attributes
+    """
+    traces = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            for resource in json.loads(line).get('resourceSpans', []):
+                for scope in resource.get('scopeSpans', []):
+                    for item in scope.get('spans', []):
+                        start_ns, end_ns = int(item['startTimeUnixNano']), int(item['endTimeUnixNano'])
+                        traces.setdefault(item['traceId'], []).append({
+                            'name': item['name'],
+                            'span_id': item['spanId'],
+                            'parent_id': item.get('parentSpanId'),
+                            'start_ns': start_ns,
+                            'end_ns': end_ns,
+                            'duration_ms': (end_ns - start_ns) / 1e6,
+                            'status': item.get('status', {}).get('code', STATUS_UNSET),
+                            'attributes': {a['key']: _attribute_python(a['value']) for a in item.get('attributes', [])},
+                        })
+    return traces
+
+_processor = None
+_processor_lock = threading.Lock()
+
+def get_exporter():
+    """
+    The process-wide BatchSpanProcessor for TRACING_EXPORTER, created on first use
+
+    Returns:
+        BatchSpanProcessor: or None when tracing is disabled
+    """
+    global _processor
+    if _processor is None:
+        kind = getattr(settings, 'TRACING_EXPORTER', '')
+        if not kind:
+            return None
+        with _processor_lock:
+            if _processor is None:
+                if kind == 'otlp':
+                    exporter = OTLPHttpSpanExporter(settings.TRACING_OTLP_ENDPOINT)
+                else:
+                    exporter = FileSpanExporter(settings.TRACING_FILE)
+                _processor = BatchSpanProcessor(exporter, getattr(settings, 'TRACING_SERVICE_NAME', 'academic-chatbot'))
+    return _processor
@@ -1,3 +1,71 @@
+from django.conf import settings
+from django.http import HttpResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+from prometheus_client import CONTENT_TYPE_LATEST
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from .timing import timing_snapshot
+from .metrics import render_metrics
+from .profiling import PROFILE_HEADER, PROFILE_MODES, make_profile_token
 
 # Create your views here.
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def request_timings(request):
+    """
+    Admin-only endpoint returning latency histograms per view and stage
+    
+    Histograms are kept in memory by each server process since it started,
+    so the numbers describe the process that handled this request.
+    """
+    return Response({
+        'status': 'success',
+        'data': timing_snapshot()
+    }, status=200)
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint
+    
+    Plain Django view so scrapers don't need a JWT. Requests must send
+    "Authorization: Bearer <METRICS_TOKEN>" or come from a logged-in staff
+    session, unless METRICS_PUBLIC is True.
+    """
+    if not getattr(settings, 'METRICS_PUBLIC', False):
+        token = getattr(settings, 'METRICS_TOKEN', None)
+        has_token = bool(token) and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+        if not has_token and not request.user.is_staff:
+            return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE_LATEST)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def profiling_token(request):
+    """
+    Admin-only endpoint issuing a signed header that profiles requests
+    
+    Send the returned header with any request to have it profiled; the
+    profile is listed under Request profiles in the admin.
+    
+    GET Parameters:
+        - mode: "cprofile" (default) or "sample"
+    """
+    mode = request.query_params.get('mode', 'cprofile')
+    if mode not in PROFILE_MODES:
+        return Response({
+            'status': 'error',
+            'message': f'mode must be one of: {", ".join(PROFILE_MODES)}'
+        }, status=400)
+    
+    return Response({
+        'status': 'success',
+        'data': {
+            'header': PROFILE_HEADER,
+            'token': make_profile_token(request.user, mode),
+            'mode': mode,
+            'expires_in': settings.PROFILE_TOKEN_MAX_AGE,
+        }
+    }, status=200)
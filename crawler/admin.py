@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import KnowledgeBase
+from .models import KnowledgeBase, CrawlJob, CrawlJobResult, ProgramContext, RecrawlSchedule
 
 # Register your models here.
 @admin.register(KnowledgeBase)
@@ -8,3 +8,37 @@ class KnowledgeBaseAdmin(admin.ModelAdmin):
     list_filter = ('is_verified', 'last_updated')
     search_fields = ('title', 'content', 'tags')
     date_hierarchy = 'last_updated'
+
+
+@admin.register(ProgramContext)
+class ProgramContextAdmin(admin.ModelAdmin):
+    list_display = ('program', 'knowledge_base', 'score', 'updated_at')
+    list_filter = ('program',)
+    ordering = ('program', '-score')
+    list_select_related = ('knowledge_base',)
+    raw_id_fields = ('knowledge_base',)
+
+
+class CrawlJobResultInline(admin.TabularInline):
+    model = CrawlJobResult
+    fields = ('url', 'status', 'title', 'error', 'crawled_at')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+
+@admin.register(CrawlJob)
+class CrawlJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'total', 'success_count', 'failed_count', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'created_at')
+    readonly_fields = ('created_by', 'urls', 'delay', 'total', 'success_count', 'failed_count', 'error', 'created_at', 'started_at', 'finished_at', 'heartbeat_at', 'attempts')
+    list_select_related = ('created_by',)
+    inlines = [CrawlJobResultInline]
+
+
+@admin.register(RecrawlSchedule)
+class RecrawlScheduleAdmin(admin.ModelAdmin):
+    list_display = ('source_url', 'change_rate', 'fetch_count', 'change_count', 'last_fetched_at', 'last_changed_at', 'next_fetch_at')
+    search_fields = ('source_url',)
+    ordering = ('next_fetch_at',)
+    raw_id_fields = ('knowledge_base',)
@@ -0,0 +1,195 @@
+"""
+Append-only archive of raw crawl responses for offline re-parsing and replay
+
+Responses are written as WARC/1.1 "response" records, each compressed as its
+own gzip member (the usual .warc.gz layout), so a single record can be read
+by seeking to its offset. A JSON-lines sidecar index (``<archive>.idx``)
+maps every URL to the offset and length of its records.
+
+Several processes (web workers running crawl jobs, the recrawl scheduler,
+crawl_urls) may append to the same archive. Each record and its index line
+are written under an exclusive lock on ``<archive>.lock``, so offsets never
+point into another process's record.
+"""
+import gzip
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime, timezone
+import httpx
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Headers describing the transfer rather than the body. httpx has already
+# decoded the body, so these are dropped to keep replayed responses readable.
+_TRANSFER_HEADERS = {'content-encoding', 'transfer-encoding', 'content-length'}
+
+
+class ResponseArchive:
+    """
+    WARC-style response archive with a URL index
+    """
+    def __init__(self, path):
+        self.path = str(path)
+        self.index_path = self.path + '.idx'
+        self.lock_path = self.path + '.lock'
+        self._lock = threading.Lock()
+
+    def write_response(self, url, response):
+        """
+        Append an httpx response to the archive
+
+        Args:
+            url (str): URL that was requested
+            response (httpx.Response): Response to archive (body already read)
+        """
+        status_line = f"HTTP/1.1 {response.status_code} {response.reason_phrase}\r\n".encode('iso-8859-1', 'replace')
+        # Raw header bytes, so values that aren't Latin-1 are kept as sent
+        header_lines = b''.join(
+            name + b': ' + value + b'\r\n'
+            for name, value in response.headers.raw
+            if name.lower().decode('ascii', 'replace') not in _TRANSFER_HEADERS
+        )
+        body = response.content
+        http_block = status_line + header_lines + f"Content-Length: {len(body)}\r\n\r\n".encode('ascii') + body
+
+        fetched_at = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        warc_headers = (
+            "WARC/1.1\r\n"
+            "WARC-Type: response\r\n"
+            f"WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>\r\n"
+            f"WARC-Date: {fetched_at}\r\n"
+            f"WARC-Target-URI: {url}\r\n"
+            "Content-Type: application/http;msgtype=response\r\n"
+            f"Content-Length: {len(http_block)}\r\n\r\n"
+        ).encode('utf-8')
+        record = gzip.compress(warc_headers + http_block + b"\r\n\r\n")
+
+        # The thread lock orders writers in this process, the file lock
+        # writers in other processes (without fcntl only the former)
+        with self._lock, open(self.lock_path, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                with open(self.path, 'ab') as archive_file:
+                    offset = os.fstat(archive_file.fileno()).st_size
+                    archive_file.write(record)
+                with open(self.index_path, 'a', encoding='utf-8') as index_file:
+                    index_file.write(json.dumps({
+                        'url': url,
+                        'offset': offset,
+                        'length': len(record),
+                        'status': response.status_code,
+                        'date': fetched_at,
+                    }) + '\n')
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def safe_write_response(self, url, response):
+        """
+        write_response for crawlers: an archive failure is logged instead of
+        failing the crawl of the page
+
+        Returns:
+            bool: Whether the response was archived
+        """
+        try:
+            self.write_response(url, response)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to archive {url}: {str(e)}")
+            return False
+
+    def load_index(self, latest_only=True):
+        """
+        Read the URL index
+
+        Args:
+            latest_only (bool): Keep only the newest record per URL
+
+        Returns:
+            list: Index entries in archive order
+        """
+        if not os.path.exists(self.index_path):
+            return []
+
+        with open(self.index_path, encoding='utf-8') as index_file:
+            entries = [json.loads(line) for line in index_file if line.strip()]
+
+        if latest_only:
+            entries = list({entry['url']: entry for entry in entries}.values())
+            entries.sort(key=lambda entry: entry['offset'])
+        return entries
+
+    def read_record(self, entry):
+        """
+        Rebuild the archived response for an index entry
+
+        Args:
+            entry (dict): Index entry from load_index
+
+        Returns:
+            httpx.Response: Response with the original status, headers and body
+        """
+        with open(self.path, 'rb') as archive_file:
+            archive_file.seek(entry['offset'])
+            record = gzip.decompress(archive_file.read(entry['length']))
+
+        _warc_headers, _, payload = record.partition(b"\r\n\r\n")
+        http_head, _, body = payload.partition(b"\r\n\r\n")
+        body = body[:-4] if body.endswith(b"\r\n\r\n") else body
+
+        lines = http_head.split(b"\r\n")
+        status_code = int(lines[0].split(b' ')[1])
+        # Kept as bytes: header values may not be ASCII
+        headers = [tuple(line.split(b': ', 1)) for line in lines[1:] if b': ' in line]
+
+        return httpx.Response(
+            status_code,
+            headers=headers,
+            content=body,
+            request=httpx.Request('GET', entry['url'])
+        )
+
+    def iter_responses(self, urls=None):
+        """
+        Iterate over archived responses, newest record per URL
+
+        Args:
+            urls (iterable): Restrict to these URLs (optional)
+
+        Yields:
+            tuple: (url, httpx.Response)
+        """
+        wanted = set(urls) if urls else None
+        for entry in self.load_index():
+            if wanted is None or entry['url'] in wanted:
+                yield entry['url'], self.read_record(entry)
+
+
+_default_archive = None
+
+def get_default_archive():
+    """
+    Get the archive configured by settings.CRAWLER_ARCHIVE_PATH
+
+    Returns:
+        ResponseArchive: The shared archive, or None if archiving is disabled
+    """
+    global _default_archive
+    from django.conf import settings
+
+    path = getattr(settings, 'CRAWLER_ARCHIVE_PATH', None)
+    if not path:
+        return None
+    if _default_archive is None or _default_archive.path != str(path):
+        _default_archive = ResponseArchive(path)
+    return _default_archive
@@ -3,13 +3,12 @@ Batch crawler that can process multiple URLs
 """
 import os
 import django
-import time
 from crawler.config import URLS_TO_SCRAPE, CRAWL_DELAY
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'academic_chatbot.settings')
 django.setup()
 
-from crawler.utils import crawl_and_store
+from crawler.utils import crawl_in_batches
 from crawler.models import KnowledgeBase
 
 def crawl_all_urls():
@@ -24,29 +23,18 @@ def crawl_all_urls():
     
     print(f"Starting batch crawl of {len(URLS_TO_SCRAPE)} URLs...")
     
-    for i, url in enumerate(URLS_TO_SCRAPE, 1):
-        print(f"[{i}/{len(URLS_TO_SCRAPE)}] Crawling {url}...")
-        
-        try:
-            result = crawl_and_store(url, KnowledgeBase)
-            
-            if result:
-                print(f"✅ Success: {url}")
-                print(f"  - Title: {result.title}")
-                print(f"  - Tags: {result.tags}")
-                print(f"  - Content length: {len(result.content)} characters")
-                success_count += 1
-            else:
-                print(f"❌ Failed: {url}")
-                failed_urls.append(url)
-                
-        except Exception as e:
-            print(f"❌ Error crawling {url}: {str(e)}")
+    # Pages are stored in batches, so results are printed as each batch lands
+    results = crawl_in_batches(URLS_TO_SCRAPE, KnowledgeBase, delay=CRAWL_DELAY)
+    for i, (url, result, error) in enumerate(results, 1):
+        if result:
+            print(f"[{i}/{len(URLS_TO_SCRAPE)}] ✅ Success: {url}")
+            print(f"  - Title: {result.title}")
+            print(f"  - Tags: {result.tags}")
+            print(f"  - Content length: {len(result.content)} characters")
+            success_count += 1
+        else:
+            print(f"[{i}/{len(URLS_TO_SCRAPE)}] ❌ Failed: {url} ({error})")
             failed_urls.append(url)
-        
-        # Add delay between requests
-        if i < len(URLS_TO_SCRAPE):
-            time.sleep(CRAWL_DELAY)
     
     stats = {
         "total": len(URLS_TO_SCRAPE),
@@ -0,0 +1,274 @@
+"""
+Offline knowledge base search benchmark
+
+Builds a synthetic, JABU-like KnowledgeBase corpus and runs every search
+engine in SEARCH_ENGINES over a fixed query set. Each query has a few
+"needle" entries that answer it. The rest of the corpus is distractors
+that share some of its words (the same topic for another programme, or
+another topic for the same programme) plus general university news.
+
+For each corpus size and engine it reports latency percentiles, rows
+scanned (from EXPLAIN ANALYZE of the queries the engine ran) and
+recall@k against the needles. Run it through
+``manage.py benchmark_search``, which works in a throwaway test database.
+"""
+import random
+import statistics
+import time
+from asgiref.sync import async_to_sync
+from django.db import connection
+from crawler.models import KnowledgeBase
+from crawler.programs import rebuild_program_contexts
+
+PROGRAMS = [
+    'Computer Science', 'Nursing Science', 'Law', 'Accounting', 'Microbiology',
+    'Mass Communication', 'Civil Engineering', 'Economics', 'Biochemistry',
+    'Political Science', 'Medicine and Surgery', 'Architecture',
+]
+
+TOPICS = [
+    'admission requirements', 'school fees', 'hostel accommodation', 'course registration',
+    'examination timetable', 'scholarship application', 'transcript request',
+    'post-UTME screening', 'industrial training', 'final year project',
+]
+
+FILLER_SENTENCES = [
+    'The university senate approved the calendar for the coming session.',
+    'Students are advised to check the portal regularly for updates.',
+    'The faculty board meets at the beginning of every semester.',
+    'Enquiries should be directed to the office of the registrar.',
+    'Orientation for new students holds in the main auditorium.',
+    'The library extends its opening hours during examinations.',
+    'Departmental clearance must be completed before graduation.',
+    'Chapel services hold every Sunday and Wednesday on campus.',
+    'The health centre provides care for students and staff.',
+    'Staff and students are reminded to observe the dress code.',
+]
+
+NEWS_TITLES = [
+    'Convocation ceremony', 'Inaugural lecture', 'Sports festival', 'Alumni homecoming',
+    'Research grant award', 'Entrepreneurship week', 'Matriculation ceremony', 'Career fair',
+]
+
+NEEDLES_PER_QUERY = 3
+NEEDLE_URL = 'https://bench.jabu.edu.ng/answers/{query}/{index}'
+DISTRACTOR_URL = 'https://bench.jabu.edu.ng/pages/{index}'
+
+
+def build_queries(seed=42, count=20):
+    """
+    Build the fixed benchmark query set
+
+    Returns:
+        list: Dicts with "text", "program" and "topic"
+    """
+    rng = random.Random(seed)
+    pairs = [(program, topic) for program in PROGRAMS for topic in TOPICS]
+    rng.shuffle(pairs)
+    return [
+        {'text': f'What are the {topic} for {program}?', 'program': program, 'topic': topic}
+        for program, topic in pairs[:count]
+    ]
+
+def _paragraph(rng, sentences=4):
+    return ' '.join(rng.choice(FILLER_SENTENCES) for _ in range(sentences))
+
+def _entry(title, content, tags, url):
+    return KnowledgeBase(title=title[:255], content=content, tags=tags, source_url=url, is_verified=True)
+
+def _needles(queries, rng):
+    for query_index, query in enumerate(queries):
+        program, topic = query['program'], query['topic']
+        for index in range(NEEDLES_PER_QUERY):
+            content = (
+                f'{topic.capitalize()} for {program}. '
+                f'This page explains the {topic} that apply to {program} students. '
+                f'{_paragraph(rng, 3)} Contact the {program} department about {topic}.'
+            )
+            yield _entry(
+                f'{program} {topic.title()}' + (f' ({index + 1})' if index else ''),
+                content,
+                [program.lower(), topic.lower()],
+                NEEDLE_URL.format(query=query_index, index=index),
+            )
+
+def _distractor(index, rng, query_pairs):
+    kind = rng.random()
+    if kind < 0.6:
+        # Same vocabulary as a query but not its answer
+        while True:
+            program, topic = rng.choice(PROGRAMS), rng.choice(TOPICS)
+            if (program, topic) not in query_pairs:
+                break
+        title = f'{program} {topic.title()}'
+        content = f'Information on {topic} for {program}. {_paragraph(rng)}'
+        tags = [program.lower(), topic.lower()]
+    else:
+        title = f'{rng.choice(NEWS_TITLES)} {2015 + index % 10}'
+        content = _paragraph(rng, 6)
+        tags = ['news']
+    return _entry(title, content, tags, DISTRACTOR_URL.format(index=index))
+
+def load_corpus(size, queries, seed=42, batch_size=5000):
+    """
+    Grow the KnowledgeBase table to ``size`` entries
+
+    Needles are inserted on the first call; later calls only add
+    distractors, so one run can measure 1k, 10k and 100k in turn. The
+    program context sets of every benchmark programme are rebuilt each time.
+
+    Returns:
+        int: Entries in the table afterwards
+    """
+    existing = KnowledgeBase.objects.count()
+    rng = random.Random(seed + existing)
+    entries = []
+    if not existing:
+        entries.extend(_needles(queries, rng))
+
+    query_pairs = {(query['program'], query['topic']) for query in queries}
+    index = existing
+    while existing + len(entries) < size:
+        entries.append(_distractor(index, rng, query_pairs))
+        index += 1
+
+    for start in range(0, len(entries), batch_size):
+        KnowledgeBase.objects.bulk_create(entries[start:start + batch_size])
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'ANALYZE {KnowledgeBase._meta.db_table}')
+    # Program context sets for the program-aware engine
+    rebuild_program_contexts(PROGRAMS)
+    return KnowledgeBase.objects.count()
+
+
+def _chat_service_search(query, k):
+    from chat.services import ChatService
+    return ChatService()._search_knowledge_base(query['text'])
+
+def _chat_service_program_search(query, k):
+    # What a student enrolled in the query's programme gets from chat
+    from chat.services import ChatService
+    from users.models import StudentProfile
+    student = StudentProfile(program=query['program'], year_of_study=1)
+    return ChatService()._search_knowledge_base(query['text'], student)
+
+def _crawler_search(query, k):
+    from crawler.search import search_knowledge_base
+    return [entry for entry, score in async_to_sync(search_knowledge_base)(query['text'], limit=k)]
+
+# name -> callable(query, k) returning KnowledgeBase entries, best first;
+# query is a build_queries dict ("text", "program", "topic")
+SEARCH_ENGINES = {
+    'chat_service': _chat_service_search,
+    'chat_service_program': _chat_service_program_search,
+    'crawler_search': _crawler_search,
+}
+
+
+def _rows_scanned(plan):
+    """Rows read by the scan nodes of an EXPLAIN ANALYZE plan"""
+    rows = 0
+    if 'Scan' in plan['Node Type']:
+        rows += (
+            plan.get('Actual Rows', 0)
+            + plan.get('Rows Removed by Filter', 0)
+            + plan.get('Rows Removed by Index Recheck', 0)
+        ) * plan.get('Actual Loops', 1)
+    for child in plan.get('Plans', []):
+        rows += _rows_scanned(child)
+    return rows
+
+def explain_rows_scanned(engine, query, k):
+    """
+    Run a search once, then EXPLAIN ANALYZE every SELECT it issued
+
+    Returns:
+        tuple: (queries run, rows scanned)
+    """
+    statements = []
+
+    def capture(execute, sql, params, many, context):
+        statements.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(capture):
+        engine(query, k)
+
+    rows = 0
+    with connection.cursor() as cursor:
+        for sql, params in statements:
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            cursor.execute('EXPLAIN (ANALYZE, FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+            rows += _rows_scanned(plan[0]['Plan'])
+    return len(statements), rows
+
+def _percentile(samples, q):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))
+    return ordered[index]
+
+def run_engine(name, queries, k=3, repeat=3):
+    """
+    Benchmark one engine over the query set against the current corpus
+
+    Each query is run once to warm caches, then ``repeat`` timed times.
+
+    Returns:
+        dict: Latency percentiles (ms), average rows scanned and queries
+              per search, and mean recall@k
+    """
+    engine = SEARCH_ENGINES[name]
+    latencies = []
+    recalls = []
+    rows_scanned = []
+    db_queries = []
+
+    for query_index, query in enumerate(queries):
+        results = engine(query, k)
+        relevant = {NEEDLE_URL.format(query=query_index, index=index) for index in range(NEEDLES_PER_QUERY)}
+        found = {entry.source_url for entry in results[:k]}
+        recalls.append(len(found & relevant) / min(k, len(relevant)))
+
+        for _ in range(repeat):
+            start = time.perf_counter()
+            engine(query, k)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        statement_count, rows = explain_rows_scanned(engine, query, k)
+        db_queries.append(statement_count)
+        rows_scanned.append(rows)
+
+    return {
+        'engine': name,
+        'queries': len(queries),
+        'runs': len(latencies),
+        'mean_ms': round(statistics.mean(latencies), 2),
+        'p50_ms': round(_percentile(latencies, 0.50), 2),
+        'p95_ms': round(_percentile(latencies, 0.95), 2),
+        'p99_ms': round(_percentile(latencies, 0.99), 2),
+        'rows_scanned_avg': round(statistics.mean(rows_scanned)),
+        'db_queries_avg': round(statistics.mean(db_queries), 2),
+        f'recall_at_{k}': round(statistics.mean(recalls), 3),
+    }
+
+def compare_results(current, baseline):
+    """
+    Pair each result with the same corpus size and engine in a baseline run
+
+    Returns:
+        list: (size, engine, metric, baseline value, current value) for
+              p95 latency, rows scanned and recall
+    """
+    previous = {(result['corpus_size'], result['engine']): result for result in baseline['results']}
+    changes = []
+    for result in current['results']:
+        before = previous.get((result['corpus_size'], result['engine']))
+        if not before:
+            continue
+        for metric in ('p95_ms', 'rows_scanned_avg', f'recall_at_{current["k"]}'):
+            if metric in before:
+                changes.append((result['corpus_size'], result['engine'], metric, before[metric], result[metric]))
+    return changes
@@ -0,0 +1,174 @@
+"""
+Bulk export and import of the knowledge base with Postgres COPY
+
+The KnowledgeBase table is written as gzipped CSV with a header row (tags
+use the Postgres array literal format), so a new environment can be seeded
+in seconds instead of re-crawling every page or inserting rows one by one.
+"""
+import gzip
+import logging
+from django.db import connections, models, router, transaction
+from crawler.models import KnowledgeBase
+
+logger = logging.getLogger(__name__)
+
+TABLE = KnowledgeBase._meta.db_table
+STAGING_TABLE = f"{TABLE}_import"
+
+# Columns that identify or date a row rather than describe the page
+_KEEP_ON_MERGE = {'id', 'created_at'}
+
+
+def knowledge_base_columns():
+    """Database columns of KnowledgeBase, in model order"""
+    return [field.column for field in KnowledgeBase._meta.concrete_fields]
+
+def _quote(names):
+    return ', '.join(f'"{name}"' for name in names)
+
+def export_knowledge_base(path):
+    """
+    Write every KnowledgeBase entry to a gzipped CSV file
+
+    Reads from the replica when one is configured.
+
+    Args:
+        path (str): Output file (conventionally .csv.gz)
+
+    Returns:
+        int: Number of entries exported
+    """
+    columns = knowledge_base_columns()
+    connection = connections[router.db_for_read(KnowledgeBase)]
+
+    with gzip.open(path, 'wb') as output, connection.cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY (SELECT {_quote(columns)} FROM "{TABLE}" ORDER BY "id") '
+            f'TO STDOUT WITH (FORMAT csv, HEADER true)',
+            output
+        )
+        return cursor.rowcount
+
+def _read_header(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as source:
+        header = source.readline().strip()
+    columns = [column.strip('"') for column in header.split(',')] if header else []
+
+    unknown = set(columns) - set(knowledge_base_columns())
+    if unknown:
+        raise ValueError(f"Unknown columns in {path}: {', '.join(sorted(unknown))}")
+    missing = {'id', 'title', 'content'} - set(columns)
+    if missing:
+        raise ValueError(f"Missing required columns in {path}: {', '.join(sorted(missing))}")
+    return columns
+
+def _secondary_indexes(cursor):
+    """Plain (non-unique) indexes on the table as (name, definition)"""
+    cursor.execute(
+        "SELECT i.relname, pg_get_indexdef(i.oid) FROM pg_index x "
+        "JOIN pg_class i ON i.oid = x.indexrelid "
+        "WHERE x.indrelid = %s::regclass AND NOT x.indisunique",
+        [TABLE]
+    )
+    return cursor.fetchall()
+
+def import_knowledge_base(path, merge=False):
+    """
+    Load a file written by export_knowledge_base
+
+    Runs in one transaction: rows are COPYed into a temporary staging
+    table, secondary indexes are dropped, rows are inserted in one
+    statement, and the indexes are rebuilt once at the end.
+
+    By default the table is replaced and ids are kept. Crawl results and
+    recrawl schedules pointing at old entries are unlinked. With
+    ``merge=True`` existing entries are kept, and imported entries update
+    the entry with the same source_url or are added with new ids. When the
+    file repeats a source_url, only its last row is imported.
+
+    Args:
+        path (str): File written by export_knowledge_base
+        merge (bool): Upsert on source_url instead of replacing the table
+
+    Returns:
+        int: Number of entries inserted or updated
+
+    Raises:
+        ValueError: If the file's columns don't match the KnowledgeBase table
+    """
+    columns = _read_header(path)
+    alias = router.db_for_write(KnowledgeBase)
+    connection = connections[alias]
+
+    with transaction.atomic(using=alias), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE "{TABLE}" IN {"SHARE ROW" if merge else "ACCESS"} EXCLUSIVE MODE')
+
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE "{STAGING_TABLE}" (LIKE "{TABLE}" INCLUDING DEFAULTS) ON COMMIT DROP'
+        )
+        with gzip.open(path, 'rb') as source:
+            cursor.copy_expert(
+                f'COPY "{STAGING_TABLE}" ({_quote(columns)}) FROM STDIN WITH (FORMAT csv, HEADER true)',
+                source
+            )
+
+        # One statement can't insert or update the same source_url twice;
+        # like the crawler, keep the last row of each URL
+        duplicates = 0
+        if 'source_url' in columns:
+            cursor.execute(
+                f'DELETE FROM "{STAGING_TABLE}" WHERE "source_url" IS NOT NULL AND ctid NOT IN ('
+                f'SELECT DISTINCT ON ("source_url") ctid FROM "{STAGING_TABLE}" '
+                f'WHERE "source_url" IS NOT NULL ORDER BY "source_url", ctid DESC)'
+            )
+            duplicates = cursor.rowcount
+            if duplicates:
+                logger.warning(f"Skipped {duplicates} earlier rows with a repeated source_url in {path}")
+
+        indexes = _secondary_indexes(cursor)
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX "{name}"')
+
+        if merge:
+            insert_columns = [column for column in columns if column != 'id']
+            updates = ', '.join(
+                f'"{column}" = EXCLUDED."{column}"' for column in insert_columns if column not in _KEEP_ON_MERGE
+            )
+            cursor.execute(
+                f'INSERT INTO "{TABLE}" ({_quote(insert_columns)}) '
+                f'SELECT {_quote(insert_columns)} FROM "{STAGING_TABLE}" '
+                f'ON CONFLICT ("source_url") DO UPDATE SET {updates}'
+            )
+            imported = cursor.rowcount
+        else:
+            # Unlink rows that point at entries about to be deleted (SET_NULL)
+            # and drop the ones that can't exist without them (CASCADE)
+            for relation in KnowledgeBase._meta.related_objects:
+                related = relation.related_model._default_manager.using(alias).filter(
+                    **{f'{relation.field.name}__isnull': False}
+                )
+                if relation.on_delete is models.CASCADE:
+                    related.delete()
+                else:
+                    related.update(**{relation.field.name: None})
+
+            cursor.execute(f'DELETE FROM "{TABLE}"')
+            cursor.execute(
+                f'INSERT INTO "{TABLE}" ({_quote(columns)}) SELECT {_quote(columns)} FROM "{STAGING_TABLE}"'
+            )
+            imported = cursor.rowcount
+            # Run the deferred foreign key checks now; Postgres won't build an
+            # index on a table with pending trigger events
+            connection.check_constraints()
+
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence('\"{TABLE}\"', 'id'), "
+            f'COALESCE((SELECT MAX("id") FROM "{TABLE}"), 0) + 1, false)'
+        )
+
+        for name, definition in indexes:
+            cursor.execute(definition)
+        cursor.execute(f'ANALYZE "{TABLE}"')
+
+    logger.info(f"Imported {imported} knowledge base entries from {path} (rebuilt {len(indexes)} indexes)")
+    return imported
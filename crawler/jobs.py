@@ -0,0 +1,215 @@
+"""
+Background crawl jobs executed by an in-process worker pool
+
+Jobs queued in a process that stops (a deploy, a crash) would stay pending
+or running forever, so recover_crawl_jobs, run by the recrawl scheduler and
+the recover_crawl_jobs command, requeues jobs whose worker stopped updating
+them and fails jobs that were already retried CRAWL_JOB_MAX_ATTEMPTS times.
+A job is claimed by a single conditional update, so queueing it twice is
+harmless.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from crawler.models import KnowledgeBase, CrawlJob, CrawlJobResult
+from crawler.utils import crawl_in_batches
+from core.metrics import CRAWL_JOBS_RUNNING
+
+logger = logging.getLogger(__name__)
+
+# Shared pool so concurrent admin requests queue up instead of spawning threads
+_executor = None
+
+def get_executor():
+    """
+    Get (or lazily create) the shared crawl worker pool
+
+    Returns:
+        ThreadPoolExecutor: Pool sized by settings.CRAWLER_WORKERS
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'CRAWLER_WORKERS', 2),
+            thread_name_prefix='crawl-job'
+        )
+    return _executor
+
+def create_crawl_job(urls, delay=1, user=None):
+    """
+    Persist a new crawl job and hand it to the worker pool
+
+    Args:
+        urls (list): URLs to crawl, already de-duplicated
+        delay (int): Delay between requests in seconds
+        user: User who requested the crawl (optional)
+
+    Returns:
+        CrawlJob: The pending job
+    """
+    job = CrawlJob.objects.create(
+        created_by=user if user and user.is_authenticated else None,
+        urls=urls,
+        delay=delay,
+        total=len(urls)
+    )
+    # Only start once the job row is visible to the worker's connection
+    transaction.on_commit(lambda: get_executor().submit(run_crawl_job, job.id))
+    return job
+
+def run_crawl_job(job_id):
+    """
+    Crawl every URL of a job, recording per-URL results as it goes
+
+    Args:
+        job_id (int): ID of the CrawlJob to run
+    """
+    close_old_connections()
+    # Another worker may have picked up the same (recovered) job already
+    now = timezone.now()
+    claimed = CrawlJob.objects.filter(id=job_id, status=CrawlJob.STATUS_PENDING).update(
+        status=CrawlJob.STATUS_RUNNING,
+        started_at=Coalesce(F('started_at'), Value(now)),
+        heartbeat_at=now,
+        attempts=F('attempts') + 1
+    )
+    if not claimed:
+        close_old_connections()
+        return
+
+    CRAWL_JOBS_RUNNING.inc()
+    try:
+        job = CrawlJob.objects.get(id=job_id)
+        # A recovered job resumes after the URLs it already recorded
+        done = set(job.results.values_list('url', flat=True))
+        urls = [url for url in job.urls if url not in done]
+
+        # Pages are stored in batches; results are recorded as each batch
+        # lands, while the heartbeat moves with every fetch
+        pages = crawl_in_batches(urls, KnowledgeBase, delay=job.delay, on_progress=lambda: _heartbeat(job_id))
+        for url, result, error in pages:
+            _record_result(job, url, result, error)
+
+        CrawlJob.objects.filter(id=job_id).update(
+            status=CrawlJob.STATUS_COMPLETED,
+            finished_at=timezone.now()
+        )
+        logger.info(f"Crawl job {job_id} completed")
+    except Exception as e:
+        logger.error(f"Crawl job {job_id} failed: {str(e)}")
+        CrawlJob.objects.filter(id=job_id).update(
+            status=CrawlJob.STATUS_FAILED,
+            error=str(e),
+            finished_at=timezone.now()
+        )
+    finally:
+        CRAWL_JOBS_RUNNING.dec()
+        close_old_connections()
+
+def _heartbeat(job_id):
+    """Show recover_crawl_jobs that the job's worker is alive"""
+    CrawlJob.objects.filter(id=job_id).update(heartbeat_at=timezone.now())
+
+def _record_result(job, url, result, error):
+    """Record the outcome of one crawled URL against the job"""
+    if result:
+        CrawlJobResult.objects.create(
+            job=job,
+            url=url,
+            status=CrawlJobResult.STATUS_SUCCESS,
+            knowledge_base=result,
+            title=result.title[:255],
+            tags=result.tags
+        )
+        CrawlJob.objects.filter(id=job.id).update(success_count=F('success_count') + 1, heartbeat_at=timezone.now())
+    else:
+        CrawlJobResult.objects.create(
+            job=job,
+            url=url,
+            status=CrawlJobResult.STATUS_FAILED,
+            error=error
+        )
+        CrawlJob.objects.filter(id=job.id).update(failed_count=F('failed_count') + 1, heartbeat_at=timezone.now())
+
+def recover_crawl_jobs(stale_seconds=None):
+    """
+    Requeue crawl jobs left behind by a stopped worker
+
+    Running jobs without a heartbeat for stale_seconds are put back to
+    pending (or failed after CRAWL_JOB_MAX_ATTEMPTS), and pending jobs older
+    than that are handed to this process's worker pool.
+
+    Args:
+        stale_seconds (int): Default settings.CRAWL_JOB_STALE_SECONDS
+
+    Returns:
+        dict: Numbers of requeued and failed jobs
+    """
+    stale_seconds = settings.CRAWL_JOB_STALE_SECONDS if stale_seconds is None else stale_seconds
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=stale_seconds)
+
+    stale = CrawlJob.objects.filter(status=CrawlJob.STATUS_RUNNING, heartbeat_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=settings.CRAWL_JOB_MAX_ATTEMPTS).update(
+        status=CrawlJob.STATUS_FAILED,
+        error='Crawl worker stopped responding',
+        finished_at=now
+    )
+    stale.update(status=CrawlJob.STATUS_PENDING)
+
+    job_ids = list(
+        CrawlJob.objects.filter(status=CrawlJob.STATUS_PENDING)
+        .filter(Q(created_at__lt=cutoff) | Q(attempts__gt=0))
+        .values_list('id', flat=True)
+    )
+    for job_id in job_ids:
+        get_executor().submit(run_crawl_job, job_id)
+
+    if job_ids or failed:
+        logger.warning(f"Recovered crawl jobs: {len(job_ids)} requeued, {failed} failed")
+    return {'requeued': len(job_ids), 'failed': failed}
+
+def serialize_job(job, include_results=True):
+    """
+    Format a crawl job for API responses
+
+    Args:
+        job (CrawlJob): Job to format
+        include_results (bool): Whether to include per-URL results
+
+    Returns:
+        dict: Job status, counters and (optionally) results
+    """
+    data = {
+        'job_id': job.id,
+        'status': job.status,
+        'total': job.total,
+        'processed': job.processed_count,
+        'success_count': job.success_count,
+        'failed_count': job.failed_count,
+        'progress': round(job.processed_count / job.total * 100) if job.total else 100,
+        'error': job.error,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+    }
+
+    if include_results:
+        data['results'] = [
+            {
+                'id': result.knowledge_base_id,
+                'url': result.url,
+                'title': result.title,
+                'tags': result.tags,
+                'status': result.status,
+                'error': result.error,
+            }
+            for result in job.results.all()
+        ]
+
+    return data
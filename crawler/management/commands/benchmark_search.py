@@ -0,0 +1,79 @@
+import json
+import platform
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_databases, teardown_databases
+from django.utils import timezone
+from crawler.benchmark import SEARCH_ENGINES, build_queries, compare_results, load_corpus, run_engine
+
+class Command(BaseCommand):
+    help = 'Benchmarks knowledge base search engines on synthetic corpora in a throwaway test database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                            help='Corpus sizes to measure, smallest first (default: 1000 10000 100000)')
+        parser.add_argument('--engines', nargs='+', choices=sorted(SEARCH_ENGINES), default=sorted(SEARCH_ENGINES),
+                            help='Engines to run (default: all)')
+        parser.add_argument('--queries', type=int, default=20, help='Number of benchmark queries (default: 20)')
+        parser.add_argument('--k', type=int, default=3, help='Results considered for recall@k (default: 3)')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per query (default: 3)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the corpus and queries (default: 42)')
+        parser.add_argument('--output', '-o', type=str, default='search_benchmark.json',
+                            help='Where to write the JSON results (default: search_benchmark.json)')
+        parser.add_argument('--baseline', type=str, help='Earlier results file to compare against')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the test database between runs')
+
+    def handle(self, *args, **options):
+        sizes = sorted(options['sizes'])
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline'], encoding='utf-8') as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Cannot read baseline {options["baseline"]}: {str(e)}')
+
+        queries = build_queries(options['seed'], options['queries'])
+        recall_key = f'recall_at_{options["k"]}'
+        report = {
+            'generated_at': timezone.now().isoformat(),
+            'seed': options['seed'],
+            'k': options['k'],
+            'repeat': options['repeat'],
+            'python': platform.python_version(),
+            'queries': [query['text'] for query in queries],
+            'results': [],
+        }
+
+        # Never touch the real knowledge base: work in test_<NAME>, as `manage.py test` does
+        old_config = setup_databases(verbosity=1, interactive=False, keepdb=options['keepdb'])
+        try:
+            with connection.cursor() as cursor:
+                if options['keepdb']:
+                    cursor.execute('TRUNCATE crawler_knowledgebase RESTART IDENTITY CASCADE')
+                cursor.execute('SHOW server_version')
+                report['postgres'] = cursor.fetchone()[0]
+
+            for size in sizes:
+                count = load_corpus(size, queries, seed=options['seed'])
+                self.stdout.write(f'Corpus: {count} entries')
+                for name in options['engines']:
+                    result = run_engine(name, queries, k=options['k'], repeat=options['repeat'])
+                    result['corpus_size'] = count
+                    report['results'].append(result)
+                    self.stdout.write(
+                        f'  {name:<20} p50 {result["p50_ms"]:>9.2f}ms  p95 {result["p95_ms"]:>9.2f}ms  '
+                        f'p99 {result["p99_ms"]:>9.2f}ms  rows scanned {result["rows_scanned_avg"]:>8}  '
+                        f'recall@{options["k"]} {result[recall_key]:.3f}'
+                    )
+        finally:
+            teardown_databases(old_config, verbosity=1, keepdb=options['keepdb'])
+
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
+
+        if baseline:
+            for size, engine, metric, before, after in compare_results(report, baseline):
+                change = f'{(after - before) / before * 100:+.1f}%' if before else 'n/a'
+                self.stdout.write(f'{size:>7} {engine:<20} {metric:<18} {before} -> {after} ({change})')
@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand
+from crawler.programs import known_programs, rebuild_program_contexts
+
+class Command(BaseCommand):
+    help = 'Rebuilds the per-program knowledge base context sets used by program-aware retrieval'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--programs', nargs='+', type=str,
+                            help='Programs to rebuild (default: every program students are enrolled in)')
+    
+    def handle(self, *args, **options):
+        programs = options['programs'] or known_programs()
+        if not programs:
+            self.stdout.write('No student programs found')
+            return
+        
+        start_time = time.time()
+        sizes = rebuild_program_contexts(programs)
+        for program, count in sizes.items():
+            self.stdout.write(f'  {program:<40} {count:>5} entries')
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {len(sizes)} program context sets in {time.time() - start_time:.2f} seconds'
+        ))
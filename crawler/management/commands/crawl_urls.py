@@ -1,7 +1,10 @@
 from django.core.management.base import BaseCommand, CommandError
 from crawler.models import KnowledgeBase
-from crawler.utils import crawl_and_store
+from crawler.utils import crawl_in_batches, replay_archive
+from crawler.pipeline import crawl_with_pipeline
+from crawler.archive import ResponseArchive
 from crawler.config import URLS_TO_SCRAPE
+import os
 import time
 
 class Command(BaseCommand):
@@ -11,12 +14,23 @@ class Command(BaseCommand):
         parser.add_argument('--urls', nargs='+', type=str, help='Custom URLs to crawl')
         parser.add_argument('--use-config', action='store_true', help='Use URLs from config.py')
         parser.add_argument('--delay', type=int, default=1, help='Delay between requests in seconds (default: 1)')
+        parser.add_argument('--pipeline', action='store_true', help='Use the concurrent fetch/parse/store pipeline (ignores --delay)')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent downloads in pipeline mode (default: 8)')
+        parser.add_argument('--parse-workers', type=int, default=None, help='Parser processes in pipeline mode (default: all cores)')
+        parser.add_argument('--archive', type=str, help='Append raw responses to this .warc.gz archive')
+        parser.add_argument('--replay', type=str, help='Re-run extraction and storage from a .warc.gz archive instead of fetching')
+        parser.add_argument('--no-store', action='store_true', help='With --replay, only run extraction (for parser benchmarks)')
     
     def handle(self, *args, **options):
         urls = options['urls'] if options['urls'] else None
         use_config = options['use_config']
         delay = options['delay']
         
+        # Replay doesn't need any URLs, the archive provides them
+        if options['replay']:
+            self._replay(urls, options)
+            return
+        
         # No arguments provided, show help
         if not urls and not use_config:
             self.stdout.write(self.style.WARNING('No URLs specified. Use --urls or --use-config option.'))
@@ -29,28 +43,28 @@ class Command(BaseCommand):
             urls = URLS_TO_SCRAPE
             self.stdout.write(f'Using {len(urls)} URLs from config')
         
+        if options['pipeline']:
+            self._crawl_with_pipeline(urls, options)
+            return
+        
+        archive = ResponseArchive(options['archive']) if options['archive'] else None
         success_count = 0
         failed_urls = []
         
-        for i, url in enumerate(urls, 1):
-            self.stdout.write(f'[{i}/{len(urls)}] Crawling {url}...')
-            result = crawl_and_store(url, KnowledgeBase)
-            
+        # Pages are stored in batches, so results are printed as each batch lands
+        self.stdout.write(f'Crawling {len(urls)} URLs with a {delay}s delay between requests...')
+        results = crawl_in_batches(urls, KnowledgeBase, delay=delay, archive=archive)
+        for i, (url, result, error) in enumerate(results, 1):
             if result:
                 success_count += 1
                 self.stdout.write(self.style.SUCCESS(
-                    f'Successfully crawled and stored: {url}\n'
+                    f'[{i}/{len(urls)}] Successfully crawled and stored: {url}\n'
                     f'  Title: {result.title}\n'
                     f'  Tags: {result.tags}'
                 ))
             else:
                 failed_urls.append(url)
-                self.stdout.write(self.style.ERROR(f'Failed to crawl {url}'))
-            
-            # Add delay between requests if not the last URL
-            if i < len(urls) and delay > 0:
-                self.stdout.write(f'Waiting {delay} seconds before next request...')
-                time.sleep(delay)
+                self.stdout.write(self.style.ERROR(f'[{i}/{len(urls)}] Failed to crawl {url}: {error}'))
         
         self.stdout.write(self.style.SUCCESS(
             f'Finished crawling. Success: {success_count}/{len(urls)}'
@@ -60,3 +74,52 @@ class Command(BaseCommand):
             self.stdout.write(self.style.WARNING('Failed URLs:'))
             for url in failed_urls:
                 self.stdout.write(f'  - {url}')
+    
+    def _crawl_with_pipeline(self, urls, options):
+        """Crawl using the staged pipeline and print per-stage throughput"""
+        self.stdout.write(f'Crawling {len(urls)} URLs with the pipeline...')
+        stats = crawl_with_pipeline(
+            urls,
+            KnowledgeBase,
+            fetch_concurrency=options['concurrency'],
+            parse_workers=options['parse_workers'],
+            archive=ResponseArchive(options['archive']) if options['archive'] else None
+        )
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'Finished crawling. Success: {stats["success"]}/{stats["total"]} '
+            f'in {stats["elapsed_seconds"]}s ({stats["pages_per_second"]} pages/s)'
+        ))
+        
+        for stage in stats['stages']:
+            self.stdout.write(
+                f'  {stage["stage"]:<6} processed={stage["processed"]} failed={stage["failed"]} '
+                f'busy={stage["busy_seconds"]}s rate={stage["items_per_second"]}/s'
+            )
+        
+        if stats['failed_urls']:
+            self.stdout.write(self.style.WARNING('Failed URLs:'))
+            for url in stats['failed_urls']:
+                self.stdout.write(f'  - {url}')
+    
+    def _replay(self, urls, options):
+        """Re-run extraction (and storage) from an archive without network access"""
+        if not os.path.exists(options['replay']):
+            raise CommandError(f'Archive not found: {options["replay"]}')
+        
+        model_class = None if options['no_store'] else KnowledgeBase
+        self.stdout.write(f'Replaying {options["replay"]}...')
+        
+        start = time.perf_counter()
+        stats = replay_archive(options['replay'], model_class, urls=urls)
+        elapsed = time.perf_counter() - start
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'Finished replay. Success: {stats["success"]}/{stats["total"]} in {elapsed:.2f}s '
+            f'(parse {stats["parse_seconds"]}s, store {stats["store_seconds"]}s)'
+        ))
+        
+        if stats['failed_urls']:
+            self.stdout.write(self.style.WARNING('Failed URLs:'))
+            for url in stats['failed_urls']:
+                self.stdout.write(f'  - {url}')
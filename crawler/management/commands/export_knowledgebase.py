@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from crawler.bulk import export_knowledge_base
+import time
+
+class Command(BaseCommand):
+    help = 'Exports the KnowledgeBase table to a gzipped CSV file using Postgres COPY'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str, help='Output file, e.g. knowledgebase.csv.gz')
+    
+    def handle(self, *args, **options):
+        start_time = time.time()
+        count = export_knowledge_base(options['path'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {count} entries to {options["path"]} in {time.time() - start_time:.2f} seconds'
+        ))
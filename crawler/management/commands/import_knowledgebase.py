@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from crawler.bulk import import_knowledge_base
+from crawler.programs import rebuild_program_contexts
+import os
+import time
+
+class Command(BaseCommand):
+    help = 'Loads a KnowledgeBase export with Postgres COPY in a single transaction'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str, help='File written by export_knowledgebase')
+        parser.add_argument('--merge', action='store_true',
+                            help='Update entries with matching source URLs and keep the rest (default: replace the table)')
+    
+    def handle(self, *args, **options):
+        if not os.path.exists(options['path']):
+            raise CommandError(f'File not found: {options["path"]}')
+        
+        start_time = time.time()
+        try:
+            count = import_knowledge_base(options['path'], merge=options['merge'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        
+        action = 'Merged' if options['merge'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} {count} entries in {time.time() - start_time:.2f} seconds'
+        ))
+        
+        # COPY bypasses the per-crawl updates, so rebuild the program sets
+        start_time = time.time()
+        sizes = rebuild_program_contexts()
+        self.stdout.write(f'Rebuilt {len(sizes)} program context sets in {time.time() - start_time:.2f} seconds')
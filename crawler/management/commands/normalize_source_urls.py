@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from crawler.models import KnowledgeBase
+from crawler.utils import normalize_url
+
+class Command(BaseCommand):
+    help = 'Normalizes KnowledgeBase source URLs and merges duplicates (run before adding the unique source_url index)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report changes without writing them')
+    
+    def handle(self, *args, **options):
+        # Group entries by normalized URL, newest first
+        groups = {}
+        entries = KnowledgeBase.objects.exclude(source_url__isnull=True).exclude(source_url='')
+        for entry_id, url in entries.order_by('-is_verified', '-last_updated').values_list('id', 'source_url'):
+            groups.setdefault(normalize_url(url), []).append((entry_id, url))
+        
+        to_delete = []
+        to_rename = []
+        for normalized, group in groups.items():
+            # Keep verified/most recent entry, drop the rest
+            keep_id, keep_url = group[0]
+            to_delete.extend(entry_id for entry_id, _ in group[1:])
+            if keep_url != normalized:
+                to_rename.append((keep_id, normalized))
+        
+        self.stdout.write(f'{len(to_rename)} URLs to normalize, {len(to_delete)} duplicate entries to remove')
+        
+        if options['dry_run']:
+            return
+        
+        with transaction.atomic():
+            KnowledgeBase.objects.filter(id__in=to_delete).delete()
+            for entry_id, normalized in to_rename:
+                KnowledgeBase.objects.filter(id=entry_id).update(source_url=normalized)
+        
+        self.stdout.write(self.style.SUCCESS('Source URLs normalized'))
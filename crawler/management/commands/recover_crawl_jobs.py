@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from crawler.jobs import get_executor, recover_crawl_jobs
+
+class Command(BaseCommand):
+    help = 'Requeues crawl jobs left pending or running by a stopped worker and waits for them to finish'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale-seconds', type=int, default=None,
+                            help='Seconds without progress before a job is recovered (default: settings.CRAWL_JOB_STALE_SECONDS)')
+
+    def handle(self, *args, **options):
+        stats = recover_crawl_jobs(options['stale_seconds'])
+        self.stdout.write(f'{stats["requeued"]} crawl jobs requeued, {stats["failed"]} failed')
+        # The requeued jobs run in this process's pool
+        get_executor().shutdown(wait=True)
+        self.stdout.write(self.style.SUCCESS('Recovered crawl jobs finished'))
@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from crawler.jobs import recover_crawl_jobs
+from crawler.scheduler import sync_schedules, run_tick
+import time
+
+class Command(BaseCommand):
+    help = 'Continuously recrawls KnowledgeBase pages, revisiting frequently changing pages more often'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--budget', type=int, default=None,
+                            help='Maximum page fetches per hour (default: settings.RECRAWL_BUDGET_PER_HOUR)')
+        parser.add_argument('--tick', type=int, default=60, help='Seconds between scheduling rounds (default: 60)')
+        parser.add_argument('--sync-every', type=int, default=60,
+                            help='Check for new KnowledgeBase URLs every N ticks (default: 60)')
+        parser.add_argument('--once', action='store_true', help='Run a single scheduling round and exit')
+
+    def handle(self, *args, **options):
+        budget_per_hour = options['budget'] or getattr(settings, 'RECRAWL_BUDGET_PER_HOUR', 120)
+        tick = options['tick']
+
+        # Spread the hourly budget across ticks, carrying over fractions
+        per_tick = budget_per_hour * tick / 3600
+        allowance = 0.0
+
+        self.stdout.write(f'Recrawl scheduler started: budget {budget_per_hour} fetches/hour, tick {tick}s')
+
+        ticks = 0
+        while True:
+            close_old_connections()
+
+            # Pick up admin crawl jobs left behind by a stopped web worker
+            recovered = recover_crawl_jobs()
+            if recovered['requeued'] or recovered['failed']:
+                self.stdout.write(f'Crawl jobs: {recovered["requeued"]} requeued, {recovered["failed"]} failed')
+
+            if ticks % options['sync_every'] == 0:
+                created = sync_schedules()
+                if created:
+                    self.stdout.write(f'Tracking {created} new URLs')
+
+            allowance = min(allowance + per_tick, max(per_tick, 1))
+            if options['once']:
+                allowance = max(allowance, 1)
+
+            budget = int(allowance)
+            if budget > 0:
+                stats = run_tick(budget)
+                fetched = stats['changed'] + stats['unchanged'] + stats['failed']
+                allowance -= fetched
+
+                if fetched:
+                    self.stdout.write(
+                        f'Recrawled {fetched} pages: {stats["changed"]} changed, '
+                        f'{stats["unchanged"]} unchanged, {stats["failed"]} failed'
+                    )
+
+            if options['once']:
+                return
+
+            ticks += 1
+            time.sleep(tick)
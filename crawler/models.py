@@ -1,4 +1,5 @@
 from django.db import models
+from django.conf import settings
 from django.contrib.postgres.fields import ArrayField
 
 # Create your models here.
@@ -6,7 +7,7 @@ class KnowledgeBase(models.Model):
     title = models.CharField(max_length=255)
     content = models.TextField()
     tags = ArrayField(models.CharField(max_length=50), blank=True, null=True)
-    source_url = models.URLField(blank=True, null=True)
+    source_url = models.URLField(unique=True, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     last_updated = models.DateTimeField(auto_now=True)
     is_verified = models.BooleanField(default=False)
@@ -20,3 +21,118 @@ class KnowledgeBase(models.Model):
     
     def __str__(self):
         return self.title
+
+
+class ProgramContext(models.Model):
+    """
+    A KnowledgeBase entry relevant to one academic program, with its score
+
+    Precomputed by crawler.programs so retrieval for a student only searches
+    their program's entries.
+    """
+    program = models.CharField(max_length=100, help_text="Normalized program name (see crawler.programs.program_key)")
+    knowledge_base = models.ForeignKey(KnowledgeBase, on_delete=models.CASCADE, related_name="program_contexts")
+    score = models.FloatField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['program', 'knowledge_base'], name='unique_program_context'),
+        ]
+        indexes = [
+            models.Index(fields=['program', '-score']),
+            models.Index(fields=['knowledge_base']),
+        ]
+    
+    def __str__(self):
+        return f"{self.program}: {self.knowledge_base_id} ({self.score:.1f})"
+
+
+class CrawlJob(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="crawl_jobs")
+    urls = ArrayField(models.URLField(max_length=500))
+    delay = models.PositiveIntegerField(default=1)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    total = models.PositiveIntegerField(default=0)
+    success_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    # Updated after every URL; jobs whose worker went away stop updating it
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    @property
+    def processed_count(self):
+        return self.success_count + self.failed_count
+    
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_COMPLETED, self.STATUS_FAILED)
+    
+    def __str__(self):
+        return f"Crawl job #{self.id} ({self.status}) - {self.processed_count}/{self.total} URLs"
+
+
+class CrawlJobResult(models.Model):
+    STATUS_SUCCESS = 'success'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_SUCCESS, 'Success'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    
+    job = models.ForeignKey(CrawlJob, on_delete=models.CASCADE, related_name="results")
+    url = models.URLField(max_length=500)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    knowledge_base = models.ForeignKey(KnowledgeBase, on_delete=models.SET_NULL, null=True, blank=True, related_name="crawl_results")
+    title = models.CharField(max_length=255, blank=True)
+    tags = ArrayField(models.CharField(max_length=50), blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    crawled_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"{self.url} ({self.status})"
+
+
+class RecrawlSchedule(models.Model):
+    source_url = models.URLField(max_length=500, unique=True)
+    knowledge_base = models.ForeignKey(KnowledgeBase, on_delete=models.SET_NULL, null=True, blank=True, related_name="recrawl_schedules")
+    content_hash = models.CharField(max_length=64, blank=True)
+    change_rate = models.FloatField(default=1.0, help_text="Estimated content changes per day")
+    fetch_count = models.PositiveIntegerField(default=0)
+    change_count = models.PositiveIntegerField(default=0)
+    failure_count = models.PositiveIntegerField(default=0)
+    last_fetched_at = models.DateTimeField(blank=True, null=True)
+    last_changed_at = models.DateTimeField(blank=True, null=True)
+    next_fetch_at = models.DateTimeField()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_fetch_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.source_url} (next: {self.next_fetch_at.strftime('%Y-%m-%d %H:%M')})"
@@ -0,0 +1,229 @@
+"""
+Staged crawl pipeline for large crawls
+
+Pages flow through three stages connected by bounded queues:
+
+    fetch (async httpx) -> parse/extract (process pool) -> store (batched upserts)
+
+Fetching is I/O-bound and runs as concurrent coroutines, while BeautifulSoup
+parsing and NLTK keyword extraction are CPU-bound and run in a
+ProcessPoolExecutor so they can use every core instead of fighting over the GIL.
+"""
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import httpx
+from asgiref.sync import sync_to_async
+from crawler.archive import get_default_archive
+from crawler.utils import CLIENT_OPTIONS, REQUEST_HEADERS, normalize_url, parse_webpage, upsert_scraped_pages
+from core.metrics import CRAWL_STAGE_LATENCY, CRAWL_PAGES
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of input for a stage worker
+_DONE = object()
+
+
+class StageStats:
+    """
+    Throughput counters for one pipeline stage
+    """
+    def __init__(self, name):
+        self.name = name
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.started_at = None
+        self.finished_at = None
+
+    def record(self, seconds, ok=True, count=1):
+        """Record processed items and the time spent on them"""
+        CRAWL_STAGE_LATENCY.labels(self.name).observe(seconds / count if count else seconds)
+        if self.started_at is None:
+            self.started_at = time.perf_counter() - seconds
+        self.finished_at = time.perf_counter()
+        self.busy_seconds += seconds
+        if ok:
+            self.processed += count
+        else:
+            self.failed += count
+
+    def as_dict(self):
+        """Summarise the stage, including items per second of wall-clock time"""
+        elapsed = (self.finished_at - self.started_at) if self.started_at is not None else 0.0
+        total = self.processed + self.failed
+        return {
+            'stage': self.name,
+            'processed': self.processed,
+            'failed': self.failed,
+            'elapsed_seconds': round(elapsed, 3),
+            'busy_seconds': round(self.busy_seconds, 3),
+            'items_per_second': round(total / elapsed, 2) if elapsed > 0 else None,
+        }
+
+
+async def _fetch_worker(client, url_queue, parse_queue, stats, failed_urls, archive):
+    """Download pages and push the raw HTML to the parse stage"""
+    while True:
+        url = await url_queue.get()
+        if url is _DONE:
+            return
+
+        start = time.perf_counter()
+        try:
+            response = await client.get(url, headers=REQUEST_HEADERS)
+            if archive:
+                await asyncio.to_thread(archive.safe_write_response, url, response)
+            response.raise_for_status()
+            stats.record(time.perf_counter() - start)
+            await parse_queue.put((url, response.text))
+        except Exception as e:
+            stats.record(time.perf_counter() - start, ok=False)
+            logger.error(f"Error fetching {url}: {str(e)}")
+            failed_urls.append(url)
+
+
+async def _parse_worker(pool, parse_queue, store_queue, stats, failed_urls):
+    """Run parsing and keyword extraction in the process pool"""
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await parse_queue.get()
+        if item is _DONE:
+            return
+
+        url, html = item
+        start = time.perf_counter()
+        try:
+            scraped_data = await loop.run_in_executor(pool, parse_webpage, html, url)
+            stats.record(time.perf_counter() - start)
+            await store_queue.put(scraped_data)
+        except Exception as e:
+            stats.record(time.perf_counter() - start, ok=False)
+            logger.error(f"Error parsing {url}: {str(e)}")
+            failed_urls.append(url)
+
+
+async def _store_worker(model_class, store_queue, stats, failed_urls, stored, batch_size):
+    """Upsert parsed pages to the database in chunks"""
+    upsert = sync_to_async(upsert_scraped_pages)
+    batch = []
+
+    async def flush():
+        start = time.perf_counter()
+        try:
+            upserted = await upsert(batch, model_class, batch_size)
+            stored.extend(upserted)
+            # Pages the upsert skipped after retrying them one by one
+            stored_urls = {instance.source_url for instance in upserted}
+            lost = [page['source_url'] for page in batch if normalize_url(page['source_url']) not in stored_urls]
+            stats.record(time.perf_counter() - start, count=len(batch) - len(lost))
+            stats.failed += len(lost)
+            failed_urls.extend(lost)
+        except Exception as e:
+            stats.record(time.perf_counter() - start, ok=False, count=len(batch))
+            logger.error(f"Error storing batch of {len(batch)} pages: {str(e)}")
+            failed_urls.extend(page['source_url'] for page in batch)
+        batch.clear()
+
+    while True:
+        scraped_data = await store_queue.get()
+        if scraped_data is not _DONE:
+            batch.append(scraped_data)
+
+        # Write when the chunk is full or the crawl is finished
+        if batch and (len(batch) >= batch_size or scraped_data is _DONE):
+            await flush()
+
+        if scraped_data is _DONE:
+            return
+
+
+async def run_pipeline(urls, model_class, fetch_concurrency=8, parse_workers=None, queue_size=None, archive=None, batch_size=500):
+    """
+    Crawl URLs through the fetch -> parse -> store pipeline
+
+    Args:
+        urls (list): URLs to crawl
+        model_class: The model class to store the data in
+        fetch_concurrency (int): Number of concurrent downloads
+        parse_workers (int): Parser processes (defaults to all cores)
+        queue_size (int): Bound on each inter-stage queue (defaults to 2x parse_workers)
+        archive (ResponseArchive): Archive to save raw responses to
+            (optional, defaults to settings.CRAWLER_ARCHIVE_PATH if set)
+        batch_size (int): Maximum pages per upsert statement
+
+    Returns:
+        dict: Stats about the crawl, including per-stage throughput
+    """
+    archive = archive or get_default_archive()
+    parse_workers = parse_workers or os.cpu_count() or 1
+    queue_size = queue_size or parse_workers * 2
+
+    url_queue = asyncio.Queue()
+    parse_queue = asyncio.Queue(maxsize=queue_size)
+    store_queue = asyncio.Queue(maxsize=queue_size)
+
+    fetch_stats = StageStats('fetch')
+    parse_stats = StageStats('parse')
+    store_stats = StageStats('store')
+    failed_urls = []
+    stored = []
+
+    for url in urls:
+        url_queue.put_nowait(url)
+    for _ in range(fetch_concurrency):
+        url_queue.put_nowait(_DONE)
+
+    start = time.perf_counter()
+    limits = httpx.Limits(max_connections=fetch_concurrency)
+
+    with ProcessPoolExecutor(max_workers=parse_workers) as pool:
+        async with httpx.AsyncClient(limits=limits, **CLIENT_OPTIONS) as client:
+            fetchers = [
+                asyncio.create_task(_fetch_worker(client, url_queue, parse_queue, fetch_stats, failed_urls, archive))
+                for _ in range(fetch_concurrency)
+            ]
+            parsers = [
+                asyncio.create_task(_parse_worker(pool, parse_queue, store_queue, parse_stats, failed_urls))
+                for _ in range(parse_workers)
+            ]
+            storer = asyncio.create_task(_store_worker(model_class, store_queue, store_stats, failed_urls, stored, batch_size))
+
+            # Shut stages down in order so every queued item is drained
+            await asyncio.gather(*fetchers)
+            for _ in parsers:
+                await parse_queue.put(_DONE)
+            await asyncio.gather(*parsers)
+            await store_queue.put(_DONE)
+            await storer
+
+    elapsed = time.perf_counter() - start
+    CRAWL_PAGES.labels('success').inc(len(stored))
+    CRAWL_PAGES.labels('failed').inc(len(failed_urls))
+
+    return {
+        'total': len(urls),
+        'success': len(stored),
+        'failed': len(failed_urls),
+        'failed_urls': failed_urls,
+        'elapsed_seconds': round(elapsed, 3),
+        'pages_per_second': round(len(urls) / elapsed, 2) if elapsed > 0 else None,
+        'stages': [stats.as_dict() for stats in (fetch_stats, parse_stats, store_stats)],
+    }
+
+
+def crawl_with_pipeline(urls, model_class, **kwargs):
+    """
+    Synchronous entry point for run_pipeline
+
+    Args:
+        urls (list): URLs to crawl
+        model_class: The model class to store the data in
+        **kwargs: Passed through to run_pipeline
+
+    Returns:
+        dict: Stats about the crawl, including per-stage throughput
+    """
+    return asyncio.run(run_pipeline(urls, model_class, **kwargs))
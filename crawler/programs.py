@@ -0,0 +1,232 @@
+"""
+Program-aware retrieval context
+
+Every program students are enrolled in (StudentProfile.program) gets a
+precomputed set of its most relevant KnowledgeBase entries, stored as
+ProgramContext rows. Chat retrieval searches a student's program set first,
+ranks its entries higher and only falls back to the whole knowledge base
+when the set has too few matches.
+
+Sets are rebuilt in full by ``manage.py build_program_contexts`` (after
+imports, or when students enroll in a new program) and kept current by
+update_program_contexts, which runs for every batch of crawled pages.
+"""
+import heapq
+import re
+from django.conf import settings
+from django.db import transaction
+from core.cache import KB_CACHE
+from crawler.models import KnowledgeBase, ProgramContext
+
+# Words that say nothing about a program ("Bachelor of Science in Nursing")
+PROGRAM_STOP_WORDS = {'and', 'the', 'for', 'with', 'bachelor', 'master', 'science', 'arts', 'degree', 'programme', 'program'}
+
+# Ranking inside a program set: keyword matches first, then program relevance
+PROGRAM_SCORE_WEIGHT = 0.1
+YEAR_BOOST = 2.0
+
+
+def program_key(program):
+    """
+    Normalize a program name ("Computer  Science" -> "computer science")
+
+    Returns:
+        str: Lowercase words separated by single spaces
+    """
+    return ' '.join(re.findall(r'\w+', (program or '').lower()))
+
+
+class ProgramMatcher:
+    """
+    Scores how relevant a KnowledgeBase entry is to one program
+
+    Args:
+        key (str): Normalized program name
+    """
+    def __init__(self, key):
+        self.key = key
+        self.pattern = re.compile(rf'\b{re.escape(key)}\b')
+        self.slugs = {key.replace(' ', '-'), key.replace(' ', '_'), key.replace(' ', '')}
+        terms = [word for word in key.split() if len(word) > 2 and word not in PROGRAM_STOP_WORDS]
+        self.terms = terms or key.split()
+
+    def score(self, title, content, tags, url):
+        """
+        Args:
+            title, content, url (str): Lowercased entry fields
+            tags (set): Lowercased tags
+
+        Returns:
+            float: 0 for unrelated entries, higher is more relevant
+        """
+        score = 0.0
+        if self.pattern.search(title):
+            score += 10
+        if any(slug in url for slug in self.slugs):
+            score += 8
+        mentions = 0
+        for _ in self.pattern.finditer(content):
+            mentions += 1
+            if mentions == 5:
+                break
+        score += 2 * mentions
+        title_words = set(title.split())
+        for term in self.terms:
+            if term in title_words:
+                score += 2
+            if term in tags:
+                score += 3
+        return score
+
+
+def _cache_key(key):
+    return f"program:{key.replace(' ', '-')}"
+
+def known_programs():
+    """Normalized names of the programs students are enrolled in"""
+    from users.models import StudentProfile
+
+    programs = StudentProfile.objects.exclude(program='').values_list('program', flat=True).distinct()
+    return sorted({program_key(program) for program in programs} - {''})
+
+def _score_entries(entries, matchers, min_score):
+    """Yield (program, entry id, score) for every entry relevant to a program"""
+    for entry in entries:
+        title = entry.title.lower()
+        content = entry.content.lower()
+        tags = {tag.lower() for tag in entry.tags or []}
+        url = (entry.source_url or '').lower()
+        for matcher in matchers:
+            score = matcher.score(title, content, tags, url)
+            if score >= min_score:
+                yield matcher.key, entry.id, score
+
+def rebuild_program_contexts(programs=None, batch_size=500):
+    """
+    Recompute the context sets of programs from the whole knowledge base
+
+    Args:
+        programs (list): Program names (default: every known program)
+        batch_size (int): Entries read per database round trip
+
+    Returns:
+        dict: Program -> number of entries in its set
+    """
+    keys = sorted({program_key(program) for program in programs} - {''}) if programs else known_programs()
+    matchers = [ProgramMatcher(key) for key in keys]
+    size = settings.PROGRAM_CONTEXT_SIZE
+    best = {key: [] for key in keys}
+
+    entries = KnowledgeBase.objects.only('id', 'title', 'content', 'tags', 'source_url').iterator(chunk_size=batch_size)
+    for key, entry_id, score in _score_entries(entries, matchers, settings.PROGRAM_CONTEXT_MIN_SCORE):
+        # Keep the top `size` entries per program without holding every score
+        if len(best[key]) < size:
+            heapq.heappush(best[key], (score, entry_id))
+        elif score > best[key][0][0]:
+            heapq.heapreplace(best[key], (score, entry_id))
+
+    with transaction.atomic():
+        ProgramContext.objects.filter(program__in=keys).delete()
+        ProgramContext.objects.bulk_create(
+            [ProgramContext(program=key, knowledge_base_id=entry_id, score=score)
+             for key, rows in best.items() for score, entry_id in rows],
+            batch_size=batch_size
+        )
+    for key in keys:
+        KB_CACHE.delete(_cache_key(key))
+    return {key: len(rows) for key, rows in best.items()}
+
+def update_program_contexts(entries):
+    """
+    Rescore changed entries against every indexed program
+
+    Called after crawled pages are stored. Programs that were never built
+    are left to rebuild_program_contexts.
+
+    Args:
+        entries (list): KnowledgeBase instances that were created or updated
+
+    Returns:
+        int: ProgramContext rows written
+    """
+    entries = [entry for entry in entries if entry.pk]
+    if not entries:
+        return 0
+    keys = list(ProgramContext.objects.values_list('program', flat=True).distinct())
+    if not keys:
+        return 0
+
+    entry_ids = [entry.id for entry in entries]
+    matchers = [ProgramMatcher(key) for key in keys]
+    rows = [
+        ProgramContext(program=key, knowledge_base_id=entry_id, score=score)
+        for key, entry_id, score in _score_entries(entries, matchers, settings.PROGRAM_CONTEXT_MIN_SCORE)
+    ]
+
+    with transaction.atomic():
+        affected = set(
+            ProgramContext.objects.filter(knowledge_base_id__in=entry_ids).values_list('program', flat=True).distinct()
+        )
+        ProgramContext.objects.filter(knowledge_base_id__in=entry_ids).delete()
+        # A concurrent crawl may have rescored the same entry
+        ProgramContext.objects.bulk_create(rows, ignore_conflicts=True)
+        affected.update(row.program for row in rows)
+
+        # Trim sets that grew past PROGRAM_CONTEXT_SIZE
+        size = settings.PROGRAM_CONTEXT_SIZE
+        for key in affected:
+            overflow = list(
+                ProgramContext.objects.filter(program=key).order_by('-score', 'id').values_list('id', flat=True)[size:]
+            )
+            if overflow:
+                ProgramContext.objects.filter(id__in=overflow).delete()
+
+    for key in affected:
+        KB_CACHE.delete(_cache_key(key))
+    return len(rows)
+
+def get_program_candidates(program):
+    """
+    The context set of a program, cached in KB_CACHE
+
+    Returns:
+        dict: KnowledgeBase id -> program relevance score (empty if the program has no set)
+    """
+    key = program_key(program)
+    if not key:
+        return {}
+    return KB_CACHE.get_or_compute(
+        _cache_key(key),
+        lambda: dict(ProgramContext.objects.filter(program=key).values_list('knowledge_base_id', 'score'))
+    )
+
+def search_program_context(filters, keywords, program, year_of_study=None, limit=3):
+    """
+    Search only the entries of a program's context set
+
+    Args:
+        filters (Q): Keyword conditions on KnowledgeBase
+        keywords (list): Lowercased query words, used for ranking
+        program (str): The student's program
+        year_of_study (int): Entries mentioning the student's level rank higher
+        limit (int): Maximum number of entries
+
+    Returns:
+        list: KnowledgeBase entries, best first
+    """
+    candidates = get_program_candidates(program)
+    if not candidates:
+        return []
+
+    year_markers = (f'{year_of_study}00 level', f'year {year_of_study}') if year_of_study else ()
+
+    def rank(entry):
+        title, content = entry.title.lower(), entry.content.lower()
+        score = sum(3 * (word in title) + min(content.count(word), 5) for word in keywords)
+        score += PROGRAM_SCORE_WEIGHT * candidates[entry.id]
+        if any(marker in content for marker in year_markers):
+            score += YEAR_BOOST
+        return score
+
+    entries = KnowledgeBase.objects.filter(id__in=list(candidates)).filter(filters)
+    return sorted(entries, key=rank, reverse=True)[:limit]
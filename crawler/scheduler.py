@@ -0,0 +1,249 @@
+"""
+Adaptive recrawl scheduling driven by observed page change rates
+
+Each KnowledgeBase.source_url gets a RecrawlSchedule row that remembers when
+the page was last fetched, when its content last changed and an estimated
+change rate (changes per day). Pages that change often are revisited often,
+stable pages back off towards the maximum interval, and every tick only
+fetches as many due pages as the global budget allows.
+"""
+import hashlib
+import logging
+import math
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from crawler.models import KnowledgeBase, RecrawlSchedule
+from crawler.utils import normalize_url, scrape_webpage, upsert_scraped_pages
+
+logger = logging.getLogger(__name__)
+
+# Weight given to the newest observation when updating the change rate
+RATE_SMOOTHING = 0.3
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+def content_hash(scraped_data):
+    """
+    Fingerprint the parts of a page that end up in the KnowledgeBase
+
+    Args:
+        scraped_data (dict): Output of scrape_webpage
+
+    Returns:
+        str: SHA-256 hex digest
+    """
+    digest = hashlib.sha256()
+    digest.update(scraped_data['title'].encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(scraped_data['content'].encode('utf-8'))
+    return digest.hexdigest()
+
+def recrawl_interval(change_rate):
+    """
+    Convert an estimated change rate into a revisit interval
+
+    Args:
+        change_rate (float): Estimated changes per day
+
+    Returns:
+        timedelta: Interval clamped to the configured min/max
+    """
+    min_hours = _setting('RECRAWL_MIN_INTERVAL_HOURS', 1)
+    max_hours = _setting('RECRAWL_MAX_INTERVAL_HOURS', 24 * 30)
+
+    # Revisit roughly once per expected change
+    hours = 24.0 / change_rate if change_rate > 0 else max_hours
+    return timedelta(hours=min(max(hours, min_hours), max_hours))
+
+def update_change_rate(change_rate, elapsed, changed):
+    """
+    Blend a new observation into the estimated change rate
+
+    A page found changed after ``elapsed`` suggests roughly one change per
+    ``elapsed``; an unchanged page suggests the rate is lower than that.
+    Observations are smoothed so a single surprise doesn't swing the schedule.
+
+    Args:
+        change_rate (float): Current estimate in changes per day
+        elapsed (timedelta): Time since the previous fetch
+        changed (bool): Whether the content changed since that fetch
+
+    Returns:
+        float: Updated estimate in changes per day
+    """
+    days = max(elapsed.total_seconds() / 86400, 1 / 24)
+    # With Poisson changes, a change first seen after t days is the median
+    # outcome for a rate of ln(2) / t
+    observed = (math.log(2) / days) if changed else 0.0
+    return (1 - RATE_SMOOTHING) * change_rate + RATE_SMOOTHING * observed
+
+def sync_schedules():
+    """
+    Create schedule rows for KnowledgeBase URLs that aren't tracked yet
+
+    The stored content is hashed so the first recrawl can tell whether the
+    page changed, and new pages are due immediately so their change rate can
+    be learned.
+
+    Returns:
+        int: Number of schedules created (URLs another process added first are not counted)
+    """
+    now = timezone.now()
+    tracked = set()
+    new_schedules = []
+
+    entries = (
+        KnowledgeBase.objects.exclude(source_url__isnull=True).exclude(source_url='')
+        .exclude(source_url__in=RecrawlSchedule.objects.values('source_url'))
+        .only('id', 'title', 'content', 'source_url', 'last_updated')
+    )
+    for entry in entries.iterator():
+        if entry.source_url in tracked:
+            continue
+        tracked.add(entry.source_url)
+        new_schedules.append(RecrawlSchedule(
+            source_url=entry.source_url,
+            knowledge_base_id=entry.id,
+            content_hash=content_hash({'title': entry.title, 'content': entry.content}),
+            last_fetched_at=entry.last_updated,
+            last_changed_at=entry.last_updated,
+            next_fetch_at=now
+        ))
+
+    if not new_schedules:
+        return 0
+    RecrawlSchedule.objects.bulk_create(new_schedules, ignore_conflicts=True)
+    # ignore_conflicts doesn't report which rows were inserted; ours carry this call's timestamp
+    return RecrawlSchedule.objects.filter(source_url__in=tracked, next_fetch_at=now).count()
+
+def due_schedules(limit):
+    """
+    Get the pages most in need of a recrawl
+
+    Args:
+        limit (int): Maximum number of pages (the fetch budget)
+
+    Returns:
+        list: Due RecrawlSchedule rows, most overdue first
+    """
+    # Frequently changing pages already come due sooner; ordering by change
+    # rate as well would let them use up the budget while stable pages starve
+    return list(
+        RecrawlSchedule.objects.filter(next_fetch_at__lte=timezone.now())
+        .order_by('next_fetch_at', '-change_rate')[:limit]
+    )
+
+def recrawl(schedule, changes=None):
+    """
+    Fetch one page, store it only if it changed and reschedule it
+
+    The change estimate and fetch time of a changed page are only recorded
+    by store_changes, together with its new content hash, so a change that
+    fails to store is not counted again when the page is fetched next.
+
+    Args:
+        schedule (RecrawlSchedule): Page to recrawl
+        changes (list): If given, a changed page is appended here as
+            (schedule, scraped_data, content hash, change rate, fetched at)
+            for store_changes instead of being stored right away
+
+    Returns:
+        str: "changed", "unchanged" or "failed"
+    """
+    now = timezone.now()
+    scraped_data = scrape_webpage(schedule.source_url)
+
+    if not scraped_data:
+        # Back off failing pages without touching their change estimate
+        schedule.failure_count += 1
+        schedule.next_fetch_at = now + recrawl_interval(schedule.change_rate) * min(2 ** schedule.failure_count, 16)
+        schedule.save(update_fields=['failure_count', 'next_fetch_at'])
+        return 'failed'
+
+    new_hash = content_hash(scraped_data)
+    changed = new_hash != schedule.content_hash
+
+    change_rate = schedule.change_rate
+    if schedule.last_fetched_at and schedule.content_hash:
+        change_rate = update_change_rate(schedule.change_rate, now - schedule.last_fetched_at, changed)
+
+    schedule.fetch_count += 1
+    schedule.failure_count = 0
+    if not changed:
+        schedule.change_rate = change_rate
+        schedule.last_fetched_at = now
+    schedule.next_fetch_at = now + recrawl_interval(schedule.change_rate)
+    schedule.save()
+
+    if changed:
+        # Only write to the KnowledgeBase when the content actually moved
+        change = (schedule, scraped_data, new_hash, change_rate, now)
+        if changes is None:
+            store_changes([change])
+        else:
+            changes.append(change)
+    return 'changed' if changed else 'unchanged'
+
+def store_changes(changes):
+    """
+    Upsert changed pages in one batch and record the new content on their schedules
+
+    A page that can't be stored keeps its old content hash, change rate and
+    fetch time, so the next recrawl sees it as changed again and counts the
+    change once.
+
+    Args:
+        changes (list): (schedule, scraped_data, content hash, change rate,
+            fetched at) tuples from recrawl
+
+    Returns:
+        int: Number of pages stored
+    """
+    if not changes:
+        return 0
+    stored = {entry.source_url: entry for entry in upsert_scraped_pages([change[1] for change in changes], KnowledgeBase)}
+    for schedule, scraped_data, new_hash, change_rate, fetched_at in changes:
+        entry = stored.get(normalize_url(scraped_data['source_url']))
+        if entry is None:
+            continue
+        schedule.knowledge_base = entry
+        schedule.content_hash = new_hash
+        schedule.change_rate = change_rate
+        schedule.last_fetched_at = fetched_at
+        schedule.last_changed_at = fetched_at
+        schedule.next_fetch_at = fetched_at + recrawl_interval(change_rate)
+        schedule.change_count += 1
+        schedule.save(update_fields=[
+            'knowledge_base', 'content_hash', 'change_rate', 'last_fetched_at', 'last_changed_at',
+            'next_fetch_at', 'change_count',
+        ])
+    return sum(1 for change in changes if normalize_url(change[1]['source_url']) in stored)
+
+def run_tick(budget):
+    """
+    Recrawl up to ``budget`` due pages
+
+    Args:
+        budget (int): Maximum number of fetches for this tick
+
+    Returns:
+        dict: Counts of changed, unchanged and failed pages
+    """
+    stats = {'changed': 0, 'unchanged': 0, 'failed': 0}
+    changes = []
+
+    for schedule in due_schedules(budget):
+        try:
+            outcome = recrawl(schedule, changes)
+        except Exception as e:
+            logger.error(f"Recrawl of {schedule.source_url} failed: {str(e)}")
+            outcome = 'failed'
+        stats[outcome] += 1
+
+    # Changed pages of the tick are stored with one upsert
+    stored = store_changes(changes)
+    stats['changed'] -= len(changes) - stored
+    stats['failed'] += len(changes) - stored
+    return stats
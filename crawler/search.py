@@ -12,6 +12,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'academic_chatbot.settings')
 django.setup()
 
 from crawler.models import KnowledgeBase
+from core.metrics import KB_SEARCH_LATENCY, KB_SEARCH_RESULTS
 
 def preprocess_query(query):
     """
@@ -95,7 +96,10 @@ async def search_knowledge_base(query, limit=10):
         return [(entry, score) for entry, score in scored_results[:limit]]
     
     # Execute the sync function asynchronously
-    return await fetch_matching_entries(keywords)
+    with KB_SEARCH_LATENCY.labels('search_knowledge_base').time():
+        results = await fetch_matching_entries(keywords)
+    KB_SEARCH_RESULTS.labels('search_knowledge_base').observe(len(results))
+    return results
 
 def get_relevant_content(query):
     """
@@ -1,3 +1,146 @@
-from django.test import TestCase
+import math
+import multiprocessing
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+import httpx
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from crawler.archive import ResponseArchive
+from crawler.models import CrawlJob, KnowledgeBase, RecrawlSchedule
+from crawler.scheduler import content_hash, run_tick
+from crawler.utils import crawl_in_batches
 
-# Create your tests here.
+RECORDS_PER_WRITER = 500
+
+
+def _write_records(path, writer):
+    archive = ResponseArchive(path)
+    for index in range(RECORDS_PER_WRITER):
+        # Bodies of different sizes so interleaved writes would misalign offsets
+        body = f'<html>{writer}-{index}</html>'.encode('utf-8') * (1 + index % 7)
+        archive.write_response(
+            f'https://jabu.edu.ng/{writer}/{index}',
+            httpx.Response(200, headers={'Content-Type': 'text/html'}, content=body),
+        )
+
+
+class ResponseArchiveTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'crawl.warc.gz')
+
+    def test_round_trip(self):
+        archive = ResponseArchive(self.path)
+        archive.write_response('https://jabu.edu.ng/fees', httpx.Response(
+            404, headers=[(b'X-Note', 'café'.encode('utf-8'))], content=b'missing',
+        ))
+        [(url, response)] = list(archive.iter_responses())
+        self.assertEqual((url, response.status_code, response.content), ('https://jabu.edu.ng/fees', 404, b'missing'))
+        self.assertEqual(response.headers.raw[0], (b'X-Note', 'café'.encode('utf-8')))
+
+    def test_writers_in_several_processes(self):
+        context = multiprocessing.get_context('fork')
+        writers = [context.Process(target=_write_records, args=(self.path, writer)) for writer in ('a', 'b')]
+        for process in writers:
+            process.start()
+        for process in writers:
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+
+        responses = dict(ResponseArchive(self.path).iter_responses())
+        self.assertEqual(len(responses), 2 * RECORDS_PER_WRITER)
+        for writer in ('a', 'b'):
+            for index in range(RECORDS_PER_WRITER):
+                expected = f'<html>{writer}-{index}</html>'.encode('utf-8') * (1 + index % 7)
+                self.assertEqual(responses[f'https://jabu.edu.ng/{writer}/{index}'].content, expected)
+
+
+@mock.patch('crawler.utils.time.sleep')
+@mock.patch('crawler.utils.scrape_webpage', return_value=None)
+class CrawlInBatchesTests(SimpleTestCase):
+    def test_progress_is_reported_before_every_fetch_and_delay(self, scrape_webpage, sleep):
+        on_progress = mock.Mock()
+        results = list(crawl_in_batches(['https://jabu.edu.ng/a', 'https://jabu.edu.ng/b'], KnowledgeBase,
+                                        delay=30, on_progress=on_progress))
+        self.assertEqual([error for _, _, error in results], ['Scraping returned no content'] * 2)
+        # Fetch, delay, fetch
+        self.assertEqual(on_progress.call_count, 3)
+        sleep.assert_called_once_with(30)
+
+
+@override_settings(CRAWL_JOB_MAX_DELAY=60, ALLOWED_HOSTS=['testserver'])
+class RefreshKnowledgeBaseTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user('admin', is_staff=True))
+
+    def _refresh(self, delay):
+        return self.client.post(reverse('refresh-knowledgebase'), {'url': 'https://jabu.edu.ng/', 'delay': delay}, format='json')
+
+    def test_delay_is_clamped(self):
+        for delay, stored in ((5, 5), (3600, 60), (-10, 0), ('7', 7)):
+            with self.subTest(delay=delay):
+                response = self._refresh(delay)
+                self.assertEqual(response.status_code, 202)
+                self.assertEqual(CrawlJob.objects.get(id=response.data['data']['job_id']).delay, stored)
+
+    def test_invalid_delay(self):
+        for delay in ('soon', None, [1], True):
+            with self.subTest(delay=delay):
+                self.assertEqual(self._refresh(delay).status_code, 400)
+        self.assertFalse(CrawlJob.objects.exists())
+
+
+class RecrawlSchedulerTests(TestCase):
+    url = 'https://jabu.edu.ng/news'
+
+    def setUp(self):
+        self.old_page = {'title': 'News', 'content': 'Old news', 'source_url': self.url, 'tags': []}
+        self.new_page = dict(self.old_page, content='New news')
+        self.last_fetched_at = timezone.now() - timedelta(days=2)
+        self.schedule = RecrawlSchedule.objects.create(
+            source_url=self.url,
+            content_hash=content_hash(self.old_page),
+            change_rate=0.5,
+            last_fetched_at=self.last_fetched_at,
+            next_fetch_at=timezone.now() - timedelta(minutes=1),
+        )
+
+    def _tick(self, stored):
+        upsert = mock.Mock(side_effect=lambda pages, model_class: [
+            KnowledgeBase.objects.create(title=page['title'], content=page['content'], source_url=page['source_url'])
+            for page in pages
+        ] if stored else [])
+        RecrawlSchedule.objects.filter(id=self.schedule.id).update(next_fetch_at=timezone.now() - timedelta(minutes=1))
+        with mock.patch('crawler.scheduler.scrape_webpage', return_value=self.new_page), \
+                mock.patch('crawler.scheduler.upsert_scraped_pages', upsert):
+            stats = run_tick(10)
+        self.schedule.refresh_from_db()
+        return stats
+
+    def test_failed_store_does_not_count_the_change(self):
+        for _ in range(3):
+            self.assertEqual(self._tick(stored=False), {'changed': 0, 'unchanged': 0, 'failed': 1})
+        self.assertEqual(self.schedule.change_rate, 0.5)
+        self.assertEqual(self.schedule.content_hash, content_hash(self.old_page))
+        self.assertEqual(self.schedule.last_fetched_at, self.last_fetched_at)
+        self.assertEqual((self.schedule.fetch_count, self.schedule.change_count), (3, 0))
+
+    def test_change_is_counted_once_it_is_stored(self):
+        self._tick(stored=False)
+        self.assertEqual(self._tick(stored=True), {'changed': 1, 'unchanged': 0, 'failed': 0})
+        # One change seen over the two days since the last stored fetch
+        self.assertAlmostEqual(self.schedule.change_rate, 0.7 * 0.5 + 0.3 * math.log(2) / 2, places=3)
+        self.assertEqual(self.schedule.content_hash, content_hash(self.new_page))
+        self.assertEqual(self.schedule.change_count, 1)
+        self.assertEqual(self.schedule.last_changed_at, self.schedule.last_fetched_at)
+
+        rate = self.schedule.change_rate
+        self.assertEqual(self._tick(stored=True), {'changed': 0, 'unchanged': 1, 'failed': 0})
+        self.assertLess(self.schedule.change_rate, rate)
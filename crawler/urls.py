@@ -3,5 +3,7 @@ from . import views
 
 urlpatterns = [
     path('refresh-knowledgebase/', views.refresh_knowledgebase, name='refresh-knowledgebase'),
+    path('crawl-jobs/', views.list_crawl_jobs, name='crawl-job-list'),
+    path('crawl-jobs/<int:job_id>/', views.crawl_job_status, name='crawl-job-status'),
     path('search/', views.search_kb, name='search-knowledge-base'),
 ]
@@ -5,8 +5,17 @@ from nltk.tokenize import word_tokenize
 from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer
 from collections import Counter
+from functools import lru_cache
+import logging
 import re
 import ssl
+import time
+from urllib.parse import urlsplit, urlunsplit
+from django.db import transaction
+from crawler.archive import ResponseArchive, get_default_archive
+from core.metrics import CRAWL_STAGE_LATENCY, CRAWL_PAGES
+
+logger = logging.getLogger(__name__)
 
 # Download NLTK resources (uncomment on first run)
 try:
@@ -20,93 +29,136 @@ nltk.download('punkt', quiet=True)
 nltk.download('stopwords', quiet=True)
 nltk.download('wordnet', quiet=True)
 
-def scrape_webpage(url):
+REQUEST_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+# httpx client options shared by scrape_webpage and the crawl pipeline, so
+# both store the same content for a URL
+CLIENT_OPTIONS = {'timeout': 30.0, 'follow_redirects': True}
+
+CONTENT_TAGS = ['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'li']
+
+def scrape_webpage(url, archive=None):
     """
     Scrape a webpage using httpx and BeautifulSoup4
     
     Args:
         url (str): URL to scrape
+        archive (ResponseArchive): Archive to save the raw response to
+            (optional, defaults to settings.CRAWLER_ARCHIVE_PATH if set)
         
     Returns:
         dict: Dictionary with title, content, and tags
     """
     try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
+        archive = archive or get_default_archive()
         
-        with httpx.Client(timeout=30.0) as client:
-            response = client.get(url, headers=headers)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Extract title
-            title = soup.title.string if soup.title else "Untitled Page"
-            
-            # Extract main content by targeting specific container elements
-            # First try to find common main content container IDs
-            main_content = None
-            
-            # Try common content container IDs and classes
-            content_selectors = [
-                'div#main-content', 'div.main-content', 
-                'div#content', 'div.content', 
-                'main', 'article', 
-                'div.post-content', 'div.entry-content'
-            ]
-            
-            # Try each selector until we find content
-            for selector in content_selectors:
-                content_container = soup.select_one(selector)
-                if content_container and content_container.get_text().strip():
-                    main_content = content_container
-                    break
-            
-            # If we found a main content container, extract text from it
-            if main_content:
-                content_elements = main_content.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'li'])
-            else:
-                # Otherwise, extract content from after the header if exists
-                header = soup.find('header')
-                if header:
-                    content_elements = []
-                    for elem in header.find_next_siblings():
-                        if elem.name == 'footer':
-                            break
-                        content_elements.extend(elem.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'li']))
-                else:
-                    # Fallback to extracting from the body but skip headers and footers
-                    body = soup.find('body')
-                    if body:
-                        # Skip headers and footers
-                        content_elements = []
-                        for elem in body.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'li']):
-                            # Check if element is inside a header or footer
-                            parent_tags = [p.name for p in elem.parents]
-                            if 'header' not in parent_tags and 'footer' not in parent_tags and 'nav' not in parent_tags:
-                                content_elements.append(elem)
-                    else:
-                        # Last resort - get all content elements from page
-                        content_elements = soup.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'li'])
+        with httpx.Client(**CLIENT_OPTIONS) as client:
+            with CRAWL_STAGE_LATENCY.labels('fetch').time():
+                response = client.get(url, headers=REQUEST_HEADERS)
             
-            # Join the text content of elements
-            content = ' '.join([element.get_text().strip() for element in content_elements])
+            if archive:
+                archive.safe_write_response(url, response)
             
-            # Generate tags using NLP
-            tags = extract_keywords(title + " " + content, max_keywords=10)
+            response.raise_for_status()
             
-            return {
-                'title': title,
-                'content': content,
-                'tags': tags,
-                'source_url': url
-            }
+            with CRAWL_STAGE_LATENCY.labels('parse').time():
+                return parse_webpage(response.text, url)
     
     except Exception as e:
         print(f"Error scraping {url}: {str(e)}")
         return None
 
+def parse_webpage(html, url):
+    """
+    Extract title, content and tags from downloaded HTML
+    
+    This is the CPU-bound half of scraping and has no Django or network
+    dependencies, so it can run in a worker process.
+    
+    Args:
+        html (str): Raw HTML of the page
+        url (str): URL the HTML was fetched from
+        
+    Returns:
+        dict: Dictionary with title, content, and tags, as plain str and
+        list values (the result is pickled back from worker processes)
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    # Extract title (str() detaches it from the parse tree)
+    title = str(soup.title.string) if soup.title and soup.title.string else "Untitled Page"
+    
+    # Extract main content by targeting specific container elements
+    # First try to find common main content container IDs
+    main_content = None
+    
+    # Try common content container IDs and classes
+    content_selectors = [
+        'div#main-content', 'div.main-content', 
+        'div#content', 'div.content', 
+        'main', 'article', 
+        'div.post-content', 'div.entry-content'
+    ]
+    
+    # Try each selector until we find content
+    for selector in content_selectors:
+        content_container = soup.select_one(selector)
+        if content_container and content_container.get_text().strip():
+            main_content = content_container
+            break
+    
+    # If we found a main content container, extract text from it
+    if main_content:
+        content_elements = main_content.find_all(CONTENT_TAGS)
+    else:
+        # Otherwise, extract content from after the header if exists
+        header = soup.find('header')
+        if header:
+            content_elements = []
+            for elem in header.find_next_siblings():
+                if elem.name == 'footer':
+                    break
+                content_elements.extend(elem.find_all(CONTENT_TAGS))
+        else:
+            # Fallback to extracting from the body but skip headers and footers
+            body = soup.find('body')
+            if body:
+                # Skip headers and footers
+                content_elements = []
+                for elem in body.find_all(CONTENT_TAGS):
+                    # Check if element is inside a header or footer
+                    parent_tags = [p.name for p in elem.parents]
+                    if 'header' not in parent_tags and 'footer' not in parent_tags and 'nav' not in parent_tags:
+                        content_elements.append(elem)
+            else:
+                # Last resort - get all content elements from page
+                content_elements = soup.find_all(CONTENT_TAGS)
+    
+    # Join the text content of elements
+    content = ' '.join([element.get_text().strip() for element in content_elements])
+    
+    # Generate tags using NLP
+    tags = extract_keywords(title + " " + content, max_keywords=10)
+    
+    return {
+        'title': title,
+        'content': content,
+        'tags': [str(tag) for tag in tags],
+        'source_url': str(url)
+    }
+
+@lru_cache(maxsize=None)
+def _get_stop_words():
+    """Load the English stopword set once per process"""
+    return frozenset(stopwords.words('english'))
+
+@lru_cache(maxsize=None)
+def _get_lemmatizer():
+    """Create the WordNet lemmatizer once per process"""
+    return WordNetLemmatizer()
+
 def extract_keywords(text, max_keywords=10):
     """
     Extract keywords from text using simple NLP techniques
@@ -125,11 +177,11 @@ def extract_keywords(text, max_keywords=10):
     tokens = word_tokenize(text)
     
     # Remove stopwords
-    stop_words = set(stopwords.words('english'))
+    stop_words = _get_stop_words()
     tokens = [token for token in tokens if token not in stop_words and len(token) > 3]
     
     # Lemmatize
-    lemmatizer = WordNetLemmatizer()
+    lemmatizer = _get_lemmatizer()
     tokens = [lemmatizer.lemmatize(token) for token in tokens]
     
     # Count word frequencies
@@ -140,38 +192,299 @@ def extract_keywords(text, max_keywords=10):
     
     return keywords
 
-def crawl_and_store(url, model_class):
+def crawl_and_store(url, model_class, archive=None):
     """
     Crawl a webpage and store it in the KnowledgeBase model
     
     Args:
         url (str): URL to crawl
         model_class: The model class to store the data in
+        archive (ResponseArchive): Archive to save the raw response to (optional)
         
     Returns:
         object: Created model instance or None if failed
     """
-    scraped_data = scrape_webpage(url)
+    scraped_data = scrape_webpage(url, archive=archive)
     
     if not scraped_data:
+        CRAWL_PAGES.labels('failed').inc()
         return None
     
-    # Check if we already have this URL in the database
-    existing = model_class.objects.filter(source_url=url).first()
+    with CRAWL_STAGE_LATENCY.labels('store').time():
+        instance = store_scraped_data(scraped_data, model_class)
+    CRAWL_PAGES.labels('success' if instance else 'failed').inc()
+    return instance
+
+def crawl_in_batches(urls, model_class, delay=0, archive=None, batch_size=50, flush_seconds=60, on_progress=None):
+    """
+    Crawl URLs one after another, storing the pages in batched upserts
+    
+    Pages are written once batch_size are buffered or the oldest buffered
+    page has waited flush_seconds, so callers still see steady progress.
     
-    if existing:
-        # Update existing entry
-        existing.title = scraped_data['title']
-        existing.content = scraped_data['content']
-        existing.tags = scraped_data['tags']
-        existing.save()
-        return existing
-    else:
-        # Create new entry
-        return model_class.objects.create(
-            title=scraped_data['title'],
-            content=scraped_data['content'],
-            tags=scraped_data['tags'],
-            source_url=url,
-            is_verified=False
-        )
+    Args:
+        urls (list): URLs to crawl
+        model_class: The model class to store the data in
+        delay (float): Seconds to wait between requests
+        archive (ResponseArchive): Archive to save raw responses to (optional)
+        batch_size (int): Pages per upsert
+        flush_seconds (float): Longest a scraped page waits to be stored
+        on_progress (callable): Called with no arguments before every fetch
+            and every delay, e.g. to keep a job's heartbeat current (optional)
+        
+    Yields:
+        tuple: (url, stored instance or None, error message or None) for
+        every URL, failed fetches immediately and stored pages per batch
+    """
+    pending = []
+    oldest = None
+    
+    def flush():
+        start = time.perf_counter()
+        stored = upsert_scraped_pages([page for _, page in pending], model_class, batch_size)
+        CRAWL_STAGE_LATENCY.labels('store').observe((time.perf_counter() - start) / len(pending))
+        by_url = {instance.source_url: instance for instance in stored}
+        results = []
+        for url, page in pending:
+            instance = by_url.get(normalize_url(page['source_url']))
+            CRAWL_PAGES.labels('success' if instance else 'failed').inc()
+            results.append((url, instance, None if instance else 'Failed to store the page'))
+        pending.clear()
+        return results
+    
+    for i, url in enumerate(urls):
+        if on_progress:
+            on_progress()
+        scraped_data = scrape_webpage(url, archive=archive)
+        if scraped_data:
+            pending.append((url, scraped_data))
+            if oldest is None:
+                oldest = time.monotonic()
+        else:
+            CRAWL_PAGES.labels('failed').inc()
+            yield url, None, 'Scraping returned no content'
+        
+        if pending and (len(pending) >= batch_size or time.monotonic() - oldest >= flush_seconds):
+            yield from flush()
+            oldest = None
+        
+        # Add delay between requests if not the last URL
+        if i < len(urls) - 1 and delay > 0:
+            if on_progress:
+                on_progress()
+            time.sleep(delay)
+    
+    if pending:
+        yield from flush()
+
+def normalize_url(url):
+    """
+    Normalize a URL so the same page always maps to one KnowledgeBase row
+    
+    Lowercases the scheme and host, drops default ports, fragments and
+    trailing slashes (except for the root path).
+    
+    Args:
+        url (str): URL to normalize
+        
+    Returns:
+        str: Normalized URL
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.hostname or ''
+    if parts.port and (scheme, parts.port) not in (('http', 80), ('https', 443)):
+        netloc = f"{netloc}:{parts.port}"
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit((scheme, netloc, path, parts.query, ''))
+
+# Fields refreshed when a crawled URL already exists
+UPSERT_FIELDS = ['title', 'content', 'tags', 'last_updated']
+
+def upsert_scraped_pages(pages, model_class, batch_size=500):
+    """
+    Insert or update scraped pages in chunks, one statement per chunk
+    
+    Uses INSERT ... ON CONFLICT (source_url) DO UPDATE, so no per-page
+    lookup is needed and existing rows keep their id, created_at and
+    is_verified flag. When a chunk fails, its pages are retried one by one
+    so a single bad page only loses itself.
+    
+    Args:
+        pages (list): Output dicts of parse_webpage/scrape_webpage
+        model_class: The model class to store the data in
+        batch_size (int): Rows per INSERT statement
+        
+    Returns:
+        list: Upserted model instances, with primary keys set (pages that
+        could not be stored are logged and left out)
+    """
+    # A single statement can't touch the same row twice, so keep the last
+    # version of each URL
+    unique_pages = {}
+    for page in pages:
+        unique_pages[normalize_url(page['source_url'])] = page
+    
+    objects = []
+    for url, page in unique_pages.items():
+        try:
+            objects.append(model_class(
+                title=page['title'][:255],
+                content=page['content'],
+                tags=[tag[:50] for tag in page['tags']],
+                source_url=url,
+                is_verified=False
+            ))
+        except Exception as e:
+            logger.error(f"Skipping malformed page {url}: {str(e)}")
+    
+    def upsert(chunk):
+        # A savepoint, so a failed statement doesn't abort the caller's transaction
+        with transaction.atomic():
+            return model_class.objects.bulk_create(
+                chunk,
+                update_conflicts=True,
+                unique_fields=['source_url'],
+                update_fields=UPSERT_FIELDS
+            )
+    
+    upserted = []
+    for i in range(0, len(objects), batch_size):
+        chunk = objects[i:i + batch_size]
+        try:
+            upserted.extend(upsert(chunk))
+        except Exception as e:
+            logger.warning(f"Upsert of {len(chunk)} pages failed, retrying one by one: {str(e)}")
+            for obj in chunk:
+                try:
+                    upserted.extend(upsert([obj]))
+                except Exception as e:
+                    logger.error(f"Failed to store {obj.source_url}: {str(e)}")
+    
+    if model_class._meta.label == 'crawler.KnowledgeBase':
+        from crawler.programs import update_program_contexts
+        try:
+            update_program_contexts(upserted)
+        except Exception as e:
+            # The pages are stored; the next full rebuild picks them up
+            logger.error(f"Failed to update program contexts: {str(e)}")
+    return upserted
+
+def store_scraped_data(scraped_data, model_class):
+    """
+    Store already scraped page data in the KnowledgeBase model
+    
+    Args:
+        scraped_data (dict): Output of parse_webpage/scrape_webpage
+        model_class: The model class to store the data in
+        
+    Returns:
+        object: Created or updated model instance, or None if it could not be stored
+    """
+    upserted = upsert_scraped_pages([scraped_data], model_class)
+    return upserted[0] if upserted else None
+
+
+class BatchWriter:
+    """
+    Buffer scraped pages and upsert them in chunks
+    
+    Usage:
+        with BatchWriter(KnowledgeBase) as writer:
+            for page in pages:
+                writer.add(page)
+    """
+    def __init__(self, model_class, batch_size=500):
+        self.model_class = model_class
+        self.batch_size = batch_size
+        self.pending = []
+        self.written = 0
+        self.failed = 0
+        self.statements = 0
+    
+    def add(self, scraped_data):
+        """Queue a page, flushing once a full chunk is buffered"""
+        self.pending.append(scraped_data)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        """Upsert everything buffered so far"""
+        if not self.pending:
+            return []
+        upserted = upsert_scraped_pages(self.pending, self.model_class, self.batch_size)
+        self.written += len(upserted)
+        self.failed += len({normalize_url(page['source_url']) for page in self.pending}) - len(upserted)
+        self.statements += 1
+        self.pending = []
+        return upserted
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+
+def replay_archive(archive_path, model_class=None, urls=None):
+    """
+    Re-run extraction (and optionally storage) from a response archive
+    
+    No network requests are made, so this runs at disk speed and gives a
+    reproducible corpus for parser and indexing benchmarks.
+    
+    Args:
+        archive_path (str): Path of the .warc.gz archive
+        model_class: The model class to store the data in (optional,
+            extraction only if omitted)
+        urls (list): Only replay these URLs (optional)
+        
+    Returns:
+        dict: Stats about the replay, including parse and store timings
+    """
+    archive = ResponseArchive(archive_path)
+    writer = BatchWriter(model_class) if model_class is not None else None
+    stats = {
+        'total': 0,
+        'success': 0,
+        'failed': 0,
+        'failed_urls': [],
+        'parse_seconds': 0.0,
+        'store_seconds': 0.0,
+    }
+    
+    for url, response in archive.iter_responses(urls):
+        stats['total'] += 1
+        
+        if response.is_error:
+            stats['failed'] += 1
+            stats['failed_urls'].append(url)
+            continue
+        
+        try:
+            start = time.perf_counter()
+            scraped_data = parse_webpage(response.text, url)
+            stats['parse_seconds'] += time.perf_counter() - start
+            
+            if writer is not None:
+                start = time.perf_counter()
+                writer.add(scraped_data)
+                stats['store_seconds'] += time.perf_counter() - start
+            
+            stats['success'] += 1
+        except Exception as e:
+            logger.error(f"Error replaying {url}: {str(e)}")
+            stats['failed'] += 1
+            stats['failed_urls'].append(url)
+    
+    if writer is not None:
+        start = time.perf_counter()
+        writer.flush()
+        stats['store_seconds'] += time.perf_counter() - start
+        # Pages the writer could not store
+        stats['success'] -= writer.failed
+        stats['failed'] += writer.failed
+    
+    stats['parse_seconds'] = round(stats['parse_seconds'], 3)
+    stats['store_seconds'] = round(stats['store_seconds'], 3)
+    return stats
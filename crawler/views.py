@@ -1,32 +1,60 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.shortcuts import render, get_object_or_404
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
-from .models import KnowledgeBase
-from .utils import crawl_and_store
+from .models import KnowledgeBase, CrawlJob
+from .jobs import create_crawl_job, serialize_job
 from .config import URLS_TO_SCRAPE
 from .search import search_knowledge_base, get_relevant_content
-import time
 
 # Create your views here.
 
+def _limit_param(request, default=10):
+    """The "limit" query parameter as a positive int (default if missing or invalid)"""
+    try:
+        return max(1, int(request.query_params.get('limit', default)))
+    except (TypeError, ValueError):
+        return default
+
+def _delay_param(request, default=1):
+    """
+    The "delay" request field clamped to 0..CRAWL_JOB_MAX_DELAY seconds
+
+    Raises:
+        ValueError: If it isn't a whole number
+    """
+    delay = request.data.get('delay', default)
+    if isinstance(delay, bool):
+        raise ValueError(delay)
+    return min(max(0, int(delay)), settings.CRAWL_JOB_MAX_DELAY)
+
 @api_view(['POST'])
 @permission_classes([IsAdminUser])
 def refresh_knowledgebase(request):
     """
     Admin-only endpoint to trigger crawling and update the knowledge base
     
+    The crawl runs as a background job; poll crawl-jobs/<job_id>/ for progress.
+    
     POST Data:
         - url: Single URL to crawl (optional)
         - urls: List of URLs to crawl (optional)
         - use_config: Boolean, if true, uses URLs from config (optional)
-        - delay: Delay between requests in seconds (optional, defaults to 1)
+        - delay: Delay between requests in seconds (optional, defaults to 1,
+          at most CRAWL_JOB_MAX_DELAY)
     """
     # Get parameters from request
     url = request.data.get('url')
     urls = request.data.get('urls', [])
     use_config = request.data.get('use_config', False)
-    delay = int(request.data.get('delay', 1))
+    try:
+        delay = _delay_param(request)
+    except (TypeError, ValueError):
+        return Response({
+            'status': 'error',
+            'message': '"delay" must be a whole number of seconds'
+        }, status=400)
     
     # Process the URLs to crawl
     urls_to_crawl = []
@@ -49,47 +77,48 @@ def refresh_knowledgebase(request):
             'message': 'No URLs to crawl. Provide "url", "urls" or set "use_config" to true.'
         }, status=400)
     
-    # Results tracking
-    results = []
-    success_count = 0
-    failed_urls = []
+    # Queue the crawl and return immediately
+    job = create_crawl_job(urls_to_crawl, delay=delay, user=request.user)
     
-    # Crawl each URL
-    for i, current_url in enumerate(urls_to_crawl):
-        # Crawl and store in KnowledgeBase
-        result = crawl_and_store(current_url, KnowledgeBase)
-        
-        if result:
-            success_count += 1
-            results.append({
-                'id': result.id,
-                'url': current_url,
-                'title': result.title,
-                'tags': result.tags,
-                'status': 'success'
-            })
-        else:
-            failed_urls.append(current_url)
-            results.append({
-                'url': current_url,
-                'status': 'failed'
-            })
-        
-        # Add delay between requests if not the last URL
-        if i < len(urls_to_crawl) - 1 and delay > 0:
-            time.sleep(delay)
+    return Response({
+        'status': 'queued',
+        'message': f'Crawl job {job.id} queued for {len(urls_to_crawl)} URLs',
+        'data': serialize_job(job, include_results=False)
+    }, status=202)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def crawl_job_status(request, job_id):
+    """
+    Admin-only endpoint to poll the progress of a crawl job
+    
+    GET Parameters:
+        - results: Set to "false" to omit per-URL results (optional)
+    """
+    job = get_object_or_404(CrawlJob, id=job_id)
+    include_results = request.query_params.get('results', 'true').lower() != 'false'
     
-    # Return results
     return Response({
-        'status': 'completed',
-        'message': f'Crawled {len(urls_to_crawl)} URLs. Success: {success_count}, Failed: {len(failed_urls)}',
-        'data': {
-            'total': len(urls_to_crawl),
-            'success_count': success_count,
-            'failed_count': len(failed_urls),
-            'failed_urls': failed_urls,
-            'results': results
-        }
+        'status': 'success',
+        'data': serialize_job(job, include_results=include_results)
+    }, status=200)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def list_crawl_jobs(request):
+    """
+    Admin-only endpoint listing the most recent crawl jobs
+    
+    GET Parameters:
+        - limit: Maximum number of jobs (optional, default: 10)
+    """
+    limit = _limit_param(request)
+    jobs = CrawlJob.objects.all()[:limit]
+    
+    return Response({
+        'status': 'success',
+        'count': len(jobs),
+        'results': [serialize_job(job, include_results=False) for job in jobs]
     }, status=200)
 
 @api_view(['GET'])
@@ -103,7 +132,7 @@ def search_kb(request):
         - limit: Maximum number of results (optional, default: 10)
     """
     query = request.query_params.get('q')
-    limit = int(request.query_params.get('limit', 10))
+    limit = _limit_param(request)
     
     if not query:
         return Response({
@@ -0,0 +1,11 @@
+"""
+Gunicorn settings
+
+Run with: gunicorn academic_chatbot.wsgi -c gunicorn.conf.py
+"""
+
+
+def child_exit(server, worker):
+    """Drop the exited worker's live gauges (PROMETHEUS_MULTIPROC_DIR mode)"""
+    from core.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
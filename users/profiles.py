@@ -0,0 +1,64 @@
+"""
+Request-scoped StudentProfile resolution
+
+Views call get_request_profile(request) instead of querying StudentProfile
+themselves, so the profile is resolved at most once per request and usually
+without a query:
+
+1. Already on the request (a previous call)
+2. Loaded along with the user by core.authentication.JWTAuthentication
+3. PROFILE_CACHE, for PROFILE_CACHE_SECONDS
+4. One query
+
+Write paths call invalidate_profile(user_id) after changing a profile.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from core.authentication import invalidate_cached_user
+from core.cache import PROFILE_CACHE
+from .models import StudentProfile
+
+_MISSING = object()
+
+
+def get_request_profile(request):
+    """
+    The authenticated user's StudentProfile, resolved once per request
+
+    Args:
+        request: DRF Request or Django HttpRequest
+
+    Returns:
+        StudentProfile: The profile, or None for anonymous users and users without one
+    """
+    # Stored on the HttpRequest so the DRF Request and middleware share it
+    http_request = getattr(request, '_request', request)
+    profile = getattr(http_request, '_student_profile', _MISSING)
+    if profile is _MISSING:
+        profile = _resolve_profile(request.user)
+        http_request._student_profile = profile
+    return profile
+
+def _resolve_profile(user):
+    if not user.is_authenticated:
+        return None
+
+    # JWTAuthentication loads the profile (or its absence) with the user
+    if get_user_model().student_profile.is_cached(user):
+        try:
+            return user.student_profile
+        except StudentProfile.DoesNotExist:
+            return None
+
+    profile = PROFILE_CACHE.get(user.pk)
+    if profile is None:
+        # Without the user: a cached User would carry its password hash
+        profile = StudentProfile.objects.filter(user=user).first()
+        if profile is not None:
+            PROFILE_CACHE.set(user.pk, profile, settings.PROFILE_CACHE_SECONDS)
+    return profile
+
+def invalidate_profile(user_id):
+    """Drop the cached profile (and cached user) of a user after a write"""
+    PROFILE_CACHE.delete(user_id)
+    invalidate_cached_user(user_id)
@@ -4,6 +4,7 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework import status
 from .models import StudentProfile
+from .profiles import get_request_profile, invalidate_profile
 from .serializers import StudentProfileSerializer, StudentProfileCreateUpdateSerializer
 from django.shortcuts import get_object_or_404
 
@@ -12,7 +13,7 @@ class StudentProfileViewSet(viewsets.ModelViewSet):
     """
     ViewSet for CRUD operations on StudentProfile
     """
-    queryset = StudentProfile.objects.all()
+    queryset = StudentProfile.objects.select_related('user')
     permission_classes = [permissions.IsAuthenticated]
     
     def get_serializer_class(self):
@@ -23,7 +24,19 @@ class StudentProfileViewSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         """Create profile and link to user"""
-        serializer.save(user=self.request.user)
+        profile = serializer.save(user=self.request.user)
+        invalidate_profile(profile.user_id)
+    
+    def perform_update(self, serializer):
+        """Save profile and drop its cached copy"""
+        profile = serializer.save()
+        invalidate_profile(profile.user_id)
+    
+    def perform_destroy(self, instance):
+        """Delete profile and drop its cached copy"""
+        user_id = instance.user_id
+        instance.delete()
+        invalidate_profile(user_id)
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
@@ -32,7 +45,7 @@ def create_my_profile(request):
   Create a profile for the currently authenticated user
   """
   # Check if profile already exists
-  if StudentProfile.objects.filter(user=request.user).exists():
+  if get_request_profile(request) is not None:
     return Response({
       'status': 'error',
       'message': 'Profile already exists for this user'
@@ -42,6 +55,7 @@ def create_my_profile(request):
   serializer = StudentProfileCreateUpdateSerializer(data=request.data)
   if serializer.is_valid():
     serializer.save(user=request.user)
+    invalidate_profile(request.user.pk)
     return Response({
       'status': 'success',
       'message': 'Profile created successfully',
@@ -59,18 +73,18 @@ def get_my_profile(request):
     """
     Get the profile of the currently authenticated user
     """
-    try:
-        profile = StudentProfile.objects.get(user=request.user)
-        serializer = StudentProfileSerializer(profile)
-        return Response({
-            'status': 'success',
-            'data': serializer.data
-        })
-    except StudentProfile.DoesNotExist:
+    profile = get_request_profile(request)
+    if profile is None:
         return Response({
             'status': 'error',
             'message': 'Profile not found for this user'
         }, status=status.HTTP_404_NOT_FOUND)
+    
+    serializer = StudentProfileSerializer(profile)
+    return Response({
+        'status': 'success',
+        'data': serializer.data
+    })
 
 @api_view(['PUT'])
 @permission_classes([permissions.IsAuthenticated])
@@ -79,6 +93,7 @@ def update_my_profile(request):
     Update the profile of the currently authenticated user
     """
     try:
+        # Always the stored row: a cached copy must not overwrite newer data
         profile = StudentProfile.objects.get(user=request.user)
     except StudentProfile.DoesNotExist:
         return Response({
@@ -89,6 +104,7 @@ def update_my_profile(request):
     serializer = StudentProfileCreateUpdateSerializer(profile, data=request.data, partial=True)
     if serializer.is_valid():
         serializer.save()
+        invalidate_profile(request.user.pk)
         return Response({
             'status': 'success',
             'message': 'Profile updated successfully',